@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import heapq
+from ipv4 import all_ones, cidrMask, intToCidr
+
+# subnets of any size (vlsm) given out from a pool network with the buddy system
+# every free block is a subnet of the pool (aligned to its size), kept in a free list for its number of network bits
+# allocating splits the block found in half until it is the size asked for, the halves not used go back in the free lists
+# freeing joins the block with its buddy (the other half of the block they were split from) for as long as the buddy is free too
+# each free list is a set (is a block free) and a heap (lowest free block), so allocating and freeing look at each of the at most
+# 33 sizes once, O(log n) for n free blocks, instead of looking through every subnet given out
+
+strategies = ["best", "first"]
+
+class Pool():
+
+   def __init__(self, network, bits):
+      if network & ~cidrMask(bits) & all_ones:
+         raise ValueError("network address must not have host bits set, i.e. " + intToCidr(network & cidrMask(bits), bits))
+      self.network = network
+      self.bits = bits
+      self.free_sets = [set() for _ in range(33)]   # index = network bits, free block addresses
+      self.free_heaps = [[] for _ in range(33)]     # same addresses in a heap, can also have addresses that are no longer free
+      self.allocated = {}                           # keys = address of subnet given out, values = network bits
+      self.free_addresses = 1 << (32 - bits)
+      self.addFree(network, bits)
+
+# add block to free list
+   def addFree(self, addr, bits):
+      self.free_sets[bits].add(addr)
+      heap = self.free_heaps[bits]
+      heapq.heappush(heap, addr)
+      if len(heap) > 2 * len(self.free_sets[bits]) + 64:   # mostly addresses that are no longer free, so make it again
+         heap[:] = sorted(self.free_sets[bits])
+
+# take block out of free list, it is left in the heap until it gets to the top
+   def removeFree(self, addr, bits):
+      self.free_sets[bits].discard(addr)
+
+# get lowest free block with bits network bits, None if there are none
+   def lowestFree(self, bits):
+      heap = self.free_heaps[bits]
+      free = self.free_sets[bits]
+      while heap and heap[0] not in free:
+         heapq.heappop(heap)
+      return heap[0] if heap else None
+
+# check number of network bits can be given out from this pool
+   def checkBits(self, bits):
+      if not self.bits <= bits <= 32:
+         raise ValueError("subnet must have from %d to 32 network bits for pool %s" % (self.bits, intToCidr(self.network, self.bits)))
+
+# find free block for a subnet with bits network bits, returns (address, network bits of the block) or None if there is no room
+# best: smallest free block that is big enough (lowest address if there are more than one), keeps big blocks for big subnets
+# first: lowest address that a subnet that size can start at
+   def find(self, bits, strategy="best"):
+      self.checkBits(bits)
+      if strategy == "best":
+         for block_bits in range(bits, self.bits - 1, -1):
+            addr = self.lowestFree(block_bits)
+            if addr is not None:
+               return addr, block_bits
+         return None
+      elif strategy == "first":
+         found = [(addr, block_bits) for block_bits in range(self.bits, bits + 1) for addr in [self.lowestFree(block_bits)] if addr is not None]
+         return min(found) if found != [] else None
+      raise ValueError("strategy must be best or first")
+
+# give out a subnet with bits network bits, returns its address or None if there is no room
+   def allocate(self, bits, strategy="best"):
+      found = self.find(bits, strategy)
+      if found is None:
+         return None
+      addr, block_bits = found
+      self.removeFree(addr, block_bits)
+      while block_bits < bits:   # split block in half, keep lower half and free upper half
+         block_bits += 1
+         self.addFree(addr + (1 << (32 - block_bits)), block_bits)
+      self.allocated[addr] = bits
+      self.free_addresses -= 1 << (32 - bits)
+      return addr
+
+# give back a subnet that was given out, ValueError if it was not
+   def free(self, addr, bits):
+      if self.allocated.get(addr) != bits:
+         raise ValueError(intToCidr(addr, bits) + " is not allocated from pool " + intToCidr(self.network, self.bits))
+      del self.allocated[addr]
+      self.free_addresses += 1 << (32 - bits)
+      while bits > self.bits:    # join with buddy while it is free
+         buddy = addr ^ (1 << (32 - bits))
+         if buddy not in self.free_sets[bits]:
+            break
+         self.removeFree(buddy, bits)
+         addr = min(addr, buddy)
+         bits -= 1
+      self.addFree(addr, bits)
+
+# information about the pool
+   def stats(self):
+      return {
+               "network": intToCidr(self.network, self.bits),
+               "size": 1 << (32 - self.bits),
+               "free_addresses": self.free_addresses,
+               "allocated_subnets": len(self.allocated),
+               "free_blocks": {"/%d" % bits: len(free) for bits, free in enumerate(self.free_sets) if free},
+             }
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import numpy as np
+
+# ip addresses are kept as 32 bit integers (first number of the address in the top 8 bits), so working out classes, masks and
+# subnets is a few shifts and ands instead of changing every number to a binary string and back
+
+all_ones = 0xFFFFFFFF
+octets = [str(i) for i in range(256)]                  # decimal strings of the numbers in an address
+octet_values = {num: i for i, num in enumerate(octets)}
+
+# change ip address in decimal dot notation to an integer, ValueError if it is not 4 numbers from 0 to 255
+def addrToInt(ip):
+   nums = ip.split(".") if isinstance(ip, str) else ()
+   if len(nums) != 4:
+      raise ValueError("ip address must be 4 numbers separated by dots: " + repr(ip))
+   try:
+      return (octet_values[nums[0]] << 24) | (octet_values[nums[1]] << 16) | (octet_values[nums[2]] << 8) | octet_values[nums[3]]
+   except KeyError:   # number not written the usual way (i.e. "016") or not from 0 to 255
+      pass
+   try:
+      a, b, c, d = [int(n) for n in nums]
+   except ValueError:
+      raise ValueError("ip address must be 4 numbers separated by dots: " + repr(ip)) from None
+   if not (0 <= a <= 255 and 0 <= b <= 255 and 0 <= c <= 255 and 0 <= d <= 255):
+      raise ValueError("numbers in an ip address must be from 0 to 255: " + repr(ip))
+   return (a << 24) | (b << 16) | (c << 8) | d
+
+# change integer to ip address in decimal dot notation
+def intToAddr(n):
+   return octets[n >> 24] + "." + octets[(n >> 16) & 255] + "." + octets[(n >> 8) & 255] + "." + octets[n & 255]
+
+# change list of integers to list of ip addresses, the first 2 numbers are only made into a string again when they change
+# (addresses in a list of subnets are usually in the same network)
+def intsToAddrs(addrs):
+   strs = []
+   top = -1
+   for n in addrs:
+      if n >> 16 != top:
+         top = n >> 16
+         prefix = octets[top >> 8] + "." + octets[top & 255] + "."
+      strs.append(prefix + octets[(n >> 8) & 255] + "." + octets[n & 255])
+   return strs
+
+# get number of 1's in an address (i.e. cidr number of a subnet mask)
+def numOnes(n):
+   return n.bit_count()
+
+# get mask with bits 1's followed by 0's, i.e. cidrMask(22) = 255.255.252.0
+def cidrMask(bits):
+   return (all_ones << (32 - bits)) & all_ones
+
+# change network in cidr notation (i.e. "10.0.0.0/8") to (address as integer, number of network bits), ValueError if it is not one
+def cidrToInt(cidr):
+   ip, slash, bits = cidr.partition("/")
+   if slash == "" or not bits.isdigit() or int(bits) > 32:
+      raise ValueError("network must be an ip address and a number of bits from 0 to 32, i.e. 10.0.0.0/8: " + repr(cidr))
+   return addrToInt(ip), int(bits)
+
+# change address as integer and number of network bits to cidr notation
+def intToCidr(n, bits):
+   return intToAddr(n) + "/" + str(bits)
+
+# get number of leading bits 2 addresses have in common (32 if they are the same)
+def commonBits(a, b):
+   return 32 - (a ^ b).bit_length()
+
+# get class of an address from its first bits
+def addrClass(n):
+   first = n >> 28   # first 4 bits
+   if first < 0b1000:
+      return "A"
+   elif first < 0b1100:
+      return "B"
+   elif first < 0b1110:
+      return "C"
+   elif first == 0b1110:
+      return "D"
+   return "E"
+
+# bits of the network part of class A, B and C addresses
+class_bits = {"A": 8, "B": 16, "C": 24}
+
+# information about each class: (number of networks, number of hosts, first address, last address)
+class_table = {
+                "A": (128, 16777216, "0.0.0.0", "127.255.255.255"),
+                "B": (16384, 65536, "128.0.0.0", "191.255.255.255"),
+                "C": (2097152, 256, "192.0.0.0", "223.255.255.255"),
+                "D": ("N/A", "N/A", "224.0.0.0", "239.255.255.255"),
+                "E": ("N/A", "N/A", "240.0.0.0", "255.255.255.255")
+              }
+
+# batches of addresses are kept as numpy uint32 arrays, so the class of millions of addresses is one lookup in a table of the 16
+# possible first 4 bits instead of a function call for each address
+class_letters = np.array(list(class_table))                                            # classes numbered 0 to 4
+first_bits_class = np.array([0] * 8 + [1] * 4 + [2] * 2 + [3, 4], dtype=np.uint8)     # class number of each first 4 bits
+class_columns = [np.array([class_table[c][i] for c in class_letters] + [None], dtype=object)[:-1] for i in range(4)]
+separators = np.array([46, 46, 46, 10], dtype=np.uint8)                                # ". . . new line" after the numbers of an address
+batch_bytes = 1 << 24   # text parsed at once, so the arrays made while parsing stay a few hundred MB at most
+
+# change batch of addresses to uint32 array, addresses can be a list of strings in decimal dot notation, text (str or bytes) with
+# one address on each line, or an array of integers (i.e. numpy.frombuffer(data, ">u4") of addresses packed in 4 bytes each)
+# ValueError saying which address is wrong if any is not 4 numbers from 0 to 255
+def parseAddrs(addrs):
+   if isinstance(addrs, np.ndarray):
+      if addrs.dtype.kind not in "iu" or (len(addrs) > 0 and (addrs.min() < 0 or addrs.max() > all_ones)):
+         raise ValueError("packed addresses must be integers from 0 to 2^32 - 1")
+      return addrs.astype(np.uint32)
+   if isinstance(addrs, str):
+      text = addrs.encode()
+   elif isinstance(addrs, (bytes, bytearray, memoryview)):
+      text = bytes(addrs)
+   else:
+      addrs = list(addrs)
+      if addrs == []:
+         return np.zeros(0, dtype=np.uint32)
+      try:
+         text = "\n".join(addrs).encode()
+      except TypeError:
+         raise ValueError("addresses must be strings in decimal dot notation")
+      result = parseText(text)
+      if len(result) != len(addrs):   # an address had a new line in it
+         raise ValueError(firstBadAddr(addrs))
+      return result
+   text = text.replace(b"\r", b"").rstrip(b"\n")
+   return parseText(text) if text != b"" else np.zeros(0, dtype=np.uint32)
+
+# parse text with one address on each line (no empty lines), in pieces of about batch_bytes split at new lines
+def parseText(text):
+   pieces = []
+   start = 0
+   count = 0   # addresses in pieces before this one
+   while start < len(text):
+      end = len(text)
+      if end - start > batch_bytes:
+         end = text.rfind(b"\n", start, start + batch_bytes)
+         if end < start:   # line longer than batch_bytes
+            end = text.find(b"\n", start)
+         if end < start:
+            end = len(text)
+      pieces.append(parsePiece(text[start:end], count))
+      count += len(pieces[-1])
+      start = end + 1
+   if pieces == []:
+      return np.zeros(0, dtype=np.uint32)
+   return np.concatenate(pieces) if len(pieces) != 1 else pieces[0]
+
+# parse lines of addresses written the usual way (1 to 3 digits in each number) with vectorised numpy, every byte is looked at once
+# anything else (i.e. "016" written as "0016" or spaces) goes through addrToInt one address at a time, so a batch takes exactly
+# what /ipcalc/ takes, first = number of the first address (for errors)
+def parsePiece(text, first=0):
+   buf = np.frombuffer(b"\n\n\n" + text + b"\n", dtype=np.uint8)   # 3 new lines at the start so every number has 3 bytes before its end
+   digits = buf - np.uint8(48)                 # "0" to "9" become 0 to 9, anything else becomes more than 9
+   ends = np.flatnonzero(digits > 9)           # the . or new line after each number (and the 3 added new lines)
+   if len(ends) % 4 == 3 and len(ends) > 3:
+      lengths = np.diff(ends) - 1
+      ends = ends[3:]
+      if lengths[2:].min() >= 1 and lengths[2:].max() <= 3 and np.all(buf[ends].reshape(-1, 4) == separators):
+         ones, tens, hundreds = [digits[ends - i].astype(np.uint16) for i in (1, 2, 3)]
+         tens_ok = tens <= 9
+         nums = ones + tens * tens_ok * 10 + hundreds * (tens_ok & (hundreds <= 9)) * 100
+         if nums.max() <= 255:
+            nums = nums.reshape(-1, 4).astype(np.uint32)
+            return (nums[:, 0] << 24) | (nums[:, 1] << 16) | (nums[:, 2] << 8) | nums[:, 3]
+   lines = text.decode(errors="replace").split("\n")
+   try:
+      return np.fromiter((addrToInt(line) for line in lines), dtype=np.uint32, count=len(lines))
+   except ValueError:
+      raise ValueError(firstBadAddr(lines, first))
+
+# get error message for the first address in a list that is not an ip address
+def firstBadAddr(addrs, first=0):
+   for i, addr in enumerate(addrs, first):
+      try:
+         addrToInt(addr)
+      except (ValueError, AttributeError):
+         return "address %d is not an ip address: %r" % (i, addr)
+      if "\n" in addr:
+         return "address %d is not an ip address: %r" % (i, addr)
+   return "addresses are not ip addresses"
+
+# get class and class information of a batch of addresses (see parseAddrs), as columns of the same fields as /ipcalc/
+# (class is an array of letters, the other columns are object arrays since classes D and E have "N/A" for networks and hosts)
+def classifyAddrs(addrs):
+   codes = first_bits_class[parseAddrs(addrs) >> 28]
+   nets, hosts, first, last = [column[codes] for column in class_columns]
+   return {
+            "class": class_letters[codes],
+            "num_networks": nets,
+            "num_hosts": hosts,
+            "first_address": first,
+            "last_address": last,
+          }
+
+# change list of networks in cidr notation (i.e. "10.0.0.0/24", an address without /bits is one address, /32) to arrays of
+# (first address, number of network bits), addresses are parsed together with parseAddrs, host bits are cleared
+def parseNetworks(networks):
+   for i, network in enumerate(networks):
+      if not isinstance(network, str):
+         raise ValueError("network %d is not a string: %r" % (i, network))
+   parts = [network.partition("/") for network in networks]
+   nums = [num if slash != "" else "32" for ip, slash, num in parts]
+   if not bit_values.keys() >= set(nums):
+      i = next(i for i, num in enumerate(nums) if num not in bit_values)
+      raise ValueError("network %d does not have a number of bits from 0 to 32: %r" % (i, networks[i]))
+   bits = np.fromiter((bit_values[num] for num in nums), dtype=np.int64, count=len(nums))
+   try:
+      addrs = parseAddrs([ip for ip, slash, num in parts]).astype(np.int64)
+   except ValueError as e:
+      raise ValueError(str(e).replace("address", "network", 1))
+   return addrs & ((all_ones << (32 - bits)) & all_ones), bits
+
+bit_values = {str(i): i for i in range(33)}   # number of network bits after the / of a network
+
+# get the fewest networks that cover exactly the same addresses as the networks given (arrays of first address and network bits, in
+# any order, can overlap), returns arrays of (first address, network bits) in order of address
+# networks are sorted by first address and joined into ranges in one pass wherever they overlap or are next to each other, then each
+# range is cut into the biggest aligned networks that fit, one network from every range at a time (at most 32 times)
+def summarizeNetworks(starts, bits):
+   if len(starts) == 0:
+      return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+   order = np.argsort(starts, kind="stable")
+   starts = starts[order]
+   ends = np.maximum.accumulate(starts + (np.int64(1) << (32 - bits[order])))   # end (one past the last address) of everything so far
+   new_range = np.empty(len(starts), dtype=bool)
+   new_range[0] = True
+   new_range[1:] = starts[1:] > ends[:-1]   # gap after everything before it
+   firsts = np.flatnonzero(new_range)
+   range_starts = starts[firsts]
+   range_ends = ends[np.append(firsts[1:] - 1, len(starts) - 1)]
+   out_starts, out_bits = [], []
+   while len(range_starts) > 0:
+      aligned = range_starts & -range_starts                                     # biggest network that can start here
+      aligned[range_starts == 0] = np.int64(1) << 32
+      fits = np.int64(1) << (np.frexp((range_ends - range_starts).astype(np.float64))[1] - 1)   # biggest power of 2 that fits
+      sizes = np.minimum(aligned, fits)
+      out_starts.append(range_starts)
+      out_bits.append(33 - np.frexp(sizes.astype(np.float64))[1])
+      range_starts = range_starts + sizes
+      left = range_starts < range_ends
+      range_starts, range_ends = range_starts[left], range_ends[left]
+   out_starts, out_bits = np.concatenate(out_starts), np.concatenate(out_bits)
+   order = np.argsort(out_starts, kind="stable")
+   return out_starts[order], out_bits[order]
+
+# get the smallest single network that covers every network given (arrays of first address and network bits), (address, bits)
+def coveringNetwork(starts, bits):
+   first = int(starts.min())
+   last = int((starts + (np.int64(1) << (32 - bits)) - 1).max())
+   common = commonBits(first, last)
+   return first & cidrMask(common), common
@@ -1,15 +1,28 @@
 #!/usr/bin/env python3
 
+import asyncio
+import base64
+import binascii
+import json
+import os
+import numpy as np
 from typing import Optional
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from ipv4 import addrToInt, intToAddr, intsToAddrs, numOnes, cidrMask, commonBits, addrClass, class_bits, class_table, classifyAddrs
+from ipv4 import cidrToInt, intToCidr, parseNetworks, summarizeNetworks, coveringNetwork
+from allocator import Pool, strategies
+from prefixes import readPrefixes, loadPrefixes
 
 api_desc = """ 
    ### Ailbhe Byrne
 
-   This is a webservice using FastAPI that includes 3 endpoints, which send and and receive JSON data.
+   This is a webservice using FastAPI that includes 12 endpoints, which send and and receive JSON data.
 
-   The 3 endpoints consist of an IP calculator, a subnet calculator and a supernet calculator.
+   The 12 endpoints consist of an IP calculator (for one address or a batch of addresses), a subnet calculator, a supernet calculator,
+   a subnet allocator (add a pool, list pools, allocate, find and free subnets) and a prefix lookup (load a table of prefixes, get
+   information about it and find the longest prefix addresses are in).
 
 """
 
@@ -35,6 +48,22 @@ supernet_desc = """
    It will return information about the supernet consisting of: the network in CIDR notation and the network mask.
 """
 
+allocator_desc = """
+   These endpoints give out subnets of any size (variable length subnet masks) from pool networks and take them back when they are freed.
+   A pool is added with a network in CIDR notation, then subnets with a number of network bits are allocated from it, i.e. a /26 from
+   10.0.0.0/8. Free space is kept with the buddy system, so allocating and freeing stay quick with thousands of subnets in a pool.  
+
+   Pools are only kept in memory, so they are gone when the server restarts.
+"""
+
+prefix_desc = """
+   These endpoints find the longest prefix (most specific network) in a table of prefixes that each address is in, i.e. for routing
+   tables or lists of networks of each customer. The table is loaded from text with one prefix in CIDR notation on each line, with a value
+   after it (i.e. a next hop), and can have hundreds of thousands of prefixes. Batches of addresses are looked up together.  
+
+   The table can also be loaded when the server starts, from a file named in the IPCALC_PREFIXES environment variable.
+"""
+
 tags_metadata = [
    {
    "name": "IP Calculator",
@@ -47,6 +76,14 @@ tags_metadata = [
    {
    "name": "Supernet Calculator",
    "description": supernet_desc,
+   },
+   {
+   "name": "Subnet Allocator",
+   "description": allocator_desc,
+   },
+   {
+   "name": "Prefix Lookup",
+   "description": prefix_desc,
    }
 ]
 
@@ -54,6 +91,17 @@ class Address(BaseModel):
    address: Optional[str] = None
    mask: Optional[str] = None
    addresses: Optional[list] = None
+   packed: Optional[str] = None
+   offset: Optional[int] = None
+   limit: Optional[int] = None
+   stream: Optional[bool] = False
+   summarize: Optional[bool] = False
+
+class Allocation(BaseModel):
+   network: Optional[str] = None
+   bits: Optional[int] = None
+   strategy: Optional[str] = "best"
+   subnet: Optional[str] = None
 
 app = FastAPI(
    title="CA304 Networks 2 Assignment 1",
@@ -107,10 +155,14 @@ ipcalc_desc2 = """
 @app.post("/ipcalc/", tags=["IP Calculator"], description=ipcalc_desc2)
 async def ip_info(address: Address):
    addr_dict = address.dict()
-   ip = addr_dict["address"]
-   ip_first_dec = int(ip.split(".")[0])
-
-   ip_cls = findClass(ip_first_dec)             # get class of ip address
+   try:
+      ip = addrToInt(addr_dict["address"])      # change ip address to integer
+   except ValueError as e:
+      return {
+               "status": "Error, " + str(e)
+             }
+
+   ip_cls = addrClass(ip)                       # get class of ip address
    nets, hosts, first, last = netTable(ip_cls)  # get class information from table
    return {
             "class": ip_cls,
@@ -120,53 +172,122 @@ async def ip_info(address: Address):
             "last_address": last
           }
 
-# dictionary of information about the classes
+# get information about a class from the dictionary of information about the classes
 def netTable(ip_cls):
-   nets_hosts_range = {
-                        "A": (128, 16777216, "0.0.0.0", "127.255.255.255"),
-                        "B": (16384, 65536, "128.0.0.0", "191.255.255.255"),
-                        "C": (2097152, 256, "192.0.0.0", "223.255.255.255"),
-                        "D": ("N/A", "N/A", "224.0.0.0", "239.255.255.255"),
-                        "E": ("N/A", "N/A", "240.0.0.0", "255.255.255.255")
-                      }
-   return nets_hosts_range[ip_cls]
-
-# get class of ip address (takes first number of ip address)
-def findClass(dec):
-   b_num = decToBin(dec)   # get number in binary
-   if b_num[0] == "0":
-      return "A"
-   elif b_num[:2] == "10":
-      return "B"
-   elif b_num[:3] == "110":
-      return "C"
-   elif b_num[:4] == "1110":
-      return "D"
-   elif b_num[:4] == "1111":
-      return "E"
-
-# change decimal number to binary (string)
-def decToBin(dec):
-   b_num = ""
-   while dec != 0:
-      r = dec % 2
-      b_num += str(r)
-      dec = dec // 2
-   while len(b_num) < 8:
-      b_num += "0"
-   return b_num[::-1]
+   return class_table[ip_cls]
+
+batch_desc = """
+   The input is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "addresses": list  
+   }  
+   or  
+   {  
+   &nbsp;&nbsp; "packed": "string"  
+   }  
+
+   The list for addresses should be a list of IP addresses in decimal dot notation as strings.  
+
+   The string for packed should be the addresses packed in 4 bytes each (first number of the address first), encoded in base64.
+   This is much quicker to send and read than a list for millions of addresses, i.e. in Python:
+   base64.b64encode(numpy.array(addresses, dtype=">u4").tobytes()).
+
+   The output is JSON data with the same fields as /ipcalc/, but each field is a list with one item for each address (in the same order
+   as the input), along with the number of addresses:  
+   {  
+   &nbsp;&nbsp; "count": integer,  
+   &nbsp;&nbsp; "class": list,  
+   &nbsp;&nbsp; "num_networks": list,  
+   &nbsp;&nbsp; "num_hosts": list,  
+   &nbsp;&nbsp; "first_address": list,  
+   &nbsp;&nbsp; "last_address": list  
+   }  
+
+   The addresses are all read into an array of integers at once and their classes are worked out together, so a batch is much quicker than
+   a request to /ipcalc/ for each address. The same can be done without the webservice with classifyAddrs in ipv4.py, which takes a list
+   of addresses, text with one address on each line or an array of integers and returns the fields as numpy arrays.  
+
+   If an address is not an IP address, the output is:  
+   {  
+   &nbsp;&nbsp; "status": "Error, address 1 is not an ip address: '192.168.10'"  
+   }  
+
+   **Example input:**  
+   {  
+   &nbsp;&nbsp; "addresses":["10.0.0.1", "192.168.10.0"]  
+   }  
+
+   **Example output:**  
+   {  
+   &nbsp;&nbsp; "count":2,  
+   &nbsp;&nbsp; "class":["A","C"],  
+   &nbsp;&nbsp; "num_networks":[128,2097152],  
+   &nbsp;&nbsp; "num_hosts":[16777216,256],  
+   &nbsp;&nbsp; "first_address":["0.0.0.0","192.0.0.0"],  
+   &nbsp;&nbsp; "last_address":["127.255.255.255","223.255.255.255"]  
+   }
+"""
+
+# IP Calculator for a batch of addresses
+@app.post("/ipcalc/batch/", tags=["IP Calculator"], description=batch_desc)
+def ip_info_batch(address: Address):
+   addrs = batchAddrs(address.dict())
+   if isinstance(addrs, str):
+      return {
+               "status": addrs
+             }
+   try:
+      columns = classifyAddrs(addrs)   # class and class information of every address
+   except ValueError as e:
+      return {
+               "status": "Error, " + str(e)
+             }
+   result = {"count": len(columns["class"])}
+   for key, column in columns.items():
+      result[key] = column.tolist()
+   return JSONResponse(result)   # lists are sent as they are, without fastapi checking every item
+
+# get addresses of a batch from input (list, or array of packed addresses), or error status if there are none or packed is wrong
+def batchAddrs(addr_dict):
+   if addr_dict["packed"] is not None:
+      try:
+         packed = base64.b64decode(addr_dict["packed"], validate=True)
+      except binascii.Error:
+         packed = b"-"   # not base64, so the length is wrong too
+      if len(packed) % 4 != 0:
+         return "Error, packed must be addresses packed in 4 bytes each, encoded in base64"
+      return np.frombuffer(packed, dtype=">u4")   # addresses packed in 4 bytes each, first number first
+   elif addr_dict["addresses"] is not None:
+      return addr_dict["addresses"]
+   return "Error, addresses or packed must be given"
+
 
 subnet_desc2 = """
    The input is JSON data in the form of:  
    {  
    &nbsp;&nbsp; "address": "string",  
-   &nbsp;&nbsp; "mask": "string"  
+   &nbsp;&nbsp; "mask": "string",  
+   &nbsp;&nbsp; "offset": integer,  
+   &nbsp;&nbsp; "limit": integer,  
+   &nbsp;&nbsp; "stream": boolean  
    }  
 
    The string for address should be an IP address in decimal dot notation.  
    
    The string for mask should be an IP address in decimal dot notation.
 
+   The integers for offset and limit are optional. If they are given, the lists in the output only have the subnets from number offset
+   (starting at 0, default 0) and at most limit of them (default all the rest), i.e. offset 0 and limit 100 for the first page of 100
+   subnets. num_subnets is still the number of subnets of the whole mask, and with offset or limit (or stream) the subnets go through
+   all num_subnets of them (i.e. 1024 for 172.16.0.0 with mask 255.255.255.192), so every offset below num_subnets gives a page.
+   Without offset, limit and stream the lists are as they always were, which for a class B mask ending in the last number only has
+   one subnet for each value of the 3rd number. Any page is worked out straight away without making the
+   subnets before it, as subnet number i starts at (network address + i * block size).
+
+   The boolean for stream is optional (default false). If it is true, the output is one line of JSON data for each subnet (from offset,
+   at most limit) sent as they are made, in the form of:  
+   {"valid_subnet": "string", "broadcast_address": "string", "first_address": "string", "last_address": "string"}
+
    The output is JSON data in the form of:  
    {  
    &nbsp;&nbsp; "address_cidr": "string",  
@@ -210,6 +331,29 @@ subnet_desc2 = """
    &nbsp;&nbsp; "last_addresses":["172.16.63.254","172.16.127.254","172.16.191.254","172.16.255.254"]  
    }
 
+   **Example input (page):**  
+   {  
+   &nbsp;&nbsp; "address": "172.16.0.0",  
+   &nbsp;&nbsp; "mask": "255.255.192.0",  
+   &nbsp;&nbsp; "offset": 2,  
+   &nbsp;&nbsp; "limit": 1  
+   }  
+
+   **Example output (page):**  
+   {  
+   &nbsp;&nbsp; "address_cidr":"172.16.0.0/18",  
+   &nbsp;&nbsp; "num_subnets":4,  
+   &nbsp;&nbsp; "addressable_hosts_per_subnet":16382,  
+   &nbsp;&nbsp; "valid_subnets":["172.16.128.0"],  
+   &nbsp;&nbsp; "broadcast_addresses":["172.16.191.255"],  
+   &nbsp;&nbsp; "first_addresses":["172.16.128.1"],  
+   &nbsp;&nbsp; "last_addresses":["172.16.191.254"]  
+   }
+
+   **Example output (stream, offset 2):**  
+   {"valid_subnet":"172.16.128.0","broadcast_address":"172.16.191.255","first_address":"172.16.128.1","last_address":"172.16.191.254"}  
+   {"valid_subnet":"172.16.192.0","broadcast_address":"172.16.255.255","first_address":"172.16.192.1","last_address":"172.16.255.254"}
+
 """
 
 # Subnet Calculator
@@ -217,21 +361,40 @@ subnet_desc2 = """
 def subnet_info(address: Address):
    addr_dict = address.dict()
    ip = addr_dict["address"]
-   ip_first_dec = int(ip.split(".")[0])
-   ip_cls = findClass(ip_first_dec)   # get class of ip address
-
-   mask = addr_dict["mask"]
-   b_mask_lst = binLst(mask)          # change subnet mask to list of binary strings
-
-   cidr_num = numBits(b_mask_lst)        # get number used for cidr notation (number of 1's in subnet mask)
+   try:
+      ip_int = addrToInt(ip)                # change ip address to integer
+      mask = addrToInt(addr_dict["mask"])   # change subnet mask to integer
+   except ValueError as e:
+      return {
+               "status": "Error, " + str(e)
+             }
+   ip_cls = addrClass(ip_int)         # get class of ip address
+   if ip_cls not in ("B", "C"):
+      return {
+               "status": "Error, subnet calculator only takes class B and C addresses"
+             }
+
+   cidr_num = numOnes(mask)              # get number used for cidr notation (number of 1's in subnet mask)
    cidr_addr = ip + "/" + str(cidr_num)  # change ip address to cidr notation
-   
-   num_subnets, num_addr_hosts = numSubnetsHosts(b_mask_lst, ip_cls)   # get number of subnets and number of addressable hosts
-   block, valid_addr_nums = validSubnets(mask, ip_cls)                 # get block number, list of numbers of valid subnets
-   valid_subnets = addrLst(ip, ip_cls, valid_addr_nums, "valid")       # get list of valid subnet addresses
-   broadcast_addr = addrLst(ip, ip_cls, broadcastNums(block, valid_addr_nums), "bc")   # get list of broadcast addresses
-   first_addr = addrLst(ip, ip_cls, firstNums(ip_cls, valid_addr_nums), "first")       # get list of first addresses
-   last_addr = addrLst(ip, ip_cls, lastNums(ip_cls, block, valid_addr_nums), "last")   # get list of last addresses
+
+   num_subnets, num_addr_hosts = numSubnetsHosts(mask, ip_cls)   # get number of subnets and number of addressable hosts
+   offset, limit = addr_dict["offset"], addr_dict["limit"]
+   if offset is None and limit is None and not addr_dict["stream"]:
+      size, subnets = validSubnets(ip_int, mask, ip_cls)         # get number of addresses in each subnet, range of valid subnets
+   else:
+      size, subnets = allSubnets(ip_int, mask, ip_cls)           # pages and streams go through all num_subnets subnets
+   if (offset is not None and offset < 0) or (limit is not None and limit < 0):
+      return {
+               "status": "Error, offset and limit can't be negative"
+             }
+   subnets = subnets[offset:None if limit is None else (offset or 0) + limit]   # only the subnets asked for, still a range
+   if addr_dict["stream"]:
+      return StreamingResponse(stream_subnets(subnets, size), media_type="application/x-ndjson")
+
+   valid_subnets = intsToAddrs(subnets)                               # get list of valid subnet addresses
+   broadcast_addr = intsToAddrs(moveRange(subnets, size - 1))         # get list of broadcast addresses (last address of each subnet)
+   first_addr = intsToAddrs(moveRange(subnets, 1))                    # get list of first addresses (after subnet address)
+   last_addr = intsToAddrs(moveRange(subnets, size - 2))              # get list of last addresses (before broadcast address)
    return {
             "address_cidr": cidr_addr,
             "num_subnets": num_subnets,
@@ -242,82 +405,58 @@ def subnet_info(address: Address):
             "last_addresses": last_addr,
           }
 
-# turn subnet mask into list of binary strings
-def binLst(mask):
-   mask_lst = mask.split(".")
-   return [decToBin(int(n)) for n in mask_lst]
-
-# get rid of 0's, get sum of length of remaining 1's, in list of binary strings
-def numBits(b_mask_lst):
-   return sum([len(b.replace("0", "")) for b in b_mask_lst])
-
-# get number of subnets and number of addressable hosts from subnet mask as list of binary strings and ip class
-def numSubnetsHosts(b_mask_lst, ip_cls):
-   if ip_cls == "B":
-      bits = numBits(b_mask_lst[2:])   # get number of 1's in last 16 binary digits
-      num_subnets = 2 ** bits
-      num_addr_hosts = (2 ** (16 - bits)) - 2  # 16 - bits = number of 0's in last 16 binary digits
-      return num_subnets, num_addr_hosts
-   elif ip_cls == "C":
-      bits = numBits(b_mask_lst[3])    # get number of 1's in last 8 binary digits
-      num_subnets = 2 ** bits
-      num_addr_hosts = (2 ** (8 - bits)) - 2   # 8 - bits = number of 0's in last 8 binary digits
-      return num_subnets, num_addr_hosts
-
-# get valid subnet numbers from subnet mask and ip class, returns block and list of numbers as strings
-def validSubnets(mask, ip_cls):
-   if ip_cls == "B":
-      mask_num = int(mask.split(".")[2])    # class B: subnet mask number is 3rd number
-   elif ip_cls == "C":
-      mask_num = int(mask.split(".")[3])    # class C: subnet mask number is last number
+# get number of subnets and number of addressable hosts from subnet mask and ip class
+def numSubnetsHosts(mask, ip_cls):
+   host_bits = 32 - class_bits[ip_cls]                         # class B: last 16 bits, class C: last 8 bits
+   bits = numOnes(mask & ~cidrMask(class_bits[ip_cls]))        # get number of 1's in host bits of the class
+   num_subnets = 2 ** bits
+   num_addr_hosts = (2 ** (host_bits - bits)) - 2              # host_bits - bits = number of 0's in host bits of the class
+   return num_subnets, num_addr_hosts
+
+# get valid subnets from ip address, subnet mask and ip class (as integers), returns number of addresses in each subnet and range of
+# subnet addresses as integers (so subnet i, len and slices are worked out without making a list)
+# only the number of the mask for the subnet number of the class is used (class B: 3rd number, class C: last number), so a class B
+# mask that ends in the last number gives fewer subnets than num_subnets, kept as it was for the response without offset or limit
+def validSubnets(ip, mask, ip_cls):
+   shift = 24 - class_bits[ip_cls]          # class B: subnet number is 3rd number, class C: subnet number is last number
+   mask_num = (mask >> shift) & 255
    block = 256 - mask_num                   # block size = amount between valid subnets
-   valid_addr_nums = []
-   valid = 0
-   while valid <= mask_num:
-      valid_addr_nums.append(str(valid))    # add string of valid subnet number to list
-      valid += block
-   return block, valid_addr_nums
-
-# change ip address and list of numbers pertaining to certain types of addresses to a list of ip addresses as strings
-def addrLst(ip, ip_cls, addr_nums, type_addr=None):
-   last_num_B = {"valid": "0", "bc": "255", "first": "1", "last": "254"}   # dictionary for last number of class B addresses, depending on type of address
-   ip_lst = ip.split(".")
-   valid = []
-   lst_cpy = []
-   for num in addr_nums:
-      if ip_cls == "B":
-         lst_cpy = ip_lst[:2] + [num] + [last_num_B[type_addr]]   # class B: ip address = first 2 nums of ip + num from list + num for type of address
-      elif ip_cls == "C":
-         lst_cpy = ip_lst[:3] + [num]                             # class C: ip address = first 3 nums of ip + num from list
-      valid.append(".".join(lst_cpy))                             # join list on . to make string for ip address
-   return valid
-
-# get list of numbers used for broadcast addresses for each subnet
-def broadcastNums(block, valid_addr_nums):
-   return [str(-1 + block + int(n)) for n in valid_addr_nums]   # valid subnet number + block - 1
-
-# get list of numbers used for first addresses for each subnet
-def firstNums(ip_cls, valid_addr_nums):
-   if ip_cls == "B":
-      return valid_addr_nums      # class B: same number as valid subnet (last number changes)
-   elif ip_cls == "C":
-      return [str(1 + int(n)) for n in valid_addr_nums]   # class C: next number after valid subnet
-
-# get list of numbers used for last addresses for each subnet
-def lastNums(ip_cls, block, valid_addr_nums):
-   if ip_cls == "B":
-      return broadcastNums(block, valid_addr_nums)        # class B: same number as broadcast address (last number changes)
-   elif ip_cls == "C":
-      return [str(-2 + block + int(n)) for n in valid_addr_nums]   # class C: number before broadcast address
+   network = ip & cidrMask(class_bits[ip_cls])
+   count = mask_num // block + 1            # valid subnet numbers go from 0 up to mask_num in steps of block
+   return block << shift, range(network, network + count * (block << shift), block << shift)
+
+# get every subnet from ip address, subnet mask and ip class (as integers), as for validSubnets but the range has all 2 ^ subnet bits
+# subnets, the same number as num_subnets, even when a class B mask ends in the last number
+def allSubnets(ip, mask, ip_cls):
+   host_bits = 32 - class_bits[ip_cls]
+   bits = numOnes(mask & ~cidrMask(class_bits[ip_cls]))   # subnet bits, as for numSubnetsHosts
+   size = 1 << (host_bits - bits)                         # block size = amount between valid subnets
+   network = ip & cidrMask(class_bits[ip_cls])
+   return size, range(network, network + (1 << host_bits), size)
+
+# get range with amount added to every number in it
+def moveRange(numbers, amount):
+   return range(numbers.start + amount, numbers.stop + amount, numbers.step)
+
+# send a line of JSON data for each subnet, a few hundred lines at a time
+def stream_subnets(subnets, size):
+   for start in range(0, len(subnets), 256):
+      part = subnets[start:start + 256]
+      lines = zip(intsToAddrs(part), intsToAddrs(moveRange(part, size - 1)), intsToAddrs(moveRange(part, 1)), intsToAddrs(moveRange(part, size - 2)))
+      yield "".join(json.dumps({"valid_subnet": valid, "broadcast_address": bc, "first_address": first, "last_address": last}, separators=(",", ":")) + "\n"
+                    for valid, bc, first, last in lines)
 
 supernet_desc2 = """
    The input is JSON data in the form of:  
    {  
    &nbsp;&nbsp; "addresses": list,  
+   &nbsp;&nbsp; "summarize": boolean  
    }
 
    The list for addresses should be a list of contiguous class C IP addresses as strings.  
 
+   The boolean for summarize is optional (default false), see below.
+
    The output is JSON data in the form of:  
    {  
    &nbsp;&nbsp; "address": "string",  
@@ -328,6 +467,26 @@ supernet_desc2 = """
 
    The string for mask will be the network mask. (binary number made from network bits + trailing 0's, changed into decimal dot notation)  
 
+   The number of network bits is the number of leading bits every address has in common, which is the number the lowest and highest
+   address have in common. A list of one address gives 32 bits.  
+
+   If summarize is true, the list for addresses can be any networks in CIDR notation (i.e. "10.1.0.0/16") in any order, which can overlap
+   or be next to each other. An address without "/" is a single address (/32) and host bits of a network are ignored. The output is:  
+   {  
+   &nbsp;&nbsp; "address": "string",  
+   &nbsp;&nbsp; "mask": "string",  
+   &nbsp;&nbsp; "networks": list,  
+   &nbsp;&nbsp; "num_networks": integer  
+   }  
+
+   The string for address will be the smallest single network that covers every network in the list (in CIDR notation, starting at its
+   network address), and mask its network mask.  
+
+   The list for networks will be the fewest networks in CIDR notation that cover exactly the same addresses as the list (route
+   summarization), in order of address. The networks are sorted as integers and joined in one pass, so millions of networks can be sent.  
+
+   The integer for num_networks will be the length of the list for networks.  
+
    **Example input:**  
    {  
     &nbsp;&nbsp; "addresses":["205.100.0.0","205.100.1.0","205.100.2.0","205.100.3.0"]  
@@ -338,6 +497,20 @@ supernet_desc2 = """
    &nbsp;&nbsp; "address":"205.100.0.0/22",  
    &nbsp;&nbsp; "mask":"255.255.252.0"  
    }
+
+   **Example input (summarize):**  
+   {  
+    &nbsp;&nbsp; "addresses":["10.0.1.0/24","10.0.0.0/24","10.0.2.0/23","10.0.2.128/25","10.0.8.0/24"],  
+    &nbsp;&nbsp; "summarize":true  
+   }  
+
+   **Example output (summarize):**  
+   {  
+   &nbsp;&nbsp; "address":"10.0.0.0/20",  
+   &nbsp;&nbsp; "mask":"255.255.240.0",  
+   &nbsp;&nbsp; "networks":["10.0.0.0/22","10.0.8.0/24"],  
+   &nbsp;&nbsp; "num_networks":2  
+   }
 """
 
 # Supernet Calculator
@@ -345,8 +518,19 @@ supernet_desc2 = """
 def supernet_info(address: Address):
    addr_dict = address.dict()
    addr_lst = addr_dict["addresses"]
-   b_lst = [binLst(addr) for addr in addr_lst]    # change addresses to lists of binary strings
-   cidr_num = bitsNetworkMask(b_lst)              # get cidr number of network
+   if not addr_lst:
+      return {
+               "status": "Error, addresses must be given"
+             }
+   if addr_dict["summarize"]:
+      return summarize_networks(addr_lst)
+   try:
+      addr_ints = [addrToInt(addr) for addr in addr_lst]   # change addresses to integers
+   except ValueError as e:
+      return {
+               "status": "Error, " + str(e)
+             }
+   cidr_num = bitsNetworkMask(addr_ints)          # get cidr number of network
    cidr_addr = addr_lst[0] + "/" + str(cidr_num)  # change address to cidr notation of network
    net_mask_addr = networkMaskAddr(cidr_num)      # get ip address of network mask
    return {
@@ -354,35 +538,473 @@ def supernet_info(address: Address):
             "mask": net_mask_addr
           }
 
-# get number of bits in network mask (common prefix of ip addresses in binary), from list of lists of binary strings
-def bitsNetworkMask(b_lst):
-   b_str_lst = ["".join(b) for b in b_lst]    # change list of lists to a list of strings
-   counts = []
-   for i in range(1, len(b_str_lst)):         # i to compare every binary string to first binary string
-      same_count = 0
-      for j in range(len(b_str_lst[0])):          # j to compare characters of strings
-         if b_str_lst[0][j] == b_str_lst[i][j]:   # if characters match
-            same_count += 1                       # count number of matching characters
-         else:                             # if characters don't match
-            counts.append(same_count)      # add count to list
-            break                          # exit inner for loop
-   return min(counts)        # smallest in list is earliest they didn't match (common prefix)
+# get number of bits in network mask (common prefix of ip addresses in binary), from list of addresses as integers
+# every address is between the lowest and highest, so they have the bits the lowest and highest have in common
+def bitsNetworkMask(addr_ints):
+   return commonBits(min(addr_ints), max(addr_ints))
+
+# summarize list of networks for /supernet/ with summarize
+def summarize_networks(networks):
+   try:
+      starts, bits = parseNetworks(networks)
+   except ValueError as e:
+      return {
+               "status": "Error, " + str(e)
+             }
+   network, cidr_num = coveringNetwork(starts, bits)   # smallest network covering all of them
+   starts, bits = summarizeNetworks(starts, bits)       # fewest networks covering the same addresses
+   summary = [addr + "/" + num for addr, num in zip(intsToAddrs(starts.tolist()), bits.astype(str).tolist())]
+   return JSONResponse({
+                         "address": intToCidr(network, cidr_num),
+                         "mask": networkMaskAddr(cidr_num),
+                         "networks": summary,
+                         "num_networks": len(summary),
+                       })
 
 # get network mask address from cidr number of network mask
 def networkMaskAddr(cidr_num):
-   ones = cidr_num
-   zeros = 32 - cidr_num     # an address is 32 bits long
-   b_str = "1" * ones + "0" * zeros
-   b_lst = []
-   for i in range(0, len(b_str), 8):    # i increases in jumps of 8
-      b_lst.append(b_str[i:i + 8])      # add binary numbers as strings of length 8
-   net_mask_addr = [str(binToDec(b_num)) for b_num in b_lst]   # change binary numbers to decimal numbers (string)
-   return ".".join(net_mask_addr)                              # join on . to make ip address
-
-# change binary number to decimal
-def binToDec(b_num):
-   b_num = b_num[::-1]
-   dec = 0
-   for i in range(len(b_num)):
-      dec += int(b_num[i]) * (2 ** i)
-   return dec
+   return intToAddr(cidrMask(cidr_num))   # cidr_num 1's followed by 0's, in decimal dot notation
+
+pools = {}   # keys = network of pool in cidr notation, values = Pool
+
+pool_desc = """
+   The input is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "network": "string"  
+   }  
+
+   The string for network should be the network of the pool in CIDR notation, i.e. 10.0.0.0/8. The address must be the first address of
+   the network.
+
+   The output is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "network": "string",  
+   &nbsp;&nbsp; "size": integer,  
+   &nbsp;&nbsp; "free_addresses": integer,  
+   &nbsp;&nbsp; "allocated_subnets": integer,  
+   &nbsp;&nbsp; "free_blocks": dictionary  
+   }  
+
+   The integer for size will be the number of addresses in the pool.  
+
+   The integer for free_addresses will be the number of addresses not in an allocated subnet.  
+
+   The integer for allocated_subnets will be the number of subnets allocated from the pool.  
+
+   The dictionary for free_blocks will have the number of free blocks of each size, i.e. {"/9": 1, "/10": 1}. A free block can be split
+   into subnets of its size or smaller.  
+
+   **Example input:**  
+   {  
+   &nbsp;&nbsp; "network": "10.0.0.0/8"  
+   }  
+
+   **Example output:**  
+   {  
+   &nbsp;&nbsp; "network":"10.0.0.0/8",  
+   &nbsp;&nbsp; "size":16777216,  
+   &nbsp;&nbsp; "free_addresses":16777216,  
+   &nbsp;&nbsp; "allocated_subnets":0,  
+   &nbsp;&nbsp; "free_blocks":{"/8":1}  
+   }
+
+   **Example output (already added):**  
+   {  
+   &nbsp;&nbsp; "status": "Error, pool 10.0.0.0/8 already exists"  
+   }
+"""
+
+# add pool to allocate subnets from
+@app.post("/pool/", tags=["Subnet Allocator"], description=pool_desc)
+async def add_pool(allocation: Allocation):
+   alloc_dict = allocation.dict()
+   try:
+      network, bits = cidrToInt(alloc_dict["network"] or "")
+      pool = Pool(network, bits)
+   except ValueError as e:
+      return {
+               "status": "Error, " + str(e)
+             }
+   name = intToCidr(network, bits)
+   if name in pools:
+      return {
+               "status": "Error, pool " + name + " already exists"
+             }
+   pools[name] = pool
+   return pool.stats()
+
+pools_desc = """
+   There is no input.
+
+   The output is JSON data with the information about each pool (same form as the output of POST /pool/):  
+   {  
+   &nbsp;&nbsp; "pools": list  
+   }  
+
+   **Example output:**  
+   {  
+   &nbsp;&nbsp; "pools": [{"network":"10.0.0.0/8","size":16777216,"free_addresses":16777152,"allocated_subnets":1,"free_blocks":{"/9":1,...,"/26":1}}]  
+   }
+"""
+
+# get information about every pool
+@app.get("/pool/", tags=["Subnet Allocator"], description=pools_desc)
+async def list_pools():
+   return {
+            "pools": [pool.stats() for pool in pools.values()]
+          }
+
+allocate_desc = """
+   The input is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "network": "string",  
+   &nbsp;&nbsp; "bits": integer,  
+   &nbsp;&nbsp; "strategy": "string"  
+   }  
+
+   The string for network should be a pool added with POST /pool/, in CIDR notation.  
+
+   The integer for bits should be the number of network bits of the subnet, from the number of bits of the pool to 32, i.e. 26 for a
+   subnet of 64 addresses.  
+
+   The string for strategy is optional and can be best (default) or first. best takes the subnet from the smallest free block it fits in,
+   which keeps big blocks free for big subnets. first takes the subnet with the lowest address it can have.  
+
+   The output is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "subnet": "string",  
+   &nbsp;&nbsp; "mask": "string",  
+   &nbsp;&nbsp; "first_address": "string",  
+   &nbsp;&nbsp; "last_address": "string",  
+   &nbsp;&nbsp; "free_addresses": integer  
+   }  
+
+   The string for subnet will be the subnet given out in CIDR notation, and mask its subnet mask.  
+
+   The strings for first_address and last_address will be the first and last address of the subnet (subnet address and broadcast address).  
+
+   The integer for free_addresses will be the number of addresses left in the pool.  
+
+   **Example input:**  
+   {  
+   &nbsp;&nbsp; "network": "10.0.0.0/8",  
+   &nbsp;&nbsp; "bits": 26  
+   }  
+
+   **Example output:**  
+   {  
+   &nbsp;&nbsp; "subnet":"10.0.0.0/26",  
+   &nbsp;&nbsp; "mask":"255.255.255.192",  
+   &nbsp;&nbsp; "first_address":"10.0.0.0",  
+   &nbsp;&nbsp; "last_address":"10.0.0.63",  
+   &nbsp;&nbsp; "free_addresses":16777152  
+   }
+
+   **Example output (pool full):**  
+   {  
+   &nbsp;&nbsp; "status": "Error, no room for a /26 in pool 10.0.0.0/8"  
+   }
+"""
+
+# allocate subnet from a pool
+@app.post("/allocate/", tags=["Subnet Allocator"], description=allocate_desc)
+async def allocate_subnet(allocation: Allocation):
+   return allocateOrFind(allocation.dict(), True)
+
+find_desc = """
+   The input is the same as for /allocate/.
+
+   The output is the same as for /allocate/, but the subnet is not given out, it is the subnet /allocate/ would give out now. The
+   integer for free_addresses will be the number of addresses left in the pool as it is now.
+
+   **Example input:**  
+   {  
+   &nbsp;&nbsp; "network": "10.0.0.0/8",  
+   &nbsp;&nbsp; "bits": 24,  
+   &nbsp;&nbsp; "strategy": "first"  
+   }  
+
+   **Example output:**  
+   {  
+   &nbsp;&nbsp; "subnet":"10.0.1.0/24",  
+   &nbsp;&nbsp; "mask":"255.255.255.0",  
+   &nbsp;&nbsp; "first_address":"10.0.1.0",  
+   &nbsp;&nbsp; "last_address":"10.0.1.255",  
+   &nbsp;&nbsp; "free_addresses":16777152  
+   }
+"""
+
+# find subnet that would be allocated from a pool, without allocating it
+@app.post("/find/", tags=["Subnet Allocator"], description=find_desc)
+async def find_subnet(allocation: Allocation):
+   return allocateOrFind(allocation.dict(), False)
+
+# get pool from network in cidr notation (written any way, i.e. 010.0.0.0/8), None if there is no such pool
+def getPool(network):
+   try:
+      return pools.get(intToCidr(*cidrToInt(network or "")))
+   except ValueError:
+      return None
+
+# allocate subnet (or only find it) from pool in input, returns output for /allocate/ and /find/
+# endpoints using pools are async so they run one at a time on the event loop and do not change a pool at the same time
+def allocateOrFind(alloc_dict, allocate):
+   pool = getPool(alloc_dict["network"])
+   if pool is None:
+      return {
+               "status": "Error, pool " + str(alloc_dict["network"]) + " does not exist"
+             }
+   bits, strategy = alloc_dict["bits"], alloc_dict["strategy"]
+   if bits is None or strategy not in strategies:
+      return {
+               "status": "Error, bits must be given and strategy must be best or first"
+             }
+   try:
+      if allocate:
+         subnet = pool.allocate(bits, strategy)
+      else:
+         found = pool.find(bits, strategy)
+         subnet = found[0] if found is not None else None
+   except ValueError as e:
+      return {
+               "status": "Error, " + str(e)
+             }
+   if subnet is None:
+      return {
+               "status": "Error, no room for a /%d in pool %s" % (bits, alloc_dict["network"])
+             }
+   return {
+            "subnet": intToCidr(subnet, bits),
+            "mask": intToAddr(cidrMask(bits)),
+            "first_address": intToAddr(subnet),
+            "last_address": intToAddr(subnet + (1 << (32 - bits)) - 1),
+            "free_addresses": pool.free_addresses,
+          }
+
+free_desc = """
+   The input is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "network": "string",  
+   &nbsp;&nbsp; "subnet": "string"  
+   }  
+
+   The string for network should be a pool added with POST /pool/, in CIDR notation.  
+
+   The string for subnet should be a subnet allocated from the pool, in CIDR notation as given by /allocate/.  
+
+   The output is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "subnet": "string",  
+   &nbsp;&nbsp; "free_addresses": integer  
+   }  
+
+   The free subnet is joined back with free blocks next to it, so a bigger subnet can be allocated there again.
+
+   **Example input:**  
+   {  
+   &nbsp;&nbsp; "network": "10.0.0.0/8",  
+   &nbsp;&nbsp; "subnet": "10.0.0.0/26"  
+   }  
+
+   **Example output:**  
+   {  
+   &nbsp;&nbsp; "subnet":"10.0.0.0/26",  
+   &nbsp;&nbsp; "free_addresses":16777216  
+   }
+
+   **Example output (not allocated):**  
+   {  
+   &nbsp;&nbsp; "status": "Error, 10.0.0.64/26 is not allocated from pool 10.0.0.0/8"  
+   }
+"""
+
+# free subnet allocated from a pool
+@app.post("/free/", tags=["Subnet Allocator"], description=free_desc)
+async def free_subnet(allocation: Allocation):
+   alloc_dict = allocation.dict()
+   pool = getPool(alloc_dict["network"])
+   if pool is None:
+      return {
+               "status": "Error, pool " + str(alloc_dict["network"]) + " does not exist"
+             }
+   try:
+      subnet, bits = cidrToInt(alloc_dict["subnet"] or "")
+      pool.free(subnet, bits)
+   except ValueError as e:
+      return {
+               "status": "Error, " + str(e)
+             }
+   return {
+            "subnet": intToCidr(subnet, bits),
+            "free_addresses": pool.free_addresses,
+          }
+
+prefix_table = loadPrefixes(os.environ["IPCALC_PREFIXES"]) if os.environ.get("IPCALC_PREFIXES") else None   # PrefixTable or None
+
+load_prefixes_desc = """
+   The input is text (not JSON) with a prefix in CIDR notation on each line, optionally followed by a space, tab or comma and a value for
+   the prefix (i.e. a next hop or a name), which is given back by /lookup/. Lines that are empty or start with # are skipped. If a prefix
+   is on more than one line the last one is kept.
+
+   The table replaces the table loaded before, which is still used by lookups until the new one is ready.
+
+   The output is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "status": "string",  
+   &nbsp;&nbsp; "prefixes": integer,  
+   &nbsp;&nbsp; "longer_than_24": integer,  
+   &nbsp;&nbsp; "blocks": integer,  
+   &nbsp;&nbsp; "memory_mb": float  
+   }  
+
+   The string for status will be success, or an error if a line is not a prefix (then the table is not changed).  
+
+   The integer for prefixes will be the number of prefixes in the table.  
+
+   The integers for longer_than_24 and blocks will be the number of prefixes longer than /24 and the number of /24s they are in. The table
+   has an entry for every /24 (64 MB) and a block of 256 entries for each /24 with longer prefixes in it, so looking up an address is at
+   most 2 steps.  
+
+   The float for memory_mb will be the size of the table in MB.  
+
+   **Example input:**  
+   # prefix next hop  
+   10.0.0.0/8 192.168.0.1  
+   10.1.0.0/16 192.168.0.2  
+   10.1.2.128/25 192.168.0.3  
+
+   **Example output:**  
+   {  
+   &nbsp;&nbsp; "status":"success",  
+   &nbsp;&nbsp; "prefixes":3,  
+   &nbsp;&nbsp; "longer_than_24":1,  
+   &nbsp;&nbsp; "blocks":1,  
+   &nbsp;&nbsp; "memory_mb":64.0  
+   }
+
+   **Example output (wrong line):**  
+   {  
+   &nbsp;&nbsp; "status": "Error, network 1 does not have a number of bits from 0 to 32: '10.1.0.0/33'"  
+   }
+"""
+
+# load table of prefixes
+@app.post("/prefixes/", tags=["Prefix Lookup"], description=load_prefixes_desc)
+async def load_prefixes(request: Request):
+   global prefix_table
+   text = (await request.body()).decode(errors="replace")
+   try:
+      table = await asyncio.to_thread(readPrefixes, text)   # made on a thread so other requests are not held up
+   except ValueError as e:
+      return {
+               "status": "Error, " + str(e)
+             }
+   prefix_table = table
+   return {"status": "success", **table.stats()}
+
+prefixes_desc = """
+   There is no input.
+
+   The output is information about the table of prefixes, the same as the output of POST /prefixes/ without the status.
+
+   **Example output:**  
+   {  
+   &nbsp;&nbsp; "prefixes":3,  
+   &nbsp;&nbsp; "longer_than_24":1,  
+   &nbsp;&nbsp; "blocks":1,  
+   &nbsp;&nbsp; "memory_mb":64.0  
+   }
+
+   **Example output (not loaded):**  
+   {  
+   &nbsp;&nbsp; "status": "Error, no prefixes have been loaded"  
+   }
+"""
+
+# get information about table of prefixes
+@app.get("/prefixes/", tags=["Prefix Lookup"], description=prefixes_desc)
+async def prefixes_info():
+   if prefix_table is None:
+      return {
+               "status": "Error, no prefixes have been loaded"
+             }
+   return prefix_table.stats()
+
+lookup_desc = """
+   The input is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "address": "string"  
+   }  
+   or for a batch of addresses, the same as for /ipcalc/batch/:  
+   {  
+   &nbsp;&nbsp; "addresses": list  
+   }  
+   or  
+   {  
+   &nbsp;&nbsp; "packed": "string"  
+   }  
+
+   The string for address should be an IP address in decimal dot notation. The list for addresses and string for packed are described
+   in /ipcalc/batch/.
+
+   The output is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "address": "string",  
+   &nbsp;&nbsp; "prefix": "string",  
+   &nbsp;&nbsp; "value": "string"  
+   }  
+   or for a batch:  
+   {  
+   &nbsp;&nbsp; "count": integer,  
+   &nbsp;&nbsp; "prefix": list,  
+   &nbsp;&nbsp; "value": list  
+   }  
+
+   The string for prefix will be the longest prefix in the table the address is in, in CIDR notation, and value the value loaded with it.
+   Both are null if the address is not in any prefix or the prefix has no value. For a batch they are lists with one item for each address.  
+
+   **Example input:**  
+   {  
+   &nbsp;&nbsp; "addresses":["10.1.2.200", "10.1.9.9", "11.0.0.1"]  
+   }  
+
+   **Example output:**  
+   {  
+   &nbsp;&nbsp; "count":3,  
+   &nbsp;&nbsp; "prefix":["10.1.2.128/25","10.1.0.0/16",null],  
+   &nbsp;&nbsp; "value":["192.168.0.3","192.168.0.2",null]  
+   }
+"""
+
+# find longest prefix of address or batch of addresses
+@app.post("/lookup/", tags=["Prefix Lookup"], description=lookup_desc)
+def lookup_prefixes(address: Address):
+   table = prefix_table   # same table for the whole batch even if a new one is loaded
+   if table is None:
+      return {
+               "status": "Error, no prefixes have been loaded"
+             }
+   addr_dict = address.dict()
+   single = addr_dict["address"] is not None and addr_dict["addresses"] is None and addr_dict["packed"] is None
+   addrs = [addr_dict["address"]] if single else batchAddrs(addr_dict)
+   if isinstance(addrs, str):
+      return {
+               "status": addrs
+             }
+   try:
+      prefixes, values = table.match(addrs)
+   except ValueError as e:
+      return {
+               "status": "Error, " + str(e)
+             }
+   if single:
+      return {
+               "address": addr_dict["address"],
+               "prefix": prefixes[0],
+               "value": values[0],
+             }
+   return JSONResponse({
+                         "count": len(prefixes),
+                         "prefix": prefixes.tolist(),
+                         "value": values.tolist(),
+                       })
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import numpy as np
+from ipv4 import intToCidr, parseAddrs, parseNetworks
+
+# table of network prefixes for longest prefix match (which prefix in the table is the most specific one an address is in)
+# kept as a dir-24-8 table: one entry for every possible first 24 bits of an address (2^24 entries, 64 MB), holding the longest
+# prefix of /24 or shorter covering those addresses, or a pointer to a block of 256 entries (one for each last number) for the
+# /24s that have longer prefixes in them
+# a lookup is one or two array reads, so a batch of addresses is looked up with numpy indexing, millions a second
+# the table is made once from every prefix and not changed after, loading new prefixes makes a new table
+
+pointer = np.uint32(1 << 31)   # set in a 24 bit entry that points to a block of 256 entries
+
+class PrefixTable():
+
+   def __init__(self, networks=(), values=None):
+      starts, bits = parseNetworks(list(networks))   # ValueError if a network is not in cidr notation
+      if values is None:
+         values = [None] * len(starts)
+      starts, bits, values = self.unique(starts, bits, list(values))
+      self.starts = starts
+      self.bits = bits
+      self.names = np.array([intToCidr(s, b) for s, b in zip(starts.tolist(), bits.tolist())] + [None], dtype=object)   # None for -1
+      self.values = np.array(values + [None], dtype=object)
+      self.build()
+
+# get prefixes without repeats (the last one of each is kept), sorted by number of bits so longer prefixes are filled in last
+   def unique(self, starts, bits, values):
+      keys = starts * 64 + bits   # same key for the same prefix
+      last = len(keys) - 1 - np.unique(keys[::-1], return_index=True)[1]
+      order = last[np.argsort(bits[last], kind="stable")]
+      return starts[order], bits[order], [values[i] for i in order.tolist()]
+
+# fill in the 24 bit table and blocks of 256 entries, entry = number of prefix + 1 (0 = no prefix)
+   def build(self):
+      starts, bits = self.starts, self.bits
+      ids = np.arange(1, len(starts) + 1, dtype=np.uint32)
+      self.tbl24 = np.zeros(1 << 24, dtype=np.uint32)
+      short = bits <= 24
+      for length in range(0, 25):   # shorter prefixes first so longer ones are written over them
+         group = np.flatnonzero(short & (bits == length))
+         if len(group) == 0:
+            continue
+         count = 1 << (24 - length)   # 24 bit entries in each prefix
+         if count > 256:              # few prefixes this short, one slice each
+            for i in group.tolist():
+               self.tbl24[starts[i] >> 8:(starts[i] >> 8) + count] = ids[i]
+         else:
+            entries = ((starts[group] >> 8)[:, None] + np.arange(count)).ravel()
+            self.tbl24[entries] = np.repeat(ids[group], count)
+      long = np.flatnonzero(~short)
+      blocks = np.unique(starts[long] >> 8)                        # /24s with longer prefixes in them
+      self.tbl8 = np.repeat(self.tbl24[blocks], 256)              # start with the prefix covering the whole /24
+      self.tbl24[blocks] = pointer | np.arange(len(blocks), dtype=np.uint32)
+      block_of = np.searchsorted(blocks, starts[long] >> 8)
+      for length in range(25, 33):
+         group = bits[long] == length
+         if not group.any():
+            continue
+         count = 1 << (32 - length)
+         entries = ((block_of[group] * 256 + (starts[long][group] & 255))[:, None] + np.arange(count)).ravel()
+         self.tbl8[entries] = np.repeat(ids[long][group], count)
+
+# get number of the longest prefix each address is in (-1 if none), addresses as for parseAddrs
+   def lookup(self, addrs):
+      addrs = parseAddrs(addrs)
+      found = self.tbl24[addrs >> 8]
+      in_block = np.flatnonzero(found & pointer)
+      if len(in_block) > 0:
+         found[in_block] = self.tbl8[(found[in_block] & ~pointer).astype(np.int64) * 256 + (addrs[in_block] & 255)]
+      return found.astype(np.int64) - 1
+
+# get longest prefix (cidr notation) and its value for each address, None for addresses not in any prefix
+   def match(self, addrs):
+      found = self.lookup(addrs)
+      return self.names[found], self.values[found]
+
+# information about the table
+   def stats(self):
+      return {
+               "prefixes": len(self.starts),
+               "longer_than_24": int(np.count_nonzero(self.bits > 24)),
+               "blocks": len(self.tbl8) // 256,
+               "memory_mb": round((self.tbl24.nbytes + self.tbl8.nbytes) / (1 << 20), 1),
+             }
+
+# make table from text with a prefix in cidr notation on each line, optionally followed by a value (i.e. next hop or name) after a
+# space, tab or comma, lines that are empty or start with # are skipped
+def readPrefixes(text):
+   networks, values = [], []
+   for line in text.splitlines():
+      line = line.strip()
+      if line == "" or line.startswith("#"):
+         continue
+      parts = line.replace(",", " ", 1).split(None, 1)
+      networks.append(parts[0])
+      values.append(parts[1].strip() if len(parts) > 1 else None)
+   return PrefixTable(networks, values)
+
+# make table from a file (see readPrefixes)
+def loadPrefixes(path):
+   with open(path) as f:
+      return readPrefixes(f.read())
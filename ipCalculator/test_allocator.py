@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# invariants of the buddy allocator after random allocations and frees, run with "python3 -m pytest" in this directory
+
+import random
+from allocator import Pool
+from ipv4 import cidrToInt
+
+# every block given out or free is aligned, inside the pool and doesn't overlap any other, and together they cover the pool
+def check_pool(pool):
+   blocks = [(addr, bits) for addr, bits in pool.allocated.items()]
+   blocks += [(addr, bits) for bits, free in enumerate(pool.free_sets) for addr in free]
+   blocks.sort()
+   end = pool.network
+   for addr, bits in blocks:
+      size = 1 << (32 - bits)
+      assert addr % size == 0
+      assert addr == end   # no gap and no overlap with the block before
+      end = addr + size
+   assert end == pool.network + (1 << (32 - pool.bits))
+   assert pool.free_addresses == sum(1 << (32 - bits) for bits, free in enumerate(pool.free_sets) for addr in free)
+
+def test_allocate_and_free_keep_invariants():
+   rand = random.Random(16)
+   for strategy in ("best", "first"):
+      network, bits = cidrToInt("10.0.0.0/16")
+      pool = Pool(network, bits)
+      given = []
+      for _ in range(2000):
+         if given and rand.random() < 0.4:
+            addr, size = given.pop(rand.randrange(len(given)))
+            pool.free(addr, size)
+         else:
+            size = rand.randint(20, 32)
+            addr = pool.allocate(size, strategy)
+            if addr is None:   # only when no free block is big enough
+               assert all(not pool.free_sets[b] for b in range(bits, size + 1))
+            else:
+               assert addr % (1 << (32 - size)) == 0
+               given.append((addr, size))
+         check_pool(pool)
+      rand.shuffle(given)
+      for addr, size in given:   # freeing everything joins the pool back into one block
+         pool.free(addr, size)
+      check_pool(pool)
+      assert pool.allocated == {}
+      assert pool.free_sets[bits] == {network}
+      assert sum(len(free) for free in pool.free_sets) == 1
+
+def test_best_and_first_fit():
+   network, bits = cidrToInt("192.168.0.0/24")
+   pool = Pool(network, bits)
+   low = pool.allocate(25)    # 192.168.0.0/25
+   high = pool.allocate(26)   # 192.168.0.128/26
+   pool.free(low, 25)         # free: 192.168.0.0/25 and 192.168.0.192/26
+   assert pool.find(27, "best") == (high + 64, 26)   # smallest block big enough
+   assert pool.find(27, "first") == (low, 25)        # lowest address
+   check_pool(pool)
+
+def test_free_not_allocated():
+   network, bits = cidrToInt("192.168.0.0/24")
+   pool = Pool(network, bits)
+   addr = pool.allocate(26)
+   for args in ((addr, 27), (addr + 64, 26)):
+      try:
+         pool.free(*args)
+         assert False, args
+      except ValueError:
+         pass
+   check_pool(pool)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# batch functions in ipv4.py checked against the one address at a time functions, run with "python3 -m pytest" in this directory
+
+import ipaddress
+import random
+import numpy as np
+from ipv4 import addrToInt, intToAddr, addrClass, class_table, parseAddrs, classifyAddrs, parseNetworks, summarizeNetworks, intToCidr
+
+# random addresses, some written with leading zeros so they go through addrToInt instead of the vectorised parser
+def random_addrs(rand, n):
+   addrs = []
+   for _ in range(n):
+      nums = [rand.randrange(256) for _ in range(4)]
+      if rand.random() < 0.05:
+         addrs.append(".".join("%03d" % num for num in nums))
+      else:
+         addrs.append(".".join(str(num) for num in nums))
+   return addrs
+
+def test_addr_to_int_matches_ipaddress():
+   rand = random.Random(13)
+   for addr in random_addrs(rand, 1000):
+      n = addrToInt(addr)
+      assert n == int(ipaddress.IPv4Address(".".join(str(int(num)) for num in addr.split("."))))
+      assert addrToInt(intToAddr(n)) == n
+
+def test_parse_addrs_matches_addr_to_int():
+   rand = random.Random(14)
+   addrs = random_addrs(rand, 5000)
+   expected = [addrToInt(addr) for addr in addrs]
+   assert parseAddrs(addrs).tolist() == expected
+   assert parseAddrs("\n".join(addrs)).tolist() == expected
+   assert parseAddrs(("\r\n".join(addrs) + "\n").encode()).tolist() == expected
+   assert parseAddrs(np.array(expected, dtype=">u4")).tolist() == expected
+
+def test_parse_addrs_errors():
+   for bad in (["1.2.3.4", "1.2.3"], ["1.2.3.4", "256.0.0.1"], ["1.2.3.4", "a.b.c.d"], ["1.2.3.4\n5.6.7.8"]):
+      try:
+         parseAddrs(bad)
+         assert False, bad
+      except ValueError as e:
+         assert "address" in str(e)
+
+def test_classify_matches_scalar():
+   rand = random.Random(15)
+   addrs = random_addrs(rand, 5000) + ["0.0.0.0", "127.255.255.255", "128.0.0.0", "192.0.0.0", "224.0.0.0", "240.0.0.0", "255.255.255.255"]
+   columns = classifyAddrs(addrs)
+   for i, addr in enumerate(addrs):
+      cls = addrClass(addrToInt(addr))
+      nets, hosts, first, last = class_table[cls]
+      assert columns["class"][i] == cls
+      assert columns["num_networks"][i] == nets
+      assert columns["num_hosts"][i] == hosts
+      assert columns["first_address"][i] == first
+      assert columns["last_address"][i] == last
+
+# random networks, mostly close together so they overlap and touch
+def random_networks(rand, n):
+   networks = []
+   for _ in range(n):
+      bits = rand.choice([0, 8, 16] + list(range(18, 33)) * 3)
+      addr = (10 << 24) | rand.randrange(1 << 16) if rand.random() < 0.95 else rand.randrange(1 << 32)
+      networks.append(intToCidr(addr, bits))   # host bits are set, parseNetworks clears them
+   return networks
+
+def test_summarize_matches_collapse_addresses():
+   rand = random.Random(17)
+   for _ in range(200):
+      networks = random_networks(rand, rand.randint(1, 60))
+      starts, bits = summarizeNetworks(*parseNetworks(networks))
+      expected = ipaddress.collapse_addresses([ipaddress.IPv4Network(network, strict=False) for network in networks])
+      assert [intToCidr(s, b) for s, b in zip(starts.tolist(), bits.tolist())] == [str(network) for network in expected]
+
+def test_summarize_single_addresses():
+   starts, bits = summarizeNetworks(*parseNetworks(["10.0.0.%d" % i for i in range(256)] + ["10.0.1.0"]))
+   assert [intToCidr(s, b) for s, b in zip(starts.tolist(), bits.tolist())] == ["10.0.0.0/24", "10.0.1.0/32"]
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# /subnet/ responses, run with "python3 -m pytest" in this directory
+
+import json
+from fastapi.testclient import TestClient
+from main import app
+
+client = TestClient(app)
+
+# without offset, limit or stream a class B mask ending in the last number lists one subnet for each 3rd number, as it always has
+def test_subnet_default_class_b_last_number():
+   for host_bits in range(2, 8):   # /25 to /30
+      mask = "255.255.255.%d" % (256 - (1 << host_bits))
+      result = client.post("/subnet/", json={"address": "172.16.0.0", "mask": mask}).json()
+      assert result["address_cidr"] == "172.16.0.0/%d" % (32 - host_bits)
+      assert result["num_subnets"] == 1 << (16 - host_bits)
+      assert result["addressable_hosts_per_subnet"] == (1 << host_bits) - 2
+      assert result["valid_subnets"] == ["172.16.%d.0" % i for i in range(256)]
+      assert result["broadcast_addresses"] == ["172.16.%d.255" % i for i in range(256)]
+      assert result["first_addresses"] == ["172.16.%d.1" % i for i in range(256)]
+      assert result["last_addresses"] == ["172.16.%d.254" % i for i in range(256)]
+
+def test_subnet_default_class_c():
+   result = client.post("/subnet/", json={"address": "192.168.10.0", "mask": "255.255.255.192"}).json()
+   assert result == {
+                      "address_cidr": "192.168.10.0/26",
+                      "num_subnets": 4,
+                      "addressable_hosts_per_subnet": 62,
+                      "valid_subnets": ["192.168.10.0", "192.168.10.64", "192.168.10.128", "192.168.10.192"],
+                      "broadcast_addresses": ["192.168.10.63", "192.168.10.127", "192.168.10.191", "192.168.10.255"],
+                      "first_addresses": ["192.168.10.1", "192.168.10.65", "192.168.10.129", "192.168.10.193"],
+                      "last_addresses": ["192.168.10.62", "192.168.10.126", "192.168.10.190", "192.168.10.254"],
+                    }
+
+# pages put together have num_subnets subnets, each block size apart, and the stream has the same subnets
+def test_subnet_pages_add_up_to_num_subnets():
+   for address, mask in (("172.16.0.0", "255.255.255.192"), ("172.16.0.0", "255.255.255.252"), ("172.16.0.0", "255.255.240.0"),
+                         ("192.168.1.0", "255.255.255.224")):
+      num_subnets = client.post("/subnet/", json={"address": address, "mask": mask}).json()["num_subnets"]
+      subnets, broadcasts = [], []
+      offset = 0
+      while True:
+         page = client.post("/subnet/", json={"address": address, "mask": mask, "offset": offset, "limit": 1000}).json()
+         if page["valid_subnets"] == []:
+            break
+         assert page["num_subnets"] == num_subnets
+         subnets += page["valid_subnets"]
+         broadcasts += page["broadcast_addresses"]
+         offset += 1000
+      assert len(subnets) == num_subnets
+      assert len(set(subnets)) == num_subnets
+      lines = client.post("/subnet/", json={"address": address, "mask": mask, "stream": True}).text.splitlines()
+      assert [json.loads(line)["valid_subnet"] for line in lines] == subnets
+      assert [json.loads(line)["broadcast_address"] for line in lines] == broadcasts
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# longest prefix match from PrefixTable checked against looking at every prefix, run with "python3 -m pytest" in this directory
+
+import random
+from ipv4 import addrToInt, intToAddr, cidrToInt, intToCidr, cidrMask
+from prefixes import PrefixTable, readPrefixes
+
+# longest prefix (cidr notation) in networks that addr (integer) is in, and its value, (None, None) if there is none
+# later prefixes win over the same prefix given earlier
+def brute_force_match(networks, values, addr):
+   best = (None, None, -1)
+   for network, value in zip(networks, values):
+      start, bits = cidrToInt(network)
+      start &= cidrMask(bits)
+      if addr & cidrMask(bits) == start and bits >= best[2]:
+         best = (intToCidr(start, bits), value, bits)
+   return best[0], best[1]
+
+def test_match_matches_brute_force():
+   rand = random.Random(18)
+   for _ in range(20):
+      networks, values = [], []
+      for i in range(rand.randint(1, 40)):
+         bits = rand.choice([0, 8, 12, 16, 20, 23, 24, 25, 26, 28, 30, 31, 32])
+         addr = (192 << 24) | (168 << 16) | rand.randrange(1 << 12)   # close together, so prefixes are inside each other
+         networks.append(intToCidr(addr & cidrMask(bits), bits))
+         values.append("hop%d" % i)
+      table = PrefixTable(networks, values)
+      addrs = [intToAddr((192 << 24) | (168 << 16) | rand.randrange(1 << 12)) for _ in range(300)]
+      addrs += [intToAddr(rand.randrange(1 << 32)) for _ in range(50)]
+      names, found = table.match(addrs)
+      for addr, name, value in zip(addrs, names.tolist(), found.tolist()):
+         assert (name, value) == brute_force_match(networks, values, addrToInt(addr))
+
+def test_read_prefixes():
+   table = readPrefixes("# routes\n10.0.0.0/8 core\n10.1.0.0/16, edge\n\n10.1.2.0/24\n")
+   names, values = table.match(["10.2.0.1", "10.1.9.9", "10.1.2.3", "11.0.0.0"])
+   assert names.tolist() == ["10.0.0.0/8", "10.1.0.0/16", "10.1.2.0/24", None]
+   assert values.tolist() == ["core", "edge", None, None]
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# compares the latency of the heap based route search with the previous version which picked the next router with min(),
+# then the number of routers settled by dijkstra, bidirectional dijkstra, alt and a contraction hierarchy for the same queries
+# run with "python3 benchmark.py [number of routers] [number of queries]"
+
+import random
+import sys
+import time
+from graph import Graph
+from shortest_path import get_shortest_path, Search, bidirectional_search
+from landmarks import Landmarks
+from hierarchy import ContractionHierarchy
+
+# make a random connected graph, routers are joined in a chain first and then random extra connections are added
+def make_graph(num_nodes, extra_edges, seed=0):
+   rand = random.Random(seed)
+   names = ["R%d" % i for i in range(num_nodes)]
+   graph = Graph()
+   for name in names:
+      graph.addNode(name)
+   for i in range(1, num_nodes):
+      graph.addEdge(names[i - 1], names[i], rand.randint(1, 100))
+   for _ in range(extra_edges):
+      from_, to = rand.sample(names, 2)
+      graph.addEdge(from_, to, rand.randint(1, 100))
+   return graph, names
+
+# previous version of get_shortest_path, kept to compare against
+def legacy_shortest_path(graph, from_, to):
+   from_, to = graph.ids[from_], graph.ids[to]
+   path = {}
+   unvisited = {from_: 0}
+   total_dist = {from_: 0}
+   for n in graph.ids.values():
+      if n not in unvisited:
+         total_dist[n] = float("inf")
+         unvisited[n] = float("inf")
+      path[n] = None
+   while unvisited != {}:
+      min_dist_node = min(unvisited.items(), key=lambda item: item[1])[0]
+      del unvisited[min_dist_node]
+      if min_dist_node == to:
+         path_lst = []
+         while min_dist_node != None:
+            path_lst.append(min_dist_node)
+            min_dist_node = path[min_dist_node]
+         return [graph.names[u] for u in path_lst[::-1]]
+      if total_dist[min_dist_node] == float("inf"):
+         break
+      for neighbour, weight in graph.neighbours(min_dist_node):
+         new_dist = total_dist[min_dist_node] + weight
+         if new_dist < total_dist[neighbour]:
+            total_dist[neighbour] = new_dist
+            path[neighbour] = min_dist_node
+            unvisited[neighbour] = new_dist
+   return None
+
+# get total weight of a path (list of routers)
+def path_weight(graph, path):
+   return sum([graph.weight(path[i], path[i + 1]) for i in range(len(path) - 1)])
+
+# time each query, returns list of times in seconds and list of path weights
+def time_queries(search, graph, pairs):
+   times, weights = [], []
+   for from_, to in pairs:
+      start = time.perf_counter()
+      path = search(graph, from_, to)
+      times.append(time.perf_counter() - start)
+      weights.append(path_weight(graph, path) if path is not None else -1)
+   return times, weights
+
+# print min, median and max latency of a list of times
+def report(label, times):
+   times = sorted(times)
+   print("%-8s min %9.2f ms   median %9.2f ms   max %9.2f ms" % (label, times[0] * 1000, times[len(times) // 2] * 1000, times[-1] * 1000))
+
+# time each query with dijkstra (stopping at the target), bidirectional dijkstra, alt and ch, and count routers settled
+def compare_algorithms(graph, pairs):
+   landmarks = Landmarks(graph)
+   hierarchy = ContractionHierarchy(graph)
+   for label, prepared in (("landmarks", landmarks), ("hierarchy", hierarchy)):
+      start = time.perf_counter()
+      while not prepared.ready():   # work out landmark distances and build hierarchy before timing
+         time.sleep(0.01)
+      print("%s ready in %.2f s" % (label, time.perf_counter() - start))
+
+   def dijkstra(u, v):
+      search = Search(graph, u)
+      search.run(v)
+      return search.path(v), search.dist.get(v), len(search.settled)
+
+   results = {}
+   for label, search in (("dijkstra", dijkstra), ("bidir", lambda u, v: bidirectional_search(graph, u, v)), ("alt", landmarks.search), ("ch", hierarchy.search)):
+      times, settled, weights = [], [], []
+      for from_, to in pairs:
+         start = time.perf_counter()
+         path, weight, num_settled = search(graph.ids[from_], graph.ids[to])
+         times.append(time.perf_counter() - start)
+         settled.append(num_settled)
+         weights.append(weight)
+      results[label] = weights
+      report(label, times)
+      print("%-8s median settled %d" % (label, sorted(settled)[len(settled) // 2]))
+   if not results["dijkstra"] == results["bidir"] == results["alt"] == results["ch"]:
+      print("Error, path weights do not match")
+
+def main():
+   num_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+   num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+   graph, names = make_graph(num_nodes, num_nodes * 2)
+   rand = random.Random(1)
+   pairs = [tuple(rand.sample(names, 2)) for _ in range(num_queries)]
+   print("%d routers, %d connections, %d queries" % (num_nodes, graph.num_edges, num_queries))
+
+   heap_times, heap_weights = time_queries(get_shortest_path, graph, pairs)
+   legacy_times, legacy_weights = time_queries(legacy_shortest_path, graph, pairs)
+   if heap_weights != legacy_weights:
+      print("Error, path weights do not match")
+   report("heap", heap_times)
+   report("legacy", legacy_times)
+   print("speedup (median): %.1fx" % (sorted(legacy_times)[num_queries // 2] / sorted(heap_times)[num_queries // 2]))
+   compare_algorithms(graph, pairs)
+
+if __name__ == '__main__':
+   main()
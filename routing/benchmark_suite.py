@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# benchmark suite for the routing service, for each generated network (see topologies.py) it times changes to the Graph,
+# get_shortest_path and /route/ through the whole FastAPI app (in process with the test client, so no network is involved),
+# and writes p50/p99 latency, throughput and peak memory to a JSON file so results from different commits can be compared
+# each network is run in a process of its own, so its peak memory is not mixed up with the networks run before it
+# run with "python3 benchmark_suite.py [--topologies grid,geometric,scale_free] [--sizes 100,1000,10000,100000] [--out results.json]"
+# (add 1000000 to sizes for networks with a million routers, which takes a few GB of memory and a few minutes)
+# compare two results files with "python3 benchmark_suite.py --compare old.json new.json", exits with 1 if anything got slower
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from graph import Graph
+from topologies import generators
+
+# get percentile (0 to 100) of a sorted list, nearest rank
+def percentile(values, p):
+   return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+# get latency and throughput of a list of times in seconds
+def summary(times):
+   if times == []:
+      return {"count": 0}
+   ordered = sorted(times)
+   return {
+            "count": len(times),
+            "p50_ms": percentile(ordered, 50) * 1000,
+            "p99_ms": percentile(ordered, 99) * 1000,
+            "max_ms": ordered[-1] * 1000,
+            "ops_per_s": len(times) / sum(times) if sum(times) > 0 else None,
+          }
+
+# time function(item) for each item, stops early once budget seconds have been spent, returns list of times in seconds
+def time_calls(function, items, budget):
+   times = []
+   end = time.perf_counter() + budget
+   for item in items:
+      start = time.perf_counter()
+      function(item)
+      times.append(time.perf_counter() - start)
+      if start > end:
+         break
+   return times
+
+# time adding and removing routers and connections, the network is the same again at the end apart from unused ids
+def time_changes(graph, names, rand, count, budget):
+   new = ["bench%d" % i for i in range(count)]
+   results = {}
+   times = time_calls(graph.addNode, new, budget)
+   results["add_router"] = summary(times)
+   new = new[:len(times)]
+   connections = [(name, rand.choice(names), rand.randint(1, 100)) for name in new for _ in range(2)]   # two for each new router
+   results["add_connection"] = summary(time_calls(lambda c: graph.addEdge(*c), connections, budget))
+   results["remove_connection"] = summary(time_calls(lambda c: graph.removeEdge(c[0], c[1]), connections[::2], budget))
+   results["remove_router"] = summary(time_calls(graph.removeNode, new, budget))   # each still has one connection
+   return results
+
+# build one network and time everything on it, run in a process of its own
+def run_case(kind, n, queries, changes, budget, seed):
+   os.environ["ROUTING_DATA"] = ""   # graph only kept in memory, nothing written to disk
+   for name in ("ROUTING_WORKERS", "ROUTING_POOL"):
+      os.environ.pop(name, None)
+   from shortest_path import get_shortest_path
+   result = {"topology": kind, "nodes": n}
+   start = time.perf_counter()
+   names, edges = generators[kind](n, seed)
+   result["generate_s"] = time.perf_counter() - start
+   start = time.perf_counter()
+   graph = Graph()
+   graph.addNodes(names)
+   graph.addEdges(edges)
+   result["build_s"] = time.perf_counter() - start
+   result["edges"] = graph.num_edges
+   del edges
+
+   rand = random.Random(seed + 1)
+   result["changes"] = time_changes(graph, names, rand, changes, budget)
+   pairs = [tuple(rand.sample(names, 2)) for _ in range(queries)]
+   result["get_shortest_path"] = summary(time_calls(lambda pair: get_shortest_path(graph, *pair), pairs, budget))
+
+   import main
+   from fastapi.testclient import TestClient
+   main.use_graph(graph)
+
+   def route(pair):
+      response = client.post("/route/", json={"from": pair[0], "to": pair[1]})
+      if response.status_code != 200:
+         raise RuntimeError("/route/ gave status %d" % response.status_code)
+
+   with TestClient(main.app) as client:
+      times = time_calls(route, pairs, budget)   # first route from each router searches until it reaches the target
+      result["route"] = summary(times)
+      result["route_cached"] = summary(time_calls(route, pairs[:len(times)], budget))   # same routes again from the cache
+   result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # kilobytes on linux
+   return result
+
+# get short hash of the commit being benchmarked, None if not in a git repository
+def git_commit():
+   try:
+      out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                           capture_output=True, text=True)
+   except OSError:
+      return None
+   return out.stdout.strip() if out.returncode == 0 else None
+
+# print p50 of every timing in new results compared with old results, returns True if anything is more than threshold slower
+def compare(old_path, new_path, threshold):
+   with open(old_path) as f:
+      old = {(r["topology"], r["nodes"]): r for r in json.load(f)["results"]}
+   with open(new_path) as f:
+      new = json.load(f)["results"]
+   slower = False
+   for result in new:
+      before = old.get((result["topology"], result["nodes"]))
+      if before is None:
+         continue
+      timings = [(key, result[key], before.get(key)) for key in ("get_shortest_path", "route", "route_cached")]
+      timings += [(key, value, before.get("changes", {}).get(key)) for key, value in result["changes"].items()]
+      for key, now, then in timings:
+         if then is None or now.get("count", 0) == 0 or then.get("count", 0) == 0:
+            continue
+         ratio = now["p50_ms"] / then["p50_ms"] if then["p50_ms"] > 0 else 1
+         flag = ""
+         if ratio > 1 + threshold:
+            flag = "  slower"
+            slower = True
+         print("%-10s %8d %-18s p50 %10.3f ms -> %10.3f ms  (%.2fx)%s" % (result["topology"], result["nodes"], key, then["p50_ms"], now["p50_ms"], ratio, flag))
+   return slower
+
+def main():
+   parser = argparse.ArgumentParser(description="benchmark suite for the routing service")
+   parser.add_argument("--topologies", default=",".join(generators), help="comma separated list of grid, geometric and scale_free")
+   parser.add_argument("--sizes", default="100,1000,10000,100000", help="comma separated numbers of routers")
+   parser.add_argument("--queries", type=int, default=50, help="routes to time for each network")
+   parser.add_argument("--changes", type=int, default=1000, help="routers to add and remove for each network")
+   parser.add_argument("--budget", type=float, default=30, help="seconds to spend on each timing before stopping early")
+   parser.add_argument("--seed", type=int, default=0)
+   parser.add_argument("--out", default="benchmark_results.json", help="JSON file to write results to")
+   parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files instead of running")
+   parser.add_argument("--threshold", type=float, default=0.1, help="fraction slower that counts as a regression for --compare")
+   args = parser.parse_args()
+   if args.compare is not None:
+      sys.exit(1 if compare(args.compare[0], args.compare[1], args.threshold) else 0)
+
+   kinds = args.topologies.split(",")
+   for kind in kinds:
+      if kind not in generators:
+         parser.error("topology must be one of " + ", ".join(generators))
+   sizes = [int(size) for size in args.sizes.split(",")]
+   context = multiprocessing.get_context("spawn")   # fresh process for each network, so peak memory is its own
+   results = []
+   for kind in kinds:
+      for n in sizes:
+         with context.Pool(1) as pool:
+            result = pool.apply(run_case, (kind, n, args.queries, args.changes, args.budget, args.seed))
+         results.append(result)
+         print("%-10s %8d routers %9d connections  get_shortest_path p50 %9.3f ms  /route/ p50 %9.3f ms  peak %7.1f MB" % (
+               kind, n, result["edges"], result["get_shortest_path"].get("p50_ms", 0), result["route"].get("p50_ms", 0), result["peak_rss_mb"]))
+   report = {
+              "commit": git_commit(),
+              "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "cpus": os.cpu_count(),
+              "settings": {key: value for key, value in vars(args).items() if key not in ("compare", "threshold", "out")},
+              "results": results,
+            }
+   with open(args.out, "w") as f:
+      json.dump(report, f, indent=2)
+   print("results written to " + args.out)
+
+if __name__ == '__main__':
+   main()
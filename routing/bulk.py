@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import csv
+import json
+
+# bulk import and export of routers and connections
+# ndjson: one JSON object per line, {"name": "A"} for a router or {"from": "A", "to": "B", "weight": 7} for a connection
+# csv: one row per line, router,A for a router or connection,A,B,7 for a connection
+#      a quoted name can have new lines in it, so a row can go over more than one line
+
+formats = ["ndjson", "csv"]
+
+# get lines (as bytes) from chunks of bytes as they arrive, without waiting for the whole body
+# lines are decoded by read_records, so a line that is not utf-8 is an error for that line
+async def read_lines(chunks):
+   rest = b""
+   async for chunk in chunks:
+      lines = (rest + chunk).split(b"\n")
+      rest = lines.pop()   # last piece might not be a full line yet
+      for line in lines:
+         yield line
+   if rest:
+      yield rest
+
+# join csv lines while a quoted value is still open (odd number of quotes so far), so each row is one piece
+# a row that is never closed is given as it is at the end and fails to parse
+async def read_rows(lines, format):
+   row = None
+   async for line in lines:
+      if format != "csv":
+         yield line
+         continue
+      row = line if row is None else row + b"\n" + line
+      if row.count(b'"') % 2 == 0:
+         yield row
+         row = None
+   if row is not None:
+      yield row
+
+# turn a line into ("router", name) or ("connection", from, to, weight), None for blank lines, ValueError if line is not valid
+def parse_line(line, format):
+   line = line.strip()
+   if line == "":
+      return None
+   if format == "csv":
+      try:
+         row = next(csv.reader([line], strict=True))
+      except csv.Error as e:   # quote that is never closed or is in the middle of a value
+         raise ValueError(str(e))
+      if len(row) == 2 and row[0] == "router":
+         return ("router", row[1])
+      if len(row) == 4 and row[0] == "connection":
+         return ("connection", row[1], row[2], int(row[3]))
+      raise ValueError("expected router,name or connection,from,to,weight")
+   record = json.loads(line)
+   if not isinstance(record, dict):
+      raise ValueError("expected a JSON object")
+   if "name" in record:
+      return ("router", str(record["name"]))
+   if "from" in record and "to" in record:
+      if type(record.get("weight")) is not int:
+         raise ValueError("weight is required")
+      return ("connection", str(record["from"]), str(record["to"]), record["weight"])
+   raise ValueError("expected a router or a connection")
+
+# read and check every line before anything is added, returns list of new routers, list of connections and list of errors
+async def read_records(chunks, format, graph):
+   routers, connections, errors = [], [], []
+   new_routers = set()
+   line_num = 0
+   async for line in read_rows(read_lines(chunks), format):
+      line_num += 1
+      start = line_num
+      line_num += line.count(b"\n")
+      try:
+         record = parse_line(line.decode(), format)
+      except ValueError as e:   # json and utf-8 errors are also ValueErrors
+         errors.append("line %d: %s" % (start, e))
+         continue
+      if record is None:
+         continue
+      if record[0] == "router":
+         if not graph.hasNode(record[1]) and record[1] not in new_routers:   # routers that already exist are skipped
+            new_routers.add(record[1])
+            routers.append(record[1])
+      else:
+         for name in record[1:3]:
+            if not graph.hasNode(name) and name not in new_routers:
+               errors.append("line %d: router %s does not exist" % (start, name))
+               break
+         else:
+            connections.append(record[1:])
+   return routers, connections, errors
+
+# get export of graph as lines, routers first and then connections
+def export_lines(graph, format):
+   names = list(graph.ids)
+   for name in names:
+      if format == "csv":
+         yield csv_row(["router", name])
+      else:
+         yield json.dumps({"name": name}) + "\n"
+   for from_, to, weight in graph.edges():
+      if format == "csv":
+         yield csv_row(["connection", from_, to, weight])
+      else:
+         yield json.dumps({"from": from_, "to": to, "weight": weight}) + "\n"
+
+# turn list into a line of csv, values with new lines or spaces at either end are quoted so they are read back the same
+def csv_row(row):
+   return ",".join([csv_value(str(x)) for x in row]) + "\n"
+
+def csv_value(x):
+   if any(c in x for c in ',"\n\r') or x != x.strip():
+      return '"%s"' % x.replace('"', '""')
+   return x
+
+# join lines into bigger chunks so each one isn't sent on its own
+async def chunk_lines(lines, size=1000):
+   chunk = []
+   for line in lines:
+      chunk.append(line)
+      if len(chunk) == size:
+         yield "".join(chunk)
+         chunk = []
+   if chunk:
+      yield "".join(chunk)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+from collections import OrderedDict
+from shortest_path import Search
+
+# least recently used cache of shortest path searches, keys = (router id the search starts from, graph version)
+# a search is continued when a new target is asked for, and finished routes are kept so repeated queries are a dictionary lookup
+# a search stops at its target, and is only finished (every reachable router settled) once routes to full_after different targets
+# have been asked for from its router, so one-off routes don't search the whole graph
+# when the graph changes, finished searches are repaired and moved to the new version, searches that stopped early are dropped
+class RouteCache():
+
+   def __init__(self, graph, make_route, size=128, max_nodes=4000000, full=False, full_after=None, max_repair=1000):
+      self.graph = graph
+      self.make_route = make_route   # function to turn path (list of routers) into the result that is stored
+      self.size = size               # max number of searches kept
+      self.max_nodes = max_nodes     # max number of routers reached across all searches kept
+      self.full = full               # search every reachable router straight away, so searches can be repaired after changes
+      self.full_after = full_after   # finish a search once routes to this many targets were asked for from it (None = never)
+      self.max_repair = max_repair   # changes bigger than this (i.e. bulk imports) drop every entry instead of repairing
+      self.searches = OrderedDict()  # keys = (id, version), values = (search, dictionary of target id and result)
+      self.version = graph.version
+      self.hits = 0
+      self.misses = 0
+      self.repairs = 0
+      graph.listeners.append(self.update)
+
+# get result for path between 2 routers, None if no path exists
+   def route(self, from_, to):
+      if not self.graph.hasNode(from_) or not self.graph.hasNode(to):
+         return None
+      search, results = self.search(self.graph.ids[from_])
+      target = self.graph.ids[to]
+      if target in results:   # route already found
+         self.hits += 1
+         return results[target]
+      self.misses += 1
+      if search.run(target):
+         results[target] = self.make_route([self.graph.names[u] for u in search.path(target)], search.dist[target])
+      else:
+         results[target] = None
+      if self.full_after is not None and len(results) >= self.full_after and not search.finished():   # router is asked about often
+         search.run()
+      self.trim()
+      return results[target]
+
+# get search starting from router id for the current graph version, adding it to cache if needed
+   def search(self, u):
+      if self.version != self.graph.version:   # missed a change so every entry is old
+         self.invalidate()
+      key = (u, self.version)
+      if key in self.searches:
+         self.searches.move_to_end(key)   # most recently used
+      else:
+         search = Search(self.graph, u)
+         if self.full:
+            search.run()
+         self.searches[key] = (search, {})
+      return self.searches[key]
+
+# check if route between 2 routers can be answered without searching
+   def cached(self, from_, to):
+      if self.version != self.graph.version or not self.graph.hasNode(from_) or not self.graph.hasNode(to):
+         return False
+      entry = self.searches.get((self.graph.ids[from_], self.version))
+      if entry is None:
+         return False
+      search, results = entry
+      return search.finished() or self.graph.ids[to] in search.settled
+
+# add a finished search from router id that was made on a snapshot of the graph (see Graph.snapshot)
+# only kept if the graph has not changed since the snapshot, returns whether it was kept
+   def add(self, u, search):
+      if self.version != self.graph.version or search.graph.version != self.version:
+         return False
+      if (u, self.version) not in self.searches:
+         search.graph = self.graph   # same edges as the snapshot, and the search is repaired on the graph from now on
+         self.searches[(u, self.version)] = (search, {})
+         self.trim()
+      return True
+
+# remove least recently used searches until cache is within its limits
+   def trim(self):
+      while len(self.searches) > self.size or len(self.searches) > 1 and sum([len(s.dist) for s, r in self.searches.values()]) > self.max_nodes:
+         self.searches.popitem(last=False)
+
+# called by graph after every change, repairs finished searches and drops routes that changed
+   def update(self, changes):
+      if self.version != self.graph.version - 1 or len(changes) > self.max_repair:   # missed a change before this one, or searching again is cheaper
+         self.invalidate()
+         return
+      searches = OrderedDict()
+      for (u, version), (search, results) in self.searches.items():
+         if not search.finished() or not self.graph.hasNodeId(u):   # can't repair a search that stopped early
+            continue
+         if changes:
+            for n in search.update(changes):
+               results.pop(n, None)
+            self.repairs += 1
+         searches[(u, self.graph.version)] = (search, results)
+      self.searches = searches
+      self.version = self.graph.version
+
+# drop every entry
+   def invalidate(self):
+      self.searches.clear()
+      self.version = self.graph.version
+
+# hit and miss counters
+   def stats(self):
+      return {
+               "hits": self.hits,
+               "misses": self.misses,
+               "repairs": self.repairs,
+               "searches": len(self.searches),
+               "version": self.graph.version,
+             }
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import threading
+from collections import deque
+
+# which part of the network (connected component) each router is in, so a route between routers in different parts can be
+# turned down straight away without searching
+# a union-find forest joins parts when a connection is added, removing a connection can split a part but the forest can't split
+# sets, so after a removal routers in the same set might no longer be connected (routers in different sets still certainly aren't)
+# and the parts are worked out again on another thread the next time they are asked for
+
+class Components():
+
+   def __init__(self, graph):
+      self.graph = graph
+      self.parent = None     # parent of each router id in the forest, None until first worked out
+      self.size = None       # number of routers under each root
+      self.exact = False     # no connection removed since the parts were worked out, so routers in the same set are connected
+      self.built = None      # (parent, size) worked out by build thread
+      self.building = None   # thread working out parts
+      self.added = []        # connections added while build thread is running, joined once it has finished
+      self.removed = False   # connection removed while build thread is running
+      self.rejected = 0      # number of times routers were found to be in different parts
+      graph.listeners.append(self.update)
+      self.rebuild()
+
+# called by graph after every change, joins sets for new connections
+   def update(self, changes):
+      for u, v, old, new in changes:
+         if new is None:
+            if old is not None:
+               self.exact = False
+               self.removed = True
+         elif old is None:
+            if self.parent is not None:
+               self.union(u, v)
+            if self.building is not None:
+               self.added.append((u, v))
+
+# check if router ids are certainly in different parts of the network
+   def disconnected(self, u, v):
+      if self.built is not None:   # build thread finished
+         self.parent, self.size = self.built
+         self.built = None
+         self.building = None
+         for a, b in self.added:
+            self.union(a, b)
+         self.added = []
+         self.exact = not self.removed
+      if not self.exact and self.building is None:
+         self.rebuild()
+      if self.parent is None or self.find(u) == self.find(v):
+         return False
+      self.rejected += 1
+      return True
+
+# work out parts again on another thread using a snapshot of the graph
+   def rebuild(self):
+      self.added = []
+      self.removed = False
+      self.building = threading.Thread(target=self.build, args=(self.graph.snapshot(),), daemon=True)
+      self.building.start()
+
+# label every router with the first router found in its part (breadth first search), run on another thread
+   def build(self, graph):
+      parent = list(range(len(graph.names)))
+      size = [1] * len(parent)
+      seen = bytearray(len(parent))
+      for root in graph.ids.values():
+         if seen[root]:
+            continue
+         seen[root] = 1
+         queue = deque([root])
+         while queue:
+            u = queue.popleft()
+            for v, w in graph.neighbours(u):
+               if not seen[v]:
+                  seen[v] = 1
+                  parent[v] = root
+                  size[root] += 1
+                  queue.append(v)
+      self.built = (parent, size)
+
+# get root of router id's set, routers added since parts were worked out are in a set of their own
+   def find(self, u):
+      parent = self.parent
+      if u >= len(parent):
+         return u
+      while parent[u] != u:
+         parent[u] = parent[parent[u]]   # path halving
+         u = parent[u]
+      return u
+
+# join sets of two router ids, smaller set under the larger one
+   def union(self, u, v):
+      if max(u, v) >= len(self.parent):   # routers added since parts were worked out
+         new = range(len(self.parent), max(u, v) + 1)
+         self.parent.extend(new)
+         self.size.extend([1] * len(new))
+      u, v = self.find(u), self.find(v)
+      if u != v:
+         if self.size[u] < self.size[v]:
+            u, v = v, u
+         self.parent[v] = u
+         self.size[u] += self.size[v]
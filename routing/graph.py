@@ -2,29 +2,228 @@
 
 # Ailbhe Byrne
 
+from array import array
+from bisect import bisect_left
+
+# routers are given integer ids in the order they are added, ids are not reused after a router is removed
+# edges are stored in compressed sparse row (csr) arrays: neighbours of id u are indices[indptr[u]:indptr[u + 1]]
+# (sorted by id) with the matching weights in weights[indptr[u]:indptr[u + 1]]
+# edges added, updated or removed since the arrays were built are kept in changes and merged in when there are enough of them
+# snapshots share everything with the graph (copy on write): the arrays are never changed in place, and ids, names and changes are
+# only copied by the next change after a snapshot, with each row of changes only copied when an edge in it changes
 class Graph():
 
    def __init__(self):
-      self.nodes = []     # list to store nodes (routers) in graph
-      self.d_edges = {}   # dictionary to store edges (connections) in graph
+      self.ids = {}                    # dictionary to store id of each node (router) in graph
+      self.names = []                  # list to store name of each id, only ever added to
+      self.indptr = array("q", [0])    # start of each node's row in indices and weights
+      self.indices = array("i")        # neighbour ids of every row
+      self.weights = array("q")        # weight (distance) of each edge (connection) in indices
+      self.changes = {}                # edges changed since arrays were built, keys = id, values = dictionary of neighbour id and weight (None if removed)
+      self.num_changes = 0
+      self.num_edges = 0
+      self.version = 0                 # increased every time graph changes
+      self.listeners = []              # functions called with list of (id, id, old weight, new weight) after every change
+      self.shared = False              # ids, names and changes are shared with a snapshot, so must be copied before they are changed
+      self.owned = set()               # rows of changes not shared with a snapshot
 
 # add node (router) to graph
    def addNode(self, name):
-      self.nodes.append(name)   # add node to list
+      self.unshare()
+      self.ids[name] = len(self.names)   # next id
+      self.names.append(name)
+      self.version += 1
+      self.notify([])
 
 # add edge (connection) and weight (distance) to graph
-   def addEdge(self, edge, weight):
-      self.d_edges[edge] = weight   # add edge and weight to dictionary
+   def addEdge(self, from_, to, weight):
+      self.unshare()
+      u, v = self.ids[from_], self.ids[to]
+      old = self.edgeWeight(u, v)
+      if old is None:   # if edge is new
+         self.num_edges += 1
+      self.changeEdge(u, v, weight)   # add each node as a neighbour of the other
+      self.changeEdge(v, u, weight)
+      self.version += 1
+      self.notify([(u, v, old, weight)])
+      self.refresh()
+
+# add many nodes (routers) to graph as one change
+   def addNodes(self, names):
+      self.unshare()
+      for name in names:
+         self.ids[name] = len(self.names)
+         self.names.append(name)
+      self.version += 1
+      self.notify([])
+
+# add many edges (connections) as list of (from, to, weight) to graph as one change, arrays are only rebuilt once at the end
+   def addEdges(self, edges):
+      self.unshare()
+      changes = []
+      for from_, to, weight in edges:
+         u, v = self.ids[from_], self.ids[to]
+         old = self.edgeWeight(u, v)
+         if old is None:
+            self.num_edges += 1
+         self.changeEdge(u, v, weight)
+         self.changeEdge(v, u, weight)
+         changes.append((u, v, old, weight))
+      self.version += 1
+      self.notify(changes)
+      self.refresh()
 
 # remove node (router) from graph
    def removeNode(self, name):
-      self.nodes.remove(name)   # remove node from list
-      for edge in list(self.d_edges.keys()):
-         if name in edge:
-            del self.d_edges[edge]   # remove all edges with node from dictionary
+      self.unshare()
+      u = self.ids.pop(name)
+      removed = self.neighbours(u)   # only look at edges the node is part of
+      for v, w in removed:
+         self.changeEdge(u, v, None)
+         self.changeEdge(v, u, None)
+         self.num_edges -= 1
+      self.version += 1
+      self.notify([(u, v, w, None) for v, w in removed])
+      self.refresh()
 
 # remove edge (connection) and weight (distance) from graph
-   def removeEdge(self, edge):
-      for ek in list(self.d_edges.keys()):
-         if edge == ek:
-            del self.d_edges[edge]   # remove edge from dictionary
+   def removeEdge(self, from_, to):
+      u, v = self.ids[from_], self.ids[to]
+      old = self.edgeWeight(u, v)
+      if old is not None:
+         self.unshare()
+         self.changeEdge(u, v, None)
+         self.changeEdge(v, u, None)
+         self.num_edges -= 1
+         self.version += 1
+         self.notify([(u, v, old, None)])
+         self.refresh()
+
+# get a copy of graph as it is now that later changes don't affect, so it can be searched on another thread while the graph changes
+# nothing is copied, the graph copies what it shares with snapshots the next time it changes (see unshare)
+   def snapshot(self):
+      graph = Graph()
+      graph.ids, graph.names, graph.changes = self.ids, self.names, self.changes
+      graph.indptr, graph.indices, graph.weights = self.indptr, self.indices, self.weights
+      graph.num_changes = self.num_changes
+      graph.num_edges = self.num_edges
+      graph.version = self.version
+      graph.shared = self.shared = True
+      self.owned = set()
+      return graph
+
+# copy ids, names and changes if they are shared with a snapshot, before they are changed
+# only the dictionary of changed rows is copied, each row is copied when it is next changed (see changeEdge)
+   def unshare(self):
+      if self.shared:
+         self.ids = dict(self.ids)
+         self.names = self.names[:]
+         self.changes = dict(self.changes)
+         self.shared = False
+
+# take everything from a snapshot of an earlier version of this graph (i.e. loaded from a file), so the graph uses its arrays
+# instead of its own, the changes made since the snapshot must be made again afterwards, the listeners are kept
+   def adopt(self, snapshot):
+      self.ids, self.names, self.changes = snapshot.ids, snapshot.names, snapshot.changes
+      self.indptr, self.indices, self.weights = snapshot.indptr, snapshot.indices, snapshot.weights
+      self.num_changes = snapshot.num_changes
+      self.num_edges = snapshot.num_edges
+      self.version = snapshot.version
+      self.shared = snapshot.shared = True
+      self.owned = set()
+
+# check if node (router) is in graph
+   def hasNode(self, name):
+      return name in self.ids
+
+# check if node id belongs to a node that is still in graph
+   def hasNodeId(self, u):
+      return self.ids.get(self.names[u]) == u
+
+# check if there is an edge between two nodes
+   def hasEdge(self, from_, to):
+      return self.weight(from_, to) is not None
+
+# get weight of edge between two nodes (None if they are not connected)
+   def weight(self, from_, to):
+      if from_ not in self.ids or to not in self.ids:
+         return None
+      return self.edgeWeight(self.ids[from_], self.ids[to])
+
+# get weight of edge between two node ids (None if they are not connected)
+   def edgeWeight(self, u, v):
+      changed = self.changes.get(u)
+      if changed is not None and v in changed:   # edge changed since arrays were built
+         return changed[v]
+      if u + 1 >= len(self.indptr):   # node added since arrays were built
+         return None
+      start, end = self.indptr[u], self.indptr[u + 1]
+      i = bisect_left(self.indices, v, start, end)   # rows are sorted so binary search for neighbour
+      if i < end and self.indices[i] == v:
+         return self.weights[i]
+      return None
+
+# get list of (neighbour id, weight) for a node id
+   def neighbours(self, u):
+      if u + 1 < len(self.indptr):
+         start, end = self.indptr[u], self.indptr[u + 1]
+         row = zip(self.indices[start:end], self.weights[start:end])
+      else:
+         row = ()
+      changed = self.changes.get(u)
+      if changed is None:
+         return list(row)
+      return [(v, w) for v, w in row if v not in changed] + [(v, w) for v, w in changed.items() if w is not None]
+
+# get (from, to, weight) for every edge in graph, each edge is given once
+   def edges(self):
+      for name, u in list(self.ids.items()):
+         for v, w in self.neighbours(u):
+            if u <= v:
+               yield name, self.names[v], w
+
+# record a change to an edge from u to v, weight None means removed
+   def changeEdge(self, u, v, weight):
+      if u not in self.owned:   # row is new or shared with a snapshot
+         self.changes[u] = dict(self.changes.get(u, {}))
+         self.owned.add(u)
+      changed = self.changes[u]
+      if v not in changed:
+         self.num_changes += 1
+      changed[v] = weight
+
+# tell listeners about changed edges
+   def notify(self, changes):
+      for listener in self.listeners:
+         listener(changes)
+
+# rebuild arrays once enough edges have changed, so a single change doesn't copy the whole graph
+   def refresh(self):
+      if self.num_changes > max(4096, len(self.indices) // 4):
+         self.rebuild()
+
+# merge changed edges into new csr arrays, rows that did not change are copied across in blocks
+   def rebuild(self):
+      num_nodes, old_rows = len(self.names), len(self.indptr) - 1
+      indptr, indices, weights = array("q", [0]), array("i"), array("q")
+      start = 0   # first row not yet copied
+      for u in sorted(self.changes) + [num_nodes]:
+         end = min(u, old_rows)
+         if start < end:   # copy unchanged rows from start up to u
+            a, b = self.indptr[start], self.indptr[end]
+            shift = len(indices) - a
+            indices.extend(self.indices[a:b])
+            weights.extend(self.weights[a:b])
+            indptr.extend([p + shift for p in self.indptr[start + 1:end + 1]])
+         for _ in range(max(start, old_rows), u):   # rows for nodes added since last build with no changes
+            indptr.append(len(indices))
+         if u < num_nodes:   # merge changes into row u
+            row = sorted(self.neighbours(u))
+            indices.extend([v for v, w in row])
+            weights.extend([w for v, w in row])
+            indptr.append(len(indices))
+         start = u + 1
+      self.indptr, self.indices, self.weights = indptr, indices, weights   # new arrays, old ones are never changed in place
+      self.changes = {}
+      self.owned = set()
+      self.num_changes = 0
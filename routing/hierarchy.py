@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import heapq
+import threading
+
+# contraction hierarchy: routers are removed (contracted) one at a time, least important first, and a shortcut connection is added
+# between two neighbours of the removed router if the path through it was their only shortest path (checked with a small
+# "witness" search). a route is then found by searching only upwards (towards routers contracted later) from both ends,
+# which looks at very few routers, and shortcuts are unpacked back into the connections they replace
+# routers with more than core_degree connections left are not contracted, they form a core that the search goes through like
+# plain bidirectional dijkstra, otherwise well connected graphs get so many shortcuts that building never finishes
+# the hierarchy is only used for the graph version it was built for, it is built again on another thread after the graph changes
+
+class ContractionHierarchy():
+
+   def __init__(self, graph, witness_limit=50, core_degree=16):
+      self.graph = graph
+      self.core_degree = core_degree       # routers with more connections than this left are not contracted
+      self.witness_limit = witness_limit   # max routers settled by each witness search, a lower limit builds faster but adds more shortcuts
+      self.version = None                  # graph version the hierarchy was built for
+      self.up = {}                         # keys = router id, values = list of (id, weight) of connections to routers contracted later (or in core)
+      self.middle = {}                     # keys = (id, id) of shortcut (smaller id first), values = router it goes through
+      self.built = None                    # (version, up, middle), set by build thread
+      self.building = None                 # thread building hierarchy
+      self.used = False                    # only built again after changes once it has been asked for
+      graph.listeners.append(self.update)
+
+# called by graph after every change, starts building again straight away if the hierarchy is in use
+   def update(self, changes):
+      if self.used:
+         self.ready()
+
+# check if hierarchy is built for the graph as it is now, starts building it on another thread if not
+   def ready(self):
+      self.used = True
+      if self.version == self.graph.version:
+         return True
+      if self.built is not None and self.built[0] == self.graph.version:   # finished and the graph has not changed since
+         self.version, self.up, self.middle = self.built
+         self.built = None
+         return True
+      if self.building is None or not self.building.is_alive():
+         self.built = None
+         self.building = threading.Thread(target=self.build, args=(self.graph.snapshot(),), daemon=True)
+         self.building.start()
+      return False
+
+# contract every router of a snapshot of the graph, run on another thread
+   def build(self, graph):
+      adj = {u: dict(graph.neighbours(u)) for u in graph.ids.values()}   # connections between routers not yet contracted, with shortcuts
+      for u in adj:
+         adj[u].pop(u, None)   # a connection from a router to itself is never part of a shortest path
+      middle = {}
+      deleted = dict.fromkeys(adj, 0)   # number of neighbours already contracted, so routers are contracted evenly
+      heap = [(self.priority(adj, v, deleted, self.shortcuts(adj, v)), v) for v in adj if len(adj[v]) <= self.core_degree]
+      heapq.heapify(heap)
+      while heap:
+         p, v = heapq.heappop(heap)
+         if len(adj[v]) > self.core_degree:   # too many connections now, leave it in the core
+            continue
+         needed = self.shortcuts(adj, v)
+         if heap and self.priority(adj, v, deleted, needed) > heap[0][0]:   # neighbours changed since priority was worked out
+            heapq.heappush(heap, (self.priority(adj, v, deleted, needed), v))
+            continue
+         for u, w, weight in needed:
+            if w not in adj[u] or weight < adj[u][w]:
+               adj[u][w] = adj[w][u] = weight
+               middle[(min(u, w), max(u, w))] = v
+         for u in adj[v]:   # connections left on v all go to routers contracted later
+            del adj[u][v]
+            deleted[u] += 1
+      up = {v: list(adj[v].items()) for v in adj}   # core routers keep connections to each other both ways
+      self.built = (graph.version, up, middle)
+
+# importance of router v, more shortcuts needed than connections removed means it should be contracted later
+   def priority(self, adj, v, deleted, needed):
+      return len(needed) - len(adj[v]) + deleted[v]
+
+# shortcuts (id, id, weight) needed if router v is contracted, one for each pair of neighbours with no other path as short
+   def shortcuts(self, adj, v):
+      needed = []
+      neighbours = list(adj[v].items())
+      for i, (u, w_u) in enumerate(neighbours):
+         targets = {w: w_u + w_w for w, w_w in neighbours[i + 1:]}
+         if targets == {}:
+            continue
+         dist = self.witness(adj, u, v, max(targets.values()), targets)
+         for w, weight in targets.items():
+            if dist.get(w, weight + 1) > weight:   # no path as short that avoids v
+               needed.append((u, w, weight))
+      return needed
+
+# dijkstra from u that doesn't go through v, stops at max_dist, after settling witness_limit routers or when every target is settled
+   def witness(self, adj, u, v, max_dist, targets):
+      dist = {u: 0}
+      heap = [(0, u)]
+      settled = 0
+      left = len(targets)
+      while heap and settled < self.witness_limit and left > 0:
+         d, n = heapq.heappop(heap)
+         if d > dist[n]:
+            continue
+         if d > max_dist:
+            break
+         settled += 1
+         if n in targets:
+            left -= 1
+         for m, w in adj[n].items():
+            if m != v and (m not in dist or d + w < dist[m]):
+               dist[m] = d + w
+               heapq.heappush(heap, (d + w, m))
+      return dist
+
+# search upwards from both routers, ready() must be True
+# returns (path as list of ids, total distance, number of routers settled), path and distance are None if there is no path
+   def search(self, from_, to):
+      if from_ not in self.up or to not in self.up:
+         return None, None, 0
+      dist = ({from_: 0}, {to: 0})
+      prev = ({from_: None}, {to: None})
+      heaps = ([(0, from_)], [(0, to)])
+      settled = 0
+      best, meet = None, None
+      while heaps[0] or heaps[1]:
+         side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+         d, node = heapq.heappop(heaps[side])
+         if best is not None and d >= best:   # this side can't find anything shorter
+            heaps[side].clear()
+            continue
+         if d > dist[side][node]:   # old entry
+            continue
+         settled += 1
+         if node in dist[1 - side] and (best is None or d + dist[1 - side][node] < best):
+            best, meet = d + dist[1 - side][node], node
+         for n, w in self.up[node]:
+            if n not in dist[side] or d + w < dist[side][n]:
+               dist[side][n] = d + w
+               prev[side][n] = node
+               heapq.heappush(heaps[side], (d + w, n))
+      if best is None:
+         return None, None, settled
+      half = []
+      node = meet
+      while node is not None:
+         half.append(node)
+         node = prev[0][node]
+      half.reverse()
+      node = prev[1][meet]
+      while node is not None:
+         half.append(node)
+         node = prev[1][node]
+      return self.unpack(half), best, settled
+
+# replace every shortcut in a path with the routers it goes through
+   def unpack(self, path):
+      unpacked = [path[0]]
+      stack = [(path[i], path[i + 1]) for i in range(len(path) - 2, -1, -1)]
+      while stack:
+         u, w = stack.pop()
+         v = self.middle.get((min(u, w), max(u, w)))
+         if v is None:   # connection in the graph
+            unpacked.append(w)
+         else:
+            stack.append((v, w))
+            stack.append((u, v))
+      return unpacked
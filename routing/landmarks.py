@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import heapq
+import threading
+from array import array
+from shortest_path import Search
+
+# a* search with landmark lower bounds (alt): the distance from a few landmark routers to every router is worked out beforehand,
+# and by the triangle inequality |dist(L, t) - dist(L, v)| is never more than the distance from v to t, so the search can head
+# towards the target instead of growing evenly in every direction
+# landmarks are picked far apart (each one is the router furthest from the ones already picked) in the part of the network
+# reachable from the first router, routers outside that part get no bound and are searched like plain dijkstra
+# the tables are still valid bounds when connections get longer or are removed, so only new or shorter connections mean they
+# are worked out again, on another thread using a snapshot of the graph, until then ready() is False
+
+class Landmarks():
+
+   def __init__(self, graph, count=8):
+      self.graph = graph
+      self.count = count           # number of landmarks
+      self.landmarks = []          # landmark router ids
+      self.tables = []             # distance from each landmark to every router id, -1 if not reachable
+      self.changed = 0             # number of changes that made the tables too long
+      self.built = None            # (changed when build started, landmarks, tables), set by build thread
+      self.valid = False           # tables are bounds for the graph as it is now
+      self.building = None         # thread working out tables
+      graph.listeners.append(self.update)
+
+# called by graph after every change, tables are no longer bounds if a connection was added or got shorter
+   def update(self, changes):
+      for u, v, old, new in changes:
+         if new is not None and (old is None or new < old):
+            self.changed += 1
+            self.valid = False
+            return
+
+# check if tables can be used, starts working them out on another thread if they are out of date
+   def ready(self):
+      if self.valid:
+         return True
+      if self.built is not None and self.built[0] == self.changed:   # finished and the graph has not changed since
+         changed, self.landmarks, self.tables = self.built
+         self.built = None
+         self.valid = True
+         return True
+      if self.building is None or not self.building.is_alive():
+         self.built = None
+         self.building = threading.Thread(target=self.build, args=(self.graph.snapshot(), self.changed), daemon=True)
+         self.building.start()
+      return False
+
+# pick landmarks and work out their tables on a snapshot of the graph, run on another thread
+   def build(self, graph, changed):
+      landmarks, tables = [], []
+      if graph.ids:
+         num_ids = len(graph.names)
+         nearest = None   # distance from each router to nearest landmark
+         search = Search(graph, next(iter(graph.ids.values())))
+         search.run()
+         while len(landmarks) < self.count:
+            far = max(search.dist, key=lambda n: search.dist[n] if nearest is None else nearest[n])   # furthest from landmarks so far
+            if far in landmarks:   # fewer reachable routers than landmarks
+               break
+            search = Search(graph, far)
+            search.run()
+            table = array("q", [-1]) * num_ids
+            for n, d in search.dist.items():
+               table[n] = d
+            landmarks.append(far)
+            tables.append(table)
+            nearest = table if nearest is None else array("q", map(min, nearest, table))
+      self.built = (changed, landmarks, tables)
+
+# a* search between router ids using the landmark tables, ready() must be True
+# returns (path as list of ids, total distance, number of routers settled), path and distance are None if there is no path
+   def search(self, from_, to):
+      targets = []   # (table, distance from landmark to 'to' router) for landmarks that reach it
+      for table in self.tables:
+         d_to = table[to] if to < len(table) else -1
+         d_from = table[from_] if from_ < len(table) else -1
+         if (d_to < 0) != (d_from < 0):   # landmark reaches one router but not the other, so they are not connected
+            return None, None, 0
+         if d_to >= 0:
+            targets.append((table, d_to))
+
+      def bound(n):   # lower bound on distance from n to 'to' router
+         best = 0
+         for table, d_to in targets:
+            if n < len(table):
+               d = table[n] - d_to
+               if d < 0:
+                  d = -d
+               if d > best:
+                  best = d
+         return best
+
+      dist = {from_: 0}
+      prev = {from_: None}
+      settled = set()
+      heap = [(bound(from_), 0, from_)]   # (distance + bound, distance, router)
+      while heap:
+         f, d, node = heapq.heappop(heap)
+         if node in settled:
+            continue
+         settled.add(node)
+         if node == to:
+            path = []
+            while node is not None:
+               path.append(node)
+               node = prev[node]
+            path.reverse()
+            return path, d, len(settled)
+         for n, w in self.graph.neighbours(node):
+            new_dist = d + w
+            if n not in settled and (n not in dist or new_dist < dist[n]):
+               dist[n] = new_dist
+               prev[n] = node
+               heapq.heappush(heap, (new_dist + bound(n), new_dist, n))
+      return None, None, len(settled)
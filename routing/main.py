@@ -1,16 +1,35 @@
 #!/usr/bin/env python3
 
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
 import uvicorn
-from typing import Optional
+from collections import Counter
+from typing import List, Optional
 from pydantic import BaseModel, Field
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, PlainTextResponse
 from graph import Graph
-from shortest_path import get_shortest_path
+from cache import RouteCache
+from bulk import formats, read_records, export_lines, chunk_lines
+from store import GraphStore, apply_change
+from shared import SharedGraph, WriterClient, run_writer, shared_dir
+from pool import RoutePool, PoolBusy, PoolTimeout
+from shortest_path import bidirectional_search, k_shortest_paths, counters as search_counters
+from landmarks import Landmarks
+from hierarchy import ContractionHierarchy
+from components import Components
+from matrix import MatrixFiles, methods as matrix_methods
+from subscriptions import Subscriptions, Subscriber
+from metrics import Histogram, LatencyMiddleware, Profiler, metric
 
 api_desc = '''
    ### Ailbhe Byrne
 
-   This is a webservice using FastAPI that consists of 5 endpoints, which send and receive JSON data. It is used to represent routers in a network
+   This is a webservice using FastAPI that consists of 15 endpoints, which send and receive JSON data. It is used to represent routers in a network
    by using nodes on a graph: routers and connections can be added and removed, and the shortest path between them can be found.
 '''
 
@@ -35,6 +54,38 @@ tags_metadata = [
       "name": "Shortest Path",
       "description": "Finds the shortest path between two routers on the network",
    },
+   {
+      "name": "Shortest Paths",
+      "description": "Finds the shortest paths between many pairs of routers on the network at once",
+   },
+   {
+      "name": "K Shortest Paths",
+      "description": "Finds the k shortest paths between two routers on the network",
+   },
+   {
+      "name": "Subscribe",
+      "description": "Sends shortest paths between routers again whenever they change",
+   },
+   {
+      "name": "Route Cache",
+      "description": "Shows how often shortest paths were answered from the cache",
+   },
+   {
+      "name": "Distance Matrix",
+      "description": "Gets the shortest distance between every pair of routers on the network",
+   },
+   {
+      "name": "Metrics",
+      "description": "Shows request latency, network size and search counters for Prometheus",
+   },
+   {
+      "name": "Import",
+      "description": "Adds many routers and connections to the network at once",
+   },
+   {
+      "name": "Export",
+      "description": "Gets every router and connection in the network",
+   },
 ]
 
 # class for router with name
@@ -47,20 +98,110 @@ class Connection(BaseModel):
    to: str
    weight: Optional[int] = None
 
+# class for pair of routers to find shortest path between, with the search to use
+class RouteRequest(Connection):
+   algorithm: Optional[str] = None
+
+algorithms = ["dijkstra", "bidirectional", "alt", "ch"]
+
+# class for pair of routers to find the k shortest paths between
+class KRoutes(Connection):
+   k: Optional[int] = 3
+
+# search used by /route/ when no algorithm is given, in the ROUTING_ALGORITHM environment variable (dijkstra by default)
+# i.e. ROUTING_ALGORITHM=ch for a network that rarely changes but gets a lot of route queries
+default_algorithm = os.environ.get("ROUTING_ALGORITHM", "dijkstra")
+
+# class for list of pairs of routers to find shortest paths between
+class Routes(BaseModel):
+   routes: List[Connection]
+   stream: Optional[bool] = False
+
 app = FastAPI(
    title="CA304 Networks 2: Assignment 2",
    description=api_desc,
    openapi_tags=tags_metadata
    )
 
-graph = Graph()
+# graph is kept on disk in the directory in the ROUTING_DATA environment variable (graph_data by default), set it to "" to only keep it in memory
+data_dir = os.environ.get("ROUTING_DATA", os.path.join(os.path.dirname(os.path.abspath(__file__)), "graph_data"))
+
+# number of worker processes in the ROUTING_WORKERS environment variable, with more than one a writer process owns the graph
+# and the workers read snapshots of it from shared memory (see shared.py)
+workers = int(os.environ.get("ROUTING_WORKERS", "1"))
+shared_prefix = os.path.join(shared_dir(), os.environ.get("ROUTING_SHM", "routing-graph"))
+if workers > 1:
+   if "ROUTING_KEY" not in os.environ:   # key for the writer's socket, made by the first process and passed on to workers
+      os.environ["ROUTING_KEY"] = os.urandom(16).hex()
+   authkey = bytes.fromhex(os.environ["ROUTING_KEY"])
+   store = None
+   shared = SharedGraph(shared_prefix)
+   writer = WriterClient(shared_prefix, authkey)
+   graph = Graph()   # replaced by the newest snapshot on the first request
+else:
+   shared = writer = None
+   store = GraphStore(data_dir) if data_dir != "" else None
+   graph = store.open() if store is not None else Graph()
+
+# get_route is defined below the endpoints
+# searches stop at their target, and are finished (so they are repaired after changes) once 4 routes were asked for from a router
+def make_route_cache(graph):
+   return RouteCache(graph, lambda path, total_weight: get_route(path, total_weight), full_after=4)
+
+route_cache = make_route_cache(graph)
+landmarks = Landmarks(graph)              # distances are only worked out once alt is first asked for
+hierarchy = ContractionHierarchy(graph)   # only built once ch is first asked for
+components = Components(graph)            # part of the network each router is in
+
+# route searches run on the event loop unless ROUTING_POOL is set to thread or process, then they run on a pool of
+# ROUTING_POOL_WORKERS threads or processes (see pool.py) with at most ROUTING_POOL_QUEUE searches waiting and ROUTING_TIMEOUT seconds for each
+pool = None
+if os.environ.get("ROUTING_POOL", "") != "":
+   pool = RoutePool(os.environ["ROUTING_POOL"],
+                    workers=int(os.environ.get("ROUTING_POOL_WORKERS", "0")) or None,
+                    max_queue=int(os.environ.get("ROUTING_POOL_QUEUE", "64")),
+                    timeout=float(os.environ.get("ROUTING_TIMEOUT", "10")),
+                    prefix=os.path.join(shared_dir(), "routing-pool-%d" % os.getpid()))
+
+# most paths /routes/k-shortest/ can be asked for (ROUTING_MAX_K) and seconds it can search for (ROUTING_K_BUDGET)
+max_k = int(os.environ.get("ROUTING_MAX_K", "20"))
+k_budget = float(os.environ.get("ROUTING_K_BUDGET", "2"))
+
+# distance matrices are written to the temp directory, searched from every router on ROUTING_MATRIX_WORKERS processes for sparse
+# networks, and only for networks with at most ROUTING_MATRIX_MAX routers (the matrix takes 8 bytes for every pair)
+matrix_files = MatrixFiles(os.path.join(tempfile.gettempdir(), "routing-matrix-%d" % os.getpid()),
+                           workers=int(os.environ.get("ROUTING_MATRIX_WORKERS", "1")))
+max_matrix = int(os.environ.get("ROUTING_MATRIX_MAX", "10000"))
+
+# changes are collected for ROUTING_PUSH_WINDOW seconds before subscribers are sent the routes that changed,
+# and each client can subscribe to at most ROUTING_MAX_SUBSCRIPTIONS routes
+push_window = float(os.environ.get("ROUTING_PUSH_WINDOW", "0.2"))
+max_subscriptions = int(os.environ.get("ROUTING_MAX_SUBSCRIPTIONS", "1000"))
+subscriptions = Subscriptions(graph, lambda path, total_weight: get_route(path, total_weight), window=push_window)
+keep_alive = 15   # seconds between messages that keep an idle event stream open
+
+# request latency is measured for /metrics unless ROUTING_METRICS is 0, and if ROUTING_PROFILE is set (i.e. ROUTING_PROFILE=0.01)
+# the stack of every thread is sampled that many seconds apart for /metrics/profile
+metrics_on = os.environ.get("ROUTING_METRICS", "1") != "0"
+latency = Histogram("routing_request_duration_seconds", "Time taken to answer requests, by endpoint tag.", "tag")
+stream_latency = Histogram("routing_stream_duration_seconds", "Time streamed responses were open for, by endpoint tag.", "tag",
+                           buckets=(0.01, 0.1, 1, 10, 60, 300, 1800, 3600))
+responses = Counter()        # keys = (endpoint tag, status code)
+point_searches = Counter()   # keys = algorithm, number of bidirectional, alt and ch searches
+point_settled = Counter()    # keys = algorithm, routers settled by those searches
+if metrics_on:
+   app.add_middleware(LatencyMiddleware, histogram=latency, statuses=responses, streams=stream_latency)
+profiler = None
+if os.environ.get("ROUTING_PROFILE", "") != "":
+   profiler = Profiler(float(os.environ["ROUTING_PROFILE"]))
+   profiler.start()
 
 add_router_desc = '''
    The input is JSON data in the form of:  
    {  
    &nbsp;&nbsp; "name": "string"  
    }  
-   The string for name represents the name of the router to be added, which should be a letter of the alphabet.
+   The string for name represents the name of the router to be added, which can be any string, i.e. a letter of the alphabet.
 
    The output is JSON data in the form of:  
    {  
@@ -89,16 +230,9 @@ add_router_desc = '''
 @app.post("/addrouter/", tags=["Add Router"], description=add_router_desc)
 async def add_node_to_graph(router: Router):
    router = router.dict()
-   name = router["name"]
-   if name in graph.nodes:   # if router already in graph
-      return {
-               "status": "Error, node already exists"
-             }
-   else:
-      graph.addNode(name)    # if router not in graph, add to graph
-      return {
-               "status": "success"
-             }
+   return {
+            "status": await change_graph({"op": "addrouter", "name": router["name"]})   # add router if not already in graph
+          }
 
 add_connection_desc = '''
    The input is JSON data in the form of:  
@@ -107,8 +241,8 @@ add_connection_desc = '''
    &nbsp;&nbsp; "to": "string",  
    &nbsp;&nbsp; "weight": integer  
    }  
-   The string for from represents the name of one of the routers in the connection, which should be a letter of the alphabet.  
-   The string for to represents the name of the other router in the connection, which should also be a letter of the alphabet.  
+   The string for from represents the name of one of the routers in the connection, which can be any string, i.e. a letter of the alphabet.  
+   The string for to represents the name of the other router in the connection, which can also be any string.  
    The integer for weight represents the weight of the connection between the two routers.
 
    The output is JSON data in the form of:  
@@ -116,7 +250,7 @@ add_connection_desc = '''
    &nbsp;&nbsp; "status": "string"  
    }  
    The string for status will contain a message letting the user know whether adding the connection between the routers succeeded,
-   whether the weight for the connection was updated or if one or both of the routers does not exist.
+   whether the weight for the connection was updated, if one or both of the routers does not exist or if no weight was given.
 
    **Example input:**  
    {  
@@ -139,35 +273,28 @@ add_connection_desc = '''
    {  
    &nbsp;&nbsp; "status": "Error, router does not exist"  
    }
+
+   **Example output (no weight):**  
+   {  
+   &nbsp;&nbsp; "status": "Error, weight is required"  
+   }
 '''
 
 # add connection between routers to graph
 @app.post("/connect/", tags=["Add Connection"], description=add_connection_desc)
 async def add_edge_to_graph(connection: Connection):
    connection = connection.dict()
-   from_, to, weight = connection["from_"], connection["to"], connection["weight"]
-   edge = "".join(sorted(from_ + to))                      # add from and to routers for connection and sort alphabetically
-   if from_ not in graph.nodes or to not in graph.nodes:   # if from or to routers not in graph
-      return {
-               "status": "Error, router does not exist"
-             }
-   elif edge in graph.d_edges:        # if connection already in graph
-      graph.addEdge(edge, weight)     # update connection weight
-      return {
-               "status": "updated"
-             }
-   else:                              # if connection not in graph
-      graph.addEdge(edge, weight)     # add connection and weight to graph
-      return {
-               "status": "success"
-             }
+   change = {"op": "connect", "from": connection["from_"], "to": connection["to"], "weight": connection["weight"]}
+   return {
+            "status": await change_graph(change)   # add connection, or update its weight if already in graph
+          }
 
 remove_router_desc = '''
    The input is JSON data in the form of:  
    {  
    &nbsp;&nbsp; "name": "string"  
    }  
-   The string for name represents the name of the router to be removed, which should be a letter of the alphabet.
+   The string for name represents the name of the router to be removed, which can be any string, i.e. a letter of the alphabet.
 
    The output is JSON data in the form of:  
    {  
@@ -190,11 +317,8 @@ remove_router_desc = '''
 @app.post("/removerouter/", tags=["Remove Router"], description=remove_router_desc)
 async def remove_node_from_graph(router: Router):
    router = router.dict()
-   name = router["name"]
-   if name in graph.nodes:     # if router in graph
-      graph.removeNode(name)   # remove router from graph
    return {
-            "status":"success"
+            "status": await change_graph({"op": "removerouter", "name": router["name"]})   # remove router if in graph
           }
 
 remove_connection_desc = '''
@@ -203,8 +327,8 @@ remove_connection_desc = '''
    &nbsp;&nbsp; "from": "string",  
    &nbsp;&nbsp; "to": "string"  
    }  
-   The string for from represents the name of one of the routers in the connection, which should be a letter of the alphabet.  
-   The string for to represents the name of the other router in the connection, which should also be a letter of the alphabet.  
+   The string for from represents the name of one of the routers in the connection, which can be any string, i.e. a letter of the alphabet.  
+   The string for to represents the name of the other router in the connection, which can also be any string.  
 
    The output is JSON data in the form of:  
    {  
@@ -228,22 +352,29 @@ remove_connection_desc = '''
 @app.post("/removeconnection/", tags=["Remove Connection"], description=remove_connection_desc)
 async def remove_edge_from_graph(connection: Connection):
    connection = connection.dict()
-   from_, to = connection["from_"], connection["to"]
-   edge = "".join(sorted(from_ + to))   # add from and to routers for connection and sort alphabetically
-   if edge in graph.d_edges:            # if connection in graph
-      graph.removeEdge(edge)            # remove connection
    return {
-            "status":"success"
+            "status": await change_graph({"op": "removeconnection", "from": connection["from_"], "to": connection["to"]})   # remove connection if in graph
           }
 
 shortest_path_desc = '''
    The input is JSON data in the form of:  
    {  
    &nbsp;&nbsp; "from": "string",  
-   &nbsp;&nbsp; "to": "string"  
+   &nbsp;&nbsp; "to": "string",  
+   &nbsp;&nbsp; "algorithm": "string"  
    }  
-   The string for from represents the name of the first router in the path, which should be a letter of the alphabet.  
-   The string for to represents the name of the target router in the path, which should also be a letter of the alphabet.  
+   The string for from represents the name of the first router in the path, which can be any string, i.e. a letter of the alphabet.  
+   The string for to represents the name of the target router in the path, which can also be any string.  
+   The string for algorithm is optional and chooses how the path is searched for, the path found has the same weight with each one:  
+   dijkstra (default) searches outwards from the first router until it reaches the target router and keeps the search, so later routes
+   from it are quick. Once routes from the same router have been asked for a few times, every router reachable from it is searched, so
+   the search can be repaired instead of thrown away when the network changes.  
+   bidirectional searches from both routers at once until the two searches meet, so far fewer routers are looked at for one route.  
+   alt searches towards the target router using distances to a few landmark routers worked out beforehand. The landmark distances are
+   worked out again in the background when a connection is added or gets shorter, and bidirectional is used until they are ready.  
+   ch uses a contraction hierarchy, made by removing routers one at a time and adding shortcut connections in their place, so only a few
+   routers are looked at. It is built again in the background every time the network changes, and dijkstra is used until it is ready,
+   so it suits networks that rarely change. Shortcuts are replaced by the connections they stand for in the route.  
 
    The output is JSON data in the form of:  
    {  
@@ -304,15 +435,121 @@ shortest_path_desc = '''
    &nbsp;&nbsp;&nbsp;&nbsp; "A"  
    &nbsp;&nbsp; ]  
    }
+
+   If route searches run on a pool and too many are already waiting, the status code is 503 and the output is
+   {"status": "Error, too many routes are being searched for"}. If the search takes too long, the status code is 504 and the output is
+   {"status": "Error, route search timed out"}.  
+   A route searched for on a pool is for the network as it was when the request arrived, even if routers or connections are added
+   or removed while it is being searched for.
 '''
 
 # get shortest path between 2 routers
 @app.post("/route/", tags=["Shortest Path"], description=shortest_path_desc)
-async def shortest_path(connection: Connection):
+async def shortest_path(connection: RouteRequest):
    connection = connection.dict()
-   from_, to = connection["from_"], connection["to"]
+   if connection["algorithm"] is None:
+      connection["algorithm"] = default_algorithm
+   if connection["algorithm"] not in algorithms:
+      return {
+               "status": "Error, algorithm must be dijkstra, bidirectional, alt or ch"
+             }
+   refresh_graph()
+   return await find_route(connection["from_"], connection["to"], connection["algorithm"])
+
+shortest_paths_desc = '''
+   The input is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "routes": list,  
+   &nbsp;&nbsp; "stream": boolean  
+   }  
+   The list for routes contains the pairs of routers to find shortest paths between, each in the same form as the input for /route/.  
+   The boolean for stream is optional (default false), if it is true each route is sent on its own line (NDJSON) as soon as it is found.  
+
+   Pairs with the same from router are grouped together, so only one search is done for each from router.
+
+   The output is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "routes": list  
+   }  
+   The list for routes will contain the output of /route/ for each pair, in the same order as the input.  
+   If stream is true, the output is instead one /route/ output per line, grouped by from router.
+
+   **Example input:**  
+   {  
+   &nbsp;&nbsp; "routes": [  
+   &nbsp;&nbsp;&nbsp;&nbsp; {  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "from": "A",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "to": "F"  
+   &nbsp;&nbsp;&nbsp;&nbsp; },  
+   &nbsp;&nbsp;&nbsp;&nbsp; {  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "from": "A",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "to": "A"  
+   &nbsp;&nbsp;&nbsp;&nbsp; }  
+   &nbsp;&nbsp; ]  
+   }  
+
+   **Example output:**  
+   {  
+   &nbsp;&nbsp; "routes": [  
+   &nbsp;&nbsp;&nbsp;&nbsp; {  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "from": "A",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "to": "F",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "weight": 11,  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "route": [  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; {  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "from": "A",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "to": "C",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "weight": 9  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; },  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; {  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "from": "C",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "to": "F",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "weight": 2  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; }  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; ]  
+   &nbsp;&nbsp;&nbsp;&nbsp; },  
+   &nbsp;&nbsp;&nbsp;&nbsp; {  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "from": "A",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "to": "A",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "weight": 0,  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "route": [  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "A"  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; ]  
+   &nbsp;&nbsp;&nbsp;&nbsp; }  
+   &nbsp;&nbsp; ]  
+   }
+'''
+
+# get shortest paths between many pairs of routers
+@app.post("/routes/", tags=["Shortest Paths"], description=shortest_paths_desc)
+async def shortest_paths(routes: Routes):
+   routes = routes.dict()
+   refresh_graph()
+   pairs = [(connection["from_"], connection["to"]) for connection in routes["routes"]]
+   order = sorted(range(len(pairs)), key=lambda i: pairs[i][0])   # group pairs by from router so each search is only done once
+   if routes["stream"]:
+      return StreamingResponse(stream_routes(pairs, order), media_type="application/x-ndjson")
+   found = [None] * len(pairs)
+   for i in order:
+      found[i] = await find_route(pairs[i][0], pairs[i][1])
+   return {
+            "routes": found
+          }
+
+# send routes one line at a time as they are found
+async def stream_routes(pairs, order):
+   for i in order:
+      try:
+         route = await find_route(pairs[i][0], pairs[i][1])
+      except (PoolBusy, PoolTimeout) as e:   # response has already started, so the error goes on the line for this route
+         route = {"from": pairs[i][0], "to": pairs[i][1], "status": pool_error(e)[1]}
+      yield json.dumps(route) + "\n"
+
+# get shortest path between 2 routers in the form returned by /route/
+# with a pool, routes that are not in the cache are searched for on the pool so other requests are not held up
+async def find_route(from_, to, algorithm="dijkstra"):
    if from_ == to:               # if from router is same as to router
-      if from_ in graph.nodes:   # if router is in graph
+      if graph.hasNode(from_):   # if router is in graph
          total_weight = 0
          route = [from_]
       else:                      # if router not in graph
@@ -320,13 +557,23 @@ async def shortest_path(connection: Connection):
          route = []
    else:                         # if from router not same as to router
       route = []
-      if graph.d_edges != {}:    # if graph has connections
-         path = get_shortest_path(graph.nodes, graph.d_edges, from_, to)   # get shortest path between routers
-         if path != None:                       # if a path exists between from and to routers
-            path_edges = get_path_edges(path)   # get connections in path
-            total_weight = sum([graph.d_edges["".join(sorted(edge))] for edge in path_edges])   # get total weight of path (add connection weights)
-            for edge in path_edges:
-               route.append({"from": edge[0], "to": edge[1], "weight": graph.d_edges["".join(sorted(edge))]})   # add connections and weights to route
+      if algorithm == "ch" and not hierarchy.ready():   # use dijkstra until hierarchy is built for the graph as it is now
+         algorithm = "dijkstra"
+      if not graph.hasNode(from_) or not graph.hasNode(to):   # if from or to router not in graph
+         total_weight = -1
+      elif components.disconnected(graph.ids[from_], graph.ids[to]):   # routers are in different parts of the network, no need to search
+         total_weight = -1
+      elif graph.num_edges > 0:  # if graph has connections
+         if algorithm != "dijkstra" and not route_cache.cached(from_, to):
+            result = point_route(from_, to, algorithm)
+         elif pool is not None and not route_cache.cached(from_, to):
+            route_cache.misses += 1
+            found = await pool.route(graph, route_cache, graph.ids[from_], graph.ids[to])
+            result = get_route(*found) if found is not None else None
+         else:
+            result = route_cache.route(from_, to)   # get shortest path between routers (cached until graph changes)
+         if result != None:                      # if a path exists between from and to routers
+            total_weight, route = result
          else:
             total_weight = -1   # if a path does not exist
       else:
@@ -338,17 +585,690 @@ async def shortest_path(connection: Connection):
             "route": route,
           }
 
+# get shortest path between 2 routers with bidirectional dijkstra, alt or ch, which only search between the two routers so are not cached
+def point_route(from_, to, algorithm):
+   u, v = graph.ids[from_], graph.ids[to]
+   if algorithm == "ch":
+      path, total_weight, settled = hierarchy.search(u, v)
+   elif algorithm == "alt" and landmarks.ready():
+      path, total_weight, settled = landmarks.search(u, v)
+   else:   # bidirectional, or alt while landmark distances are being worked out
+      algorithm = "bidirectional"
+      path, total_weight, settled = bidirectional_search(graph, u, v)
+   point_searches[algorithm] += 1
+   point_settled[algorithm] += settled
+   if path is None:
+      return None
+   return get_route([graph.names[n] for n in path], total_weight)
+
+k_shortest_desc = '''
+   The input is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "from": "string",  
+   &nbsp;&nbsp; "to": "string",  
+   &nbsp;&nbsp; "k": integer  
+   }  
+   The string for from represents the name of the first router in the paths, which can be any string, i.e. a letter of the alphabet.  
+   The string for to represents the name of the target router in the paths, which can also be any string.  
+   The integer for k is optional (default 3) and is the number of paths to find, at most 20 unless the server sets a different limit.  
+
+   The paths never visit a router twice and are found shortest first. Finding them stops after a time limit (2 seconds by default),
+   and the paths found so far are given.
+
+   The output is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "from": "string",  
+   &nbsp;&nbsp; "to": "string",  
+   &nbsp;&nbsp; "routes": list,  
+   &nbsp;&nbsp; "complete": boolean  
+   }  
+   The strings for from and to will contain the names of the first and target routers.  
+   The list for routes will contain up to k paths, shortest first, each with the integer for weight and the list for route in the same
+   form as the output of /route/. It is empty if there is no path, and has fewer than k paths if there are no more.  
+   The boolean for complete will be false if the time limit was reached before k paths were found.
+
+   **Example input:**  
+   {  
+   &nbsp;&nbsp; "from": "A",  
+   &nbsp;&nbsp; "to": "C",  
+   &nbsp;&nbsp; "k": 2  
+   }  
+
+   **Example output:**  
+   {  
+   &nbsp;&nbsp; "from": "A",  
+   &nbsp;&nbsp; "to": "C",  
+   &nbsp;&nbsp; "routes": [  
+   &nbsp;&nbsp;&nbsp;&nbsp; {  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "weight": 9,  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "route": [  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; {  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "from": "A",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "to": "C",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "weight": 9  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; }  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; ]  
+   &nbsp;&nbsp;&nbsp;&nbsp; },  
+   &nbsp;&nbsp;&nbsp;&nbsp; {  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "weight": 16,  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "route": [  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; {  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "from": "A",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "to": "F",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "weight": 14  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; },  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; {  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "from": "F",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "to": "C",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "weight": 2  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; }  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; ]  
+   &nbsp;&nbsp;&nbsp;&nbsp; }  
+   &nbsp;&nbsp; ],  
+   &nbsp;&nbsp; "complete": true  
+   }
+
+   **Example output (k not valid):**  
+   {  
+   &nbsp;&nbsp; "status": "Error, k must be between 1 and 20"  
+   }
+'''
+
+# get k shortest paths between 2 routers, searched on the pool if there is one, the graph itself is never changed by the search
+@app.post("/routes/k-shortest/", tags=["K Shortest Paths"], description=k_shortest_desc)
+async def k_shortest(connection: KRoutes):
+   connection = connection.dict()
+   from_, to, k = connection["from_"], connection["to"], connection["k"]
+   if k is None or k < 1 or k > max_k:
+      return {
+               "status": "Error, k must be between 1 and %d" % max_k
+             }
+   refresh_graph()
+   routes, complete = [], True
+   if from_ == to and graph.hasNode(from_):   # same as /route/, a path of just the router
+      routes.append({"weight": 0, "route": [from_]})
+   elif graph.hasNode(from_) and graph.hasNode(to) and not components.disconnected(graph.ids[from_], graph.ids[to]):
+      args = (graph.ids[from_], graph.ids[to], k, time.time() + k_budget)
+      if pool is not None:
+         paths, complete = await pool.call(graph, k_shortest_paths, *args)
+      else:
+         paths, complete = k_shortest_paths(graph, *args)
+      names = graph.names   # ids are never reused, so these are the right names even if the graph changed during the search
+      for path, total_weight, weights in paths:
+         total_weight, route = get_route([names[n] for n in path], total_weight, weights)
+         routes.append({"weight": total_weight, "route": route})
+   return {
+            "from": from_,
+            "to": to,
+            "routes": routes,
+            "complete": complete,
+          }
+
+subscribe_desc = '''
+   Routes can be subscribed to over a WebSocket or an event stream, then the route is sent again whenever its weight or the
+   connections in it change, instead of asking /route/ again and again. Changes made close together (within 0.2 seconds by default)
+   are sent together, and only the newest route is sent for each pair of routers.
+
+   **WebSocket:** connect to ws://host/subscribe/ and send JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "subscribe": list,  
+   &nbsp;&nbsp; "unsubscribe": list  
+   }  
+   The lists for subscribe and unsubscribe are optional and contain pairs of routers, each in the same form as the input for /route/
+   (without algorithm). Each message is answered with JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "status": "string",  
+   &nbsp;&nbsp; "subscriptions": integer  
+   }  
+   The string for status will contain a message letting the user know whether the message was valid.  
+   The integer for subscriptions will contain the number of routes the client is subscribed to.  
+   The route for each new pair is then sent straight away, and sent again every time it changes, in the same form as the output of /route/.
+
+   **Event stream:** get /subscribe/ with a from and to query parameter for each route, i.e. /subscribe/?from=A&to=F&from=B&to=C  
+   Each route is sent as an event in the same form as the output of /route/, straight away and then every time it changes.
+
+   **Example WebSocket input:**  
+   {  
+   &nbsp;&nbsp; "subscribe": [  
+   &nbsp;&nbsp;&nbsp;&nbsp; {  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "from": "A",  
+   &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp; "to": "F"  
+   &nbsp;&nbsp;&nbsp;&nbsp; }  
+   &nbsp;&nbsp; ]  
+   }
+
+   **Example event:**  
+   data: {"from": "A", "to": "F", "weight": 11, "route": [{"from": "A", "to": "C", "weight": 9}, {"from": "C", "to": "F", "weight": 2}]}
+
+   **Example output (not valid):**  
+   {  
+   &nbsp;&nbsp; "status": "Error, from and to must be given for every route"  
+   }
+'''
+
+# subscribe to routes over a websocket, routes to add or remove are sent by the client while changed routes are sent to it
+@app.websocket("/subscribe/")
+async def subscribe_socket(websocket: WebSocket):
+   await websocket.accept()
+   subscriber = Subscriber()
+   sending = asyncio.ensure_future(send_routes(subscriber, websocket))
+   try:
+      while True:
+         text = await websocket.receive_text()
+         refresh_graph()
+         await websocket.send_json(change_subscriptions(subscriber, text))
+   except WebSocketDisconnect:
+      pass
+   finally:
+      sending.cancel()
+      subscriptions.close(subscriber)
+
+# send routes that changed to a websocket client until it disconnects
+async def send_routes(subscriber, websocket):
+   async for routes in route_pushes(subscriber):
+      for route in routes:
+         await websocket.send_json(route)
+
+# subscribe or unsubscribe websocket client from routes in a message, returns status
+def change_subscriptions(subscriber, text):
+   try:
+      message = json.loads(text)
+   except ValueError:
+      message = None
+   if not isinstance(message, dict) or not set(message) <= {"subscribe", "unsubscribe"}:
+      return {
+               "status": "Error, expected subscribe or unsubscribe"
+             }
+   pairs = {}
+   for key in ("subscribe", "unsubscribe"):
+      pairs[key] = get_pairs(message.get(key, []))
+      if pairs[key] is None:
+         return {
+                  "status": "Error, from and to must be given for every route"
+                }
+   new = {pair for pair in pairs["subscribe"] if pair not in subscriber.pairs}
+   if len(subscriber.pairs) + len(new) > max_subscriptions:
+      return {
+               "status": "Error, at most %d routes can be subscribed to" % max_subscriptions
+             }
+   for from_, to in pairs["unsubscribe"]:
+      subscriptions.unsubscribe(subscriber, from_, to)
+   for pair in new:
+      subscriber.push(pair, subscriptions.subscribe(subscriber, *pair))   # sent with other routes so it is never sent after a newer one
+   return {
+            "status": "success",
+            "subscriptions": len(subscriber.pairs),
+          }
+
+# get list of (from, to) from a list of pairs of routers in the same form as the input for /route/, None if it is not valid
+def get_pairs(items):
+   if not isinstance(items, list):
+      return None
+   pairs = []
+   for item in items:
+      if not isinstance(item, dict) or not isinstance(item.get("from"), str) or not isinstance(item.get("to"), str):
+         return None
+      pairs.append((item["from"], item["to"]))
+   return pairs
+
+# subscribe to routes as an event stream (server-sent events), from and to are given once for each route
+@app.get("/subscribe/", tags=["Subscribe"], description=subscribe_desc)
+async def subscribe_events(from_: List[str] = Query([], alias="from"), to: List[str] = Query([])):
+   if len(from_) != len(to) or from_ == []:
+      return {
+               "status": "Error, from and to must be given for every route"
+             }
+   if len(set(zip(from_, to))) > max_subscriptions:
+      return {
+               "status": "Error, at most %d routes can be subscribed to" % max_subscriptions
+             }
+   refresh_graph()
+   subscriber = Subscriber()
+   for pair in zip(from_, to):
+      subscriber.push(pair, subscriptions.subscribe(subscriber, *pair))
+   return StreamingResponse(route_events(subscriber), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# send routes that changed as events until the client disconnects
+async def route_events(subscriber):
+   try:
+      async for routes in route_pushes(subscriber):
+         if routes == []:
+            yield ": keep-alive\n\n"   # comment line, so proxies don't close the stream
+         for route in routes:
+            yield "data: %s\n\n" % json.dumps(route)
+   finally:
+      subscriptions.close(subscriber)
+
+# get lists of routes that changed for a subscriber, an empty list every keep_alive seconds if nothing changed
+# with more than one worker the writer's change log is checked every push window, since changes are made by the writer process
+async def route_pushes(subscriber):
+   last = time.time()
+   while True:
+      routes = await subscriber.next(push_window if shared is not None else keep_alive)
+      if shared is not None:
+         refresh_graph()
+      if routes != [] or time.time() - last >= keep_alive:
+         last = time.time()
+         yield routes
+
+route_cache_desc = '''
+   There is no input.
+
+   The output is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "hits": integer,  
+   &nbsp;&nbsp; "misses": integer,  
+   &nbsp;&nbsp; "repairs": integer,  
+   &nbsp;&nbsp; "searches": integer,  
+   &nbsp;&nbsp; "version": integer,  
+   &nbsp;&nbsp; "rejected": integer,  
+   &nbsp;&nbsp; "subscriptions": object  
+   }  
+   The integer for hits will contain the number of shortest paths that were answered from the cache.  
+   The integer for misses will contain the number of shortest paths that had to be searched for.  
+   The integer for repairs will contain the number of times a cached search was repaired after a change, instead of searching again.  
+   The integer for searches will contain the number of searches (one per from router) currently kept in the cache.  
+   The integer for version will contain the version of the network, which increases every time a router or connection is added or removed.
+   When a connection changes, only the routes that used it (or can now use it) are searched for again.  
+   The integer for rejected will contain the number of routes that were answered without searching because the two routers are in
+   different parts of the network (no connections join them).  
+   The object for subscriptions will contain the number of routes subscribed to (routes), the number of clients subscribed (subscribers)
+   and the number of changed routes sent to clients (pushes), see /subscribe/.
+
+   If route searches run on a pool (the ROUTING_POOL environment variable is thread or process), there is also an object for pool with
+   the mode, number of workers, number of searches waiting, number of searches turned away because too many were waiting (busy)
+   and number of searches that timed out (timeouts).
+'''
+
+# get route cache counters
+@app.get("/cache/", tags=["Route Cache"], description=route_cache_desc)
+async def route_cache_stats():
+   refresh_graph()
+   stats = route_cache.stats()
+   stats["rejected"] = components.rejected
+   stats["subscriptions"] = subscriptions.stats()
+   if pool is not None:
+      stats["pool"] = pool.stats()
+   return stats
+
+# status code and message when the pool can't search for a route
+def pool_error(e):
+   if isinstance(e, PoolBusy):
+      return 503, "Error, too many routes are being searched for"
+   return 504, "Error, route search timed out"
+
+# route searches that were turned away or timed out
+@app.exception_handler(PoolBusy)
+@app.exception_handler(PoolTimeout)
+async def pool_error_response(request: Request, e: Exception):
+   status_code, status = pool_error(e)
+   return JSONResponse(status_code=status_code, content={"status": status})
+
+matrix_desc = '''
+   There is no input. The method is chosen with the query parameter method, which can be auto (default), floyd or dijkstra,
+   i.e. /matrix/?method=floyd
+
+   The output is a NumPy .npy file with the shortest distance between every pair of routers, where row i and column j is the distance
+   from the i-th router to the j-th router in the list from /matrix/nodes/. Distances are 64 bit integers, and -1 if there is no path.
+   The file can be loaded with numpy.load, and numpy.load(path, mmap_mode="r") reads it from disk as it is used instead of all at once.
+   The version of the network the distances are for is in the X-Graph-Version header of the response.
+
+   floyd works out the matrix with the Floyd-Warshall algorithm using NumPy, which is quickest for networks with a lot of connections.
+   dijkstra searches from every router (on more than one process if the ROUTING_MATRIX_WORKERS environment variable is set), which is
+   quickest for networks with few connections. auto picks whichever should be quicker.
+   The matrix is only worked out once for each version of the network, later requests get the same file.
+
+   The matrix can also be written without the server with "python3 matrix.py <output path> [method] [number of processes]".
+
+   **Example output (too many routers):**  
+   {  
+   &nbsp;&nbsp; "status": "Error, network has more than 10000 routers"  
+   }
+'''
+
+# get distance matrix file, the network can change while it is worked out since it is worked out on a snapshot
+@app.get("/matrix/", tags=["Distance Matrix"], description=matrix_desc)
+async def distance_matrix(method: str = "auto"):
+   status = check_matrix(method)
+   if status is not None:
+      return status
+   path, header = await matrix_files.get(graph, method)
+   return FileResponse(path + ".npy", media_type="application/octet-stream", filename="distances.npy",
+                       headers={"X-Graph-Version": str(header["version"])})
+
+matrix_nodes_desc = '''
+   There is no input. The method is chosen with the query parameter method, in the same way as for /matrix/.
+
+   The output is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "version": integer,  
+   &nbsp;&nbsp; "method": "string",  
+   &nbsp;&nbsp; "unreachable": integer,  
+   &nbsp;&nbsp; "dtype": "string",  
+   &nbsp;&nbsp; "nodes": [  
+   &nbsp;&nbsp;&nbsp;&nbsp; "string"  
+   &nbsp;&nbsp; ]  
+   }  
+   The integer for version will contain the version of the network the matrix is for, the same as the X-Graph-Version header from /matrix/.  
+   The string for method will contain floyd or dijkstra, whichever was used.  
+   The integer for unreachable will contain the distance given when there is no path (-1).  
+   The string for dtype will contain the NumPy type of the distances (int64).  
+   The list for nodes will contain the name of the router for each row and column of the matrix, in order.
+
+   **Example output:**  
+   {  
+   &nbsp;&nbsp; "version": 12,  
+   &nbsp;&nbsp; "method": "floyd",  
+   &nbsp;&nbsp; "unreachable": -1,  
+   &nbsp;&nbsp; "dtype": "int64",  
+   &nbsp;&nbsp; "nodes": [  
+   &nbsp;&nbsp;&nbsp;&nbsp; "A",  
+   &nbsp;&nbsp;&nbsp;&nbsp; "B",  
+   &nbsp;&nbsp;&nbsp;&nbsp; "C"  
+   &nbsp;&nbsp; ]  
+   }
+'''
+
+# get router of each row and column of distance matrix
+@app.get("/matrix/nodes/", tags=["Distance Matrix"], description=matrix_nodes_desc)
+async def distance_matrix_nodes(method: str = "auto"):
+   status = check_matrix(method)
+   if status is not None:
+      return status
+   path, header = await matrix_files.get(graph, method)
+   return header
+
+# check method and size of network for a distance matrix, returns status if it can't be made
+def check_matrix(method):
+   if method not in matrix_methods:
+      return {
+               "status": "Error, method must be auto, floyd or dijkstra"
+             }
+   refresh_graph()
+   if len(graph.ids) > max_matrix:
+      return {
+               "status": "Error, network has more than %d routers" % max_matrix
+             }
+   return None
+
+metrics_desc = '''
+   There is no input. The path is /metrics (without a slash at the end) so Prometheus can scrape it as it is.
+
+   The output is plain text in the Prometheus text format, with:  
+   routing_request_duration_seconds: histogram of the time taken to answer requests, for each endpoint tag (i.e. "Shortest Path").  
+   routing_stream_duration_seconds: histogram of the time streamed responses (/subscribe/ event streams, /export/ and /routes/ with
+   stream) were open for, which are not in routing_request_duration_seconds. WebSocket connections are not timed.  
+   routing_responses_total: number of responses for each endpoint tag and status code.  
+   routing_routers, routing_connections and routing_graph_version: size and version of the network.  
+   routing_dijkstra_runs_total, routing_dijkstra_settled_nodes_total and routing_dijkstra_relaxed_edges_total: number of dijkstra searches
+   run (or continued) in this process, routers settled by them and connections looked at from settled routers.  
+   routing_point_searches_total and routing_point_search_settled_nodes_total: number of bidirectional, alt and ch searches, and routers
+   settled by them.  
+   routing_route_cache_hits_total, routing_route_cache_misses_total, routing_route_cache_repairs_total, routing_route_cache_searches and
+   routing_route_cache_hit_ratio: the same numbers as /cache/, with the fraction of routes answered from the cache.  
+   routing_rejected_routes_total: routes answered without searching because the routers are in different parts of the network.  
+   routing_subscribed_routes, routing_subscribers and routing_route_pushes_total: subscriptions (see /subscribe/).  
+   routing_pool_waiting, routing_pool_busy_total and routing_pool_timeouts_total: only if route searches run on a pool.
+
+   With more than one worker process each worker has its own numbers, and searches run on a pool of processes are not counted.
+   If the ROUTING_METRICS environment variable is 0, request latency is not measured and the output is
+   {"status": "Error, metrics are turned off"}.
+
+   **Example output (part of it):**  
+   routing_request_duration_seconds_bucket{tag="Shortest Path",le="0.001"} 42  
+   routing_routers 6  
+   routing_dijkstra_settled_nodes_total 240
+'''
+
+# get metrics in the prometheus text format, everything but request latency is read now
+@app.get("/metrics", tags=["Metrics"], description=metrics_desc)
+async def get_metrics():
+   if not metrics_on:
+      return {
+               "status": "Error, metrics are turned off"
+             }
+   refresh_graph()
+   stats = route_cache.stats()
+   lines = latency.lines()
+   lines += stream_latency.lines()
+   lines += metric("routing_responses_total", "counter", "Responses sent, by endpoint tag and status code.",
+                   [({"tag": tag, "code": code}, count) for (tag, code), count in sorted(responses.items())])
+   lines += metric("routing_routers", "gauge", "Routers in the network.", [(None, len(graph.ids))])
+   lines += metric("routing_connections", "gauge", "Connections in the network.", [(None, graph.num_edges)])
+   lines += metric("routing_graph_version", "gauge", "Version of the network, increased by every change.", [(None, graph.version)])
+   lines += metric("routing_dijkstra_runs_total", "counter", "Dijkstra searches run or continued.", [(None, search_counters["runs"])])
+   lines += metric("routing_dijkstra_settled_nodes_total", "counter", "Routers settled by dijkstra searches.", [(None, search_counters["settled"])])
+   lines += metric("routing_dijkstra_relaxed_edges_total", "counter", "Connections looked at from routers settled by dijkstra searches.",
+                   [(None, search_counters["relaxed"])])
+   lines += metric("routing_point_searches_total", "counter", "Bidirectional, alt and ch searches.",
+                   [({"algorithm": algorithm}, count) for algorithm, count in sorted(point_searches.items())])
+   lines += metric("routing_point_search_settled_nodes_total", "counter", "Routers settled by bidirectional, alt and ch searches.",
+                   [({"algorithm": algorithm}, count) for algorithm, count in sorted(point_settled.items())])
+   lines += metric("routing_route_cache_hits_total", "counter", "Routes answered from the route cache.", [(None, stats["hits"])])
+   lines += metric("routing_route_cache_misses_total", "counter", "Routes that had to be searched for.", [(None, stats["misses"])])
+   lines += metric("routing_route_cache_repairs_total", "counter", "Cached searches repaired after a change.", [(None, stats["repairs"])])
+   lines += metric("routing_route_cache_searches", "gauge", "Searches kept in the route cache.", [(None, stats["searches"])])
+   lookups = stats["hits"] + stats["misses"]
+   lines += metric("routing_route_cache_hit_ratio", "gauge", "Fraction of routes answered from the route cache.",
+                   [(None, stats["hits"] / lookups if lookups > 0 else 0.0)])
+   lines += metric("routing_rejected_routes_total", "counter", "Routes answered without searching because the routers are not connected.",
+                   [(None, components.rejected)])
+   subscribed = subscriptions.stats()
+   lines += metric("routing_subscribed_routes", "gauge", "Routes subscribed to.", [(None, subscribed["routes"])])
+   lines += metric("routing_subscribers", "gauge", "Clients subscribed to routes.", [(None, subscribed["subscribers"])])
+   lines += metric("routing_route_pushes_total", "counter", "Changed routes sent to subscribers.", [(None, subscribed["pushes"])])
+   if pool is not None:
+      pool_stats = pool.stats()
+      lines += metric("routing_pool_waiting", "gauge", "Route searches waiting or running on the pool.", [(None, pool_stats["waiting"])])
+      lines += metric("routing_pool_busy_total", "counter", "Route searches turned away because too many were waiting.", [(None, pool_stats["busy"])])
+      lines += metric("routing_pool_timeouts_total", "counter", "Route searches that timed out.", [(None, pool_stats["timeouts"])])
+   return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+profile_desc = '''
+   There is no input. Only works if the server was started with the ROUTING_PROFILE environment variable set to the number of seconds
+   between samples, i.e. "ROUTING_PROFILE=0.01 python3 main.py".
+
+   The output is plain text with every stack seen by the sampling profiler and the number of times it was seen, one per line, in the
+   collapsed format read by flamegraph.pl and speedscope. Each stack starts with the name of the thread.
+
+   **Example output (part of it):**  
+   MainThread;main.py:main;...;main.py:shortest_path;main.py:find_route;cache.py:route;shortest_path.py:run 37
+
+   **Example output (not started):**  
+   {  
+   &nbsp;&nbsp; "status": "Error, profiler is not running, set ROUTING_PROFILE to start it"  
+   }
+'''
+
+# get stacks counted by the sampling profiler
+@app.get("/metrics/profile", tags=["Metrics"], description=profile_desc)
+async def get_profile():
+   if profiler is None:
+      return {
+               "status": "Error, profiler is not running, set ROUTING_PROFILE to start it"
+             }
+   return PlainTextResponse(profiler.collapsed())
+
+import_desc = '''
+   The input is the body of the request, with one router or connection on each line. The format is chosen with the query parameter
+   format, which can be ndjson (default) or csv, i.e. /import/?format=csv
+
+   For ndjson each line is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "name": "string"  
+   }  
+   for a router, or:  
+   {  
+   &nbsp;&nbsp; "from": "string",  
+   &nbsp;&nbsp; "to": "string",  
+   &nbsp;&nbsp; "weight": integer  
+   }  
+   for a connection, in the same form as the input for /addrouter/ and /connect/.
+
+   For csv each line is:  
+   router,name  
+   for a router, or:  
+   connection,from,to,weight  
+   for a connection.
+
+   The body is read as it arrives and every line is checked before anything is added. If any line is not valid (or uses a router that
+   does not exist and is not added earlier in the import) nothing is added. Routers that already exist are skipped and connections that already
+   exist have their weight updated.
+
+   The output is JSON data in the form of:  
+   {  
+   &nbsp;&nbsp; "status": "string",  
+   &nbsp;&nbsp; "routers": integer,  
+   &nbsp;&nbsp; "connections": integer  
+   }  
+   The string for status will contain a message letting the user know whether the import succeeded.  
+   The integer for routers will contain the number of routers added.  
+   The integer for connections will contain the number of connections added or updated.  
+   If the import failed, there is a list for errors instead of routers and connections, with a message for each line that was not valid.
+
+   **Example input (ndjson):**  
+   {"name": "A"}  
+   {"name": "B"}  
+   {"from": "A", "to": "B", "weight": 7}  
+
+   **Example input (csv):**  
+   router,A  
+   router,B  
+   connection,A,B,7  
+
+   **Example output (success):**  
+   {  
+   &nbsp;&nbsp; "status": "success",  
+   &nbsp;&nbsp; "routers": 2,  
+   &nbsp;&nbsp; "connections": 1  
+   }
+
+   **Example output (not valid):**  
+   {  
+   &nbsp;&nbsp; "status": "Error, nothing was imported",  
+   &nbsp;&nbsp; "errors": [  
+   &nbsp;&nbsp;&nbsp;&nbsp; "line 3: router C does not exist"  
+   &nbsp;&nbsp; ]  
+   }
+'''
+
+# add many routers and connections to graph
+@app.post("/import/", tags=["Import"], description=import_desc)
+async def import_graph(request: Request, format: str = "ndjson"):
+   if format not in formats:
+      return {
+               "status": "Error, format must be ndjson or csv"
+             }
+   refresh_graph()
+   routers, connections, errors = await read_records(request.stream(), format, graph)   # read whole body and check every line
+   if errors != []:
+      return {
+               "status": "Error, nothing was imported",
+               "errors": errors[:100],
+             }
+   status = await change_graph({"op": "import", "routers": routers, "connections": connections})
+   if status != "success":
+      return {
+               "status": status
+             }
+   return {
+            "status": "success",
+            "routers": len(routers),
+            "connections": len(connections),
+          }
+
+export_desc = '''
+   There is no input. The format is chosen with the query parameter format, which can be ndjson (default) or csv, i.e. /export/?format=csv
+
+   The output is every router in the network followed by every connection, one on each line, in the same form as the input for /import/.
+   It is sent as it is made, so the whole network is never held in one response.
+
+   **Example output (ndjson):**  
+   {"name": "A"}  
+   {"name": "B"}  
+   {"from": "A", "to": "B", "weight": 7}  
+'''
+
+# get every router and connection in graph
+@app.get("/export/", tags=["Export"], description=export_desc)
+async def export_graph(format: str = "ndjson"):
+   if format not in formats:
+      return {
+               "status": "Error, format must be ndjson or csv"
+             }
+   refresh_graph()
+   media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+   snapshot = graph.snapshot()   # changes made while the response is sent are not in it, so every line is from the same version
+   return StreamingResponse(chunk_lines(export_lines(snapshot, format)), media_type=media_type)
+
+# make a change to graph and add it to the log so it is kept after a restart, returns status for the endpoint
+# with more than one worker the change is sent to the writer process instead, which makes it and adds it to the shared change log
+async def change_graph(change):
+   if writer is not None:
+      return await asyncio.to_thread(writer.send, change)
+   if change["op"] == "import" and change["routers"] == [] and change["connections"] == []:   # nothing to change
+      return "success"
+   status, changed = apply_change(graph, change)
+   if changed and store is not None:
+      store.append(graph, change)
+   return status
+
+# with more than one worker, make changes from the writer's log (the graph is only replaced the first time, or if it fell behind)
+def refresh_graph():
+   if shared is not None:
+      current = shared.current()
+      if current is not graph:
+         use_graph(current)
+
+# answer requests from a different graph, everything worked out from the old graph is made again (also used by benchmark_suite.py)
+def use_graph(current):
+   global graph, route_cache, landmarks, hierarchy, components
+   graph = current
+   route_cache = make_route_cache(graph)
+   landmarks = Landmarks(graph)
+   hierarchy = ContractionHierarchy(graph)
+   components = Components(graph)
+   subscriptions.rebind(graph)
+
+# finish writing the log and any snapshot when server stops
+@app.on_event("shutdown")
+def close_store():
+   if store is not None:
+      store.close()
+   if pool is not None:
+      pool.close()
+   if writer is not None:
+      writer.close()
+   matrix_files.close()
+   if profiler is not None:
+      profiler.stop()
+
+# get total weight and list of connections and weights in path between routers, used by the route cache
+# weights of the connections are given for paths found on the pool, since the graph may have changed since
+def get_route(path, total_weight, weights=None):
+   route = []
+   for i, edge in enumerate(get_path_edges(path)):   # get connections in path
+      weight = weights[i] if weights is not None else graph.weight(edge[0], edge[1])
+      route.append({"from": edge[0], "to": edge[1], "weight": weight})   # add connections and weights to route
+   return total_weight, route
+
 # get connections in path between routers
 def get_path_edges(path):
    path_edges = []
    for i in range(len(path) - 1):
-      path_edges.append(path[i] + path[i + 1])   # split path string up into connections and add to list
+      path_edges.append((path[i], path[i + 1]))   # split path up into connections and add to list
    return path_edges
 
 
 # server will also run in terminal with "python3 main.py"
+# to use more than one worker process run "ROUTING_WORKERS=4 python3 main.py"
 def main():
-   uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
+   if workers > 1:
+      writer_process = multiprocessing.Process(target=run_writer, args=(shared_prefix, data_dir, authkey), daemon=True)
+      writer_process.start()
+      uvicorn.run("main:app", host="127.0.0.1", port=8000, workers=workers)
+   else:
+      uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
 
 if __name__ == '__main__':
    main()
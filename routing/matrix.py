@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from shortest_path import Search
+
+# shortest distance between every pair of routers, for capacity planning instead of asking /route/ for every pair
+# floyd: floyd-warshall with numpy, each of the n steps is one vectorised minimum over the whole n x n matrix, so it is quickest
+# when there are a lot of connections
+# dijkstra: a heap search from every router, quicker when there are few connections, and it can be split over a pool of processes
+# the matrix is written as a .npy file (numpy.load(path, mmap_mode="r") memory maps it instead of reading it all in) together with
+# a .json header listing the router of each row and column, distances are int64 and -1 where there is no path
+
+methods = ["auto", "floyd", "dijkstra"]
+unreachable = -1
+infinity = 2 ** 61   # longer than any path, and two added together still fit in an int64
+
+# floyd takes about n^3 steps and a search from every router about n * 2 * (number of connections) steps, but a floyd step is a
+# few hundred times quicker since numpy does it, so floyd is picked when routers have on average at least this fraction of the
+# other routers as neighbours (timed with graphs from benchmark.py, both took ~11 s for 2000 routers with 3 connections each)
+dense_fraction = 0.003
+
+# get ids of routers in row order and index of each id's row (-1 for removed routers)
+def row_index(graph):
+   nodes = np.fromiter(graph.ids.values(), dtype=np.int64, count=len(graph.ids))
+   nodes.sort()
+   index = np.full(len(graph.names), -1, dtype=np.int64)
+   index[nodes] = np.arange(len(nodes))
+   return nodes, index
+
+# check if floyd-warshall should be quicker than a search from every router split over workers processes
+def dense(graph, workers=1):
+   n = len(graph.ids)
+   return n > 0 and 2 * graph.num_edges >= dense_fraction * workers * n * n
+
+# get floyd or dijkstra for method auto
+def pick_method(graph, method, workers=1):
+   if method not in methods:
+      raise ValueError("method must be auto, floyd or dijkstra")
+   if method == "auto":
+      return "floyd" if dense(graph, workers) else "dijkstra"
+   return method
+
+# work out the distance between every pair of routers into matrix (n x n int64, i.e. a memory mapped .npy file)
+# graph must not change while this runs (use Graph.snapshot), returns method used
+def distance_matrix(graph, matrix, method="auto", workers=1):
+   method = pick_method(graph, method, workers)
+   nodes, index = row_index(graph)
+   if method == "floyd":
+      floyd_warshall(graph, nodes, index, matrix)
+   else:
+      dijkstra_rows(graph, nodes, index, matrix, workers)
+   return method
+
+# floyd-warshall, after step k the matrix has the shortest distances using only the first k routers in between
+def floyd_warshall(graph, nodes, index, matrix):
+   n = len(nodes)
+   if graph.changes != {} or len(graph.indptr) != len(graph.names) + 1:
+      graph.rebuild()   # merge changed edges so the whole graph is in the arrays
+   indptr = np.frombuffer(graph.indptr, dtype=np.int64)
+   rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+   cols = np.frombuffer(graph.indices, dtype=np.int32)
+   alive = (index[rows] >= 0) & (index[cols] >= 0)
+   matrix[:] = infinity
+   matrix[index[rows[alive]], index[cols[alive]]] = np.frombuffer(graph.weights, dtype=np.int64)[alive]
+   np.fill_diagonal(matrix, 0)   # connection from a router to itself is never shorter than staying put
+   block = max(1, min(n, (1 << 22) // max(n, 1)))   # rows updated at once, so the extra memory is a few MB not another n x n matrix
+   through = np.empty((block, n), dtype=np.int64)     # distances through router k
+   for k in range(n):
+      row_k = matrix[k].copy()
+      for start in range(0, n, block):
+         rows = matrix[start:start + block]
+         out = through[:len(rows)]
+         np.add(rows[:, k:k + 1], row_k, out=out)
+         np.minimum(rows, out, out=rows)
+   matrix[matrix >= infinity] = unreachable
+
+# search from every router, on a pool of processes if workers > 1
+def dijkstra_rows(graph, nodes, index, matrix, workers):
+   if workers > 1 and len(nodes) > 1:
+      with ProcessPoolExecutor(workers, initializer=set_graph, initargs=(graph, index, len(nodes))) as executor:
+         for i, row in enumerate(executor.map(distance_row, nodes.tolist(), chunksize=max(1, len(nodes) // (workers * 8)))):
+            matrix[i] = row
+   else:
+      set_graph(graph, index, len(nodes))
+      for i, u in enumerate(nodes.tolist()):
+         matrix[i] = distance_row(u)
+
+worker_graph = (None, None, 0)   # (graph, row index, number of rows) searched by this process
+
+# set graph for distance_row, run once in each process of the pool
+def set_graph(graph, index, n):
+   global worker_graph
+   worker_graph = (graph, index, n)
+
+# distance from router id u to every router in row order
+def distance_row(u):
+   graph, index, n = worker_graph
+   search = Search(graph, u)
+   search.run()
+   row = np.full(n, unreachable, dtype=np.int64)
+   ids = np.fromiter(search.dist.keys(), dtype=np.int64, count=len(search.dist))
+   row[index[ids]] = np.fromiter(search.dist.values(), dtype=np.int64, count=len(search.dist))
+   return row
+
+# write distance matrix of graph to path + ".npy" and its header to path + ".json", returns header
+# the matrix is worked out straight into the memory mapped file, and both files are only replaced once they are complete
+def save_matrix(graph, path, method="auto", workers=1):
+   n = len(graph.ids)
+   matrix = np.lib.format.open_memmap(path + ".npy.tmp", mode="w+", dtype=np.int64, shape=(n, n))
+   method = distance_matrix(graph, matrix, method, workers)
+   matrix.flush()
+   del matrix
+   nodes, index = row_index(graph)
+   header = {
+              "version": graph.version,
+              "method": method,
+              "unreachable": unreachable,
+              "dtype": "int64",
+              "nodes": [graph.names[u] for u in nodes.tolist()],
+            }
+   with open(path + ".json.tmp", "w") as f:
+      json.dump(header, f)
+   os.replace(path + ".npy.tmp", path + ".npy")
+   os.replace(path + ".json.tmp", path + ".json")
+   return header
+
+# get (list of router names, memory mapped matrix) from files written by save_matrix
+def load_matrix(path):
+   with open(path + ".json") as f:
+      header = json.load(f)
+   return header["nodes"], np.load(path + ".npy", mmap_mode="r")
+
+# matrix files written for the server, one for each graph version and method, worked out on a thread the first time it is asked for
+# the newest few are kept so a file that is being sent is not removed straight away
+class MatrixFiles():
+
+   def __init__(self, prefix, workers=1, keep=2):
+      self.prefix = prefix     # start of path of matrix files
+      self.workers = workers   # processes for dijkstra
+      self.keep = keep         # number of matrices kept
+      self.files = {}          # keys = (graph version, method), values = [path, future writing it], oldest first
+
+# get (path without .npy/.json, header) of the distance matrix of graph, writing it if it is not already written
+   async def get(self, graph, method="auto"):
+      method = pick_method(graph, method, self.workers)
+      key = (graph.version, method)
+      if key not in self.files:
+         path = "%s-%d-%s" % (self.prefix, graph.version, method)
+         writing = asyncio.ensure_future(asyncio.to_thread(save_matrix, graph.snapshot(), path, method, self.workers))
+         self.files[key] = [path, writing]
+         writing.add_done_callback(lambda f: self.trim())
+      path, writing = self.files[key]
+      try:
+         header = await asyncio.shield(writing)   # shield so other requests waiting on it still get it
+      except Exception:   # i.e. disk full, try again on the next request
+         if self.files.get(key, [None, None])[1] is writing:
+            self.remove(self.files.pop(key)[0])
+         raise
+      return path, header
+
+# remove oldest finished matrices until only keep are left
+   def trim(self):
+      finished = [key for key, (path, writing) in self.files.items() if writing.done()]
+      for key in finished[:max(0, len(finished) - self.keep)]:
+         self.remove(self.files.pop(key)[0])
+
+# remove files of a matrix
+   def remove(self, path):
+      for end in (".npy", ".json", ".npy.tmp", ".json.tmp"):
+         if os.path.exists(path + end):
+            os.remove(path + end)
+
+# remove every matrix file
+   def close(self):
+      for path, writing in self.files.values():
+         self.remove(path)
+      self.files = {}
+
+# run with "python3 matrix.py <output path> [auto|floyd|dijkstra] [number of processes]", i.e. "python3 matrix.py distances"
+# uses the graph kept on disk in the ROUTING_DATA directory (graph_data by default) and writes distances.npy and distances.json
+def main():
+   from store import GraphStore
+   if len(sys.argv) < 2:
+      print("usage: python3 matrix.py <output path> [auto|floyd|dijkstra] [number of processes]")
+      sys.exit(1)
+   method = sys.argv[2] if len(sys.argv) > 2 else "auto"
+   workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count() or 1
+   data_dir = os.environ.get("ROUTING_DATA", os.path.join(os.path.dirname(os.path.abspath(__file__)), "graph_data"))
+   store = GraphStore(data_dir)
+   graph = store.open()
+   store.close()
+   header = save_matrix(graph, sys.argv[1], method, workers)
+   print("%d routers, %s, written to %s.npy and %s.json" % (len(header["nodes"]), header["method"], sys.argv[1], sys.argv[1]))
+
+if __name__ == '__main__':
+   main()
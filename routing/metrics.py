@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# metrics in the prometheus text format (https://prometheus.io/docs/instrumenting/exposition_formats/), made by hand so
+# prometheus_client is not needed
+# request latency is measured by an asgi middleware, which is only added when metrics are turned on, so with metrics off requests
+# go straight to the app; the other numbers (graph size, cache counters...) are only read when /metrics is asked for
+
+buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)   # upper bounds in seconds
+
+# escape label value for the text format
+def escape(value):
+   return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+# format labels as {name="value",...}, empty string if there are none
+def format_labels(labels):
+   if not labels:
+      return ""
+   return "{" + ",".join('%s="%s"' % (name, escape(value)) for name, value in labels.items()) + "}"
+
+# get lines for one metric, samples = list of (labels dictionary or None, value)
+def metric(name, kind, help, samples):
+   lines = ["# HELP %s %s" % (name, help), "# TYPE %s %s" % (name, kind)]
+   for labels, value in samples:
+      lines.append("%s%s %s" % (name, format_labels(labels), repr(float(value)) if isinstance(value, float) else value))
+   return lines
+
+# histogram with one label, i.e. request latency for each route tag
+class Histogram():
+
+   def __init__(self, name, help, label, buckets=buckets):
+      self.name = name
+      self.help = help
+      self.label = label
+      self.buckets = buckets
+      self.values = {}   # keys = label value, values = [count in each bucket (last one for values over every bound), sum, count]
+
+# add a value (i.e. seconds a request took)
+   def observe(self, label, value):
+      entry = self.values.get(label)
+      if entry is None:
+         entry = self.values[label] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+      entry[0][bisect_left(self.buckets, value)] += 1   # buckets count values less than or equal to their bound
+      entry[1] += value
+      entry[2] += 1
+
+# get lines in the text format, bucket counts are cumulative
+   def lines(self):
+      lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s histogram" % self.name]
+      for label, (counts, total, count) in sorted(self.values.items()):
+         cumulative = 0
+         for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            lines.append('%s_bucket{%s="%s",le="%s"} %d' % (self.name, self.label, escape(label), bound, cumulative))
+         lines.append('%s_bucket{%s="%s",le="+Inf"} %d' % (self.name, self.label, escape(label), count))
+         lines.append('%s_sum{%s="%s"} %r' % (self.name, self.label, escape(label), total))
+         lines.append('%s_count{%s="%s"} %d' % (self.name, self.label, escape(label), count))
+      return lines
+
+# asgi middleware that times every http request and adds it to histogram under the tag of its endpoint
+# the endpoint is only known once fastapi has routed the request, it puts it in the scope which is shared with the middleware
+# responses sent in more than one piece (event streams, exports, streamed routes) can stay open for minutes, so they are added to
+# streams instead and don't hide the latency of ordinary requests
+class LatencyMiddleware():
+
+   def __init__(self, app, histogram, statuses, streams):
+      self.app = app
+      self.histogram = histogram
+      self.statuses = statuses   # Counter with keys = (tag, status code)
+      self.streams = streams     # histogram for streamed responses
+
+   async def __call__(self, scope, receive, send):
+      if scope["type"] != "http":
+         return await self.app(scope, receive, send)
+      start = time.perf_counter()
+      status = [500]       # if the app fails before it starts a response
+      streamed = [False]   # body is sent in more than one piece
+
+      async def send_status(message):
+         if message["type"] == "http.response.start":
+            status[0] = message["status"]
+         elif message["type"] == "http.response.body" and message.get("more_body", False):
+            streamed[0] = True
+         await send(message)
+
+      try:
+         await self.app(scope, receive, send_status)
+      finally:
+         route = scope.get("route")
+         tag = route.tags[0] if getattr(route, "tags", None) else "other"   # other = docs, unknown paths and redirects
+         (self.streams if streamed[0] else self.histogram).observe(tag, time.perf_counter() - start)
+         self.statuses[(tag, status[0])] += 1
+
+# sampling profiler, a thread looks at the stack of every other thread every interval seconds and counts each stack it sees
+# stacks are kept in the collapsed format used by flamegraph.pl and speedscope ("thread;file:function;file:function count")
+# nothing runs until start() is called, so it costs nothing when it is not used
+class Profiler():
+
+   def __init__(self, interval=0.01, max_depth=64):
+      self.interval = interval
+      self.max_depth = max_depth   # deepest frames kept from each stack
+      self.stacks = Counter()
+      self.lock = threading.Lock()   # stacks are read by requests while the thread adds to them
+      self.samples = 0
+      self.thread = None
+      self.running = False
+
+# start sampling on another thread
+   def start(self):
+      if self.thread is None:
+         self.running = True
+         self.thread = threading.Thread(target=self.sample, daemon=True)
+         self.thread.start()
+
+# stop sampling
+   def stop(self):
+      self.running = False
+      if self.thread is not None:
+         self.thread.join()
+         self.thread = None
+
+# take a sample of every thread's stack every interval seconds until stopped
+   def sample(self):
+      me = threading.get_ident()
+      while self.running:
+         names = {thread.ident: thread.name for thread in threading.enumerate()}
+         stacks = []
+         for ident, frame in sys._current_frames().items():
+            if ident == me:
+               continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+               stack.append("%s:%s" % (frame.f_code.co_filename.rsplit("/", 1)[-1], frame.f_code.co_name))
+               frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            stacks.append(";".join(reversed(stack)))
+         with self.lock:
+            self.stacks.update(stacks)
+            self.samples += 1
+         time.sleep(self.interval)
+
+# get counted stacks in the collapsed format, most common first
+   def collapsed(self):
+      with self.lock:
+         stacks = self.stacks.most_common()
+      return "".join("%s %d\n" % (stack, count) for stack, count in stacks)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from shortest_path import Search
+from store import save_snapshot, snapshot_data, load_snapshot
+
+# route searches can run on a pool of threads or processes instead of the event loop, so one big search doesn't hold up other requests
+# thread: searches run on a snapshot of the graph (see Graph.snapshot) and finished searches are added to the route cache,
+# a route is always for the graph version it was asked for on, even if the graph changes before the search is done
+# process: searches run in other processes on a snapshot file written for each graph version, so they don't share the GIL
+# at most max_queue searches can be waiting or running at once, more are turned away straight away instead of queueing,
+# and a search that takes longer than timeout seconds is given up on (the worker stops it so it is free for the next one)
+
+modes = ["thread", "process"]
+
+# too many searches waiting for the pool
+class PoolBusy(Exception):
+   pass
+
+# search took longer than the timeout
+class PoolTimeout(Exception):
+   pass
+
+class RoutePool():
+
+   def __init__(self, mode="thread", workers=None, max_queue=64, timeout=10.0, copy=True, prefix=None):
+      if mode not in modes:
+         raise ValueError("mode must be thread or process")
+      self.mode = mode
+      self.workers = workers or os.cpu_count() or 1
+      self.max_queue = max_queue
+      self.timeout = timeout
+      self.copy = copy              # graph is changed in place, so searches need a snapshot of it (not needed for a graph that is never changed)
+      self.prefix = prefix          # start of path of snapshot files for process mode
+      if mode == "thread":
+         self.executor = ThreadPoolExecutor(self.workers)
+      else:
+         self.executor = ProcessPoolExecutor(self.workers)
+      self.waiting = 0              # searches waiting or running
+      self.snapshot = None          # snapshot of graph for its newest version
+      self.searches = {}            # searches running on threads, keys = (id, version), values = future, so each is only done once
+      self.files = {}               # snapshot files for process mode, keys = graph version, values = [path, number of searches using it, future writing it]
+      self.busy = 0
+      self.timeouts = 0
+
+# get (path, total weight, weights of connections in path) between router ids u and v in graph as it is now, None if there is no path
+# in thread mode the finished search is also added to cache if the graph has not changed since it started
+   async def route(self, graph, cache, u, v):
+      if self.waiting >= self.max_queue:
+         self.busy += 1
+         raise PoolBusy()
+      self.waiting += 1
+      try:
+         if self.mode == "process":
+            version = graph.version
+            path = await self.snapshotFile(graph)
+            try:
+               return await self.wait(asyncio.wrap_future(self.executor.submit(route_in_process, path, u, v, time.time() + self.timeout)))
+            finally:
+               self.release(version)
+         snapshot, search = await self.search(graph, u)   # snapshot of the version the route is for
+         if not cache.add(u, search) and search.graph is not snapshot:
+            # another request added the search to the cache and it has been repaired for a newer version since, so search again
+            search = (await self.wait(asyncio.wrap_future(self.executor.submit(search_snapshot, snapshot, u, time.time() + self.timeout))))[1]
+         return path_result(snapshot, search, v)
+      finally:
+         self.waiting -= 1
+
+# run function(graph, *args) on the pool with a snapshot of graph, for searches other than a single route
+# function must be defined at the top level of a module so it can be sent to another process
+   async def call(self, graph, function, *args):
+      if self.waiting >= self.max_queue:
+         self.busy += 1
+         raise PoolBusy()
+      self.waiting += 1
+      try:
+         if self.mode == "process":
+            version = graph.version
+            path = await self.snapshotFile(graph)
+            try:
+               return await self.wait(asyncio.wrap_future(self.executor.submit(call_in_process, path, function, *args)))
+            finally:
+               self.release(version)
+         return await self.wait(asyncio.wrap_future(self.executor.submit(function, self.current(graph), *args)))
+      finally:
+         self.waiting -= 1
+
+# get snapshot of graph for threads to search, only made again when the graph has changed
+   def current(self, graph):
+      if self.snapshot is None or self.snapshot.version != graph.version:
+         self.snapshot = graph.snapshot() if self.copy else graph
+      return self.snapshot
+
+# get (snapshot, finished search from router id u on it), searching on a thread if no other request is already doing it
+   async def search(self, graph, u):
+      key = (u, graph.version)
+      if key not in self.searches:
+         future = asyncio.wrap_future(self.executor.submit(search_snapshot, self.current(graph), u, time.time() + self.timeout))
+         future.add_done_callback(lambda f: self.searches.pop(key, None))
+         self.searches[key] = future
+      return await self.wait(self.searches[key])
+
+# wait for result of a search, the search also gives up by itself once its deadline has passed
+   async def wait(self, future):
+      try:
+         result = await asyncio.wait_for(asyncio.shield(future), self.timeout)   # shield so other requests waiting on it can still get it
+      except asyncio.TimeoutError:
+         result = TimeoutError
+      if result is TimeoutError:
+         self.timeouts += 1
+         raise PoolTimeout()
+      return result
+
+# get path of snapshot file for the graph version, writing it if this is the first search since the graph changed
+   async def snapshotFile(self, graph):
+      version = graph.version
+      if version not in self.files:
+         path = "%s-%d.snap" % (self.prefix, version)
+         data = snapshot_data(graph)   # arrays are not changed in place, so they can be written out on a thread
+         self.files[version] = [path, 0, asyncio.ensure_future(asyncio.to_thread(save_snapshot, path, data, 0))]
+      path, count, writing = self.files[version]
+      self.files[version][1] += 1   # file is kept until every search using it is done
+      try:
+         await asyncio.shield(writing)
+      except BaseException:
+         self.release(version)
+         raise
+      return path
+
+# stop using the snapshot file for a version, files for old versions are removed once no search is using them
+   def release(self, version):
+      self.files[version][1] -= 1
+      newest = max(self.files)
+      for old in [v for v, (path, count, writing) in self.files.items() if v != newest and count == 0]:
+         path = self.files.pop(old)[0]
+         if os.path.exists(path):
+            os.remove(path)
+
+# counters for /cache/
+   def stats(self):
+      return {
+               "mode": self.mode,
+               "workers": self.workers,
+               "waiting": self.waiting,
+               "busy": self.busy,
+               "timeouts": self.timeouts,
+             }
+
+# stop workers and remove snapshot files
+   def close(self):
+      self.executor.shutdown(wait=False, cancel_futures=True)
+      for path, count, writing in self.files.values():
+         if os.path.exists(path):
+            os.remove(path)
+      self.files = {}
+
+# get (path, total weight, weights of connections in path) from a search that has settled router id v, None if there is no path
+def path_result(graph, search, v):
+   path = search.path(v)
+   if path is None:
+      return None
+   weights = [graph.edgeWeight(path[i], path[i + 1]) for i in range(len(path) - 1)]
+   return [graph.names[n] for n in path], search.dist[v], weights
+
+# search every router reachable from router id u, run on a thread
+def search_snapshot(graph, u, deadline):
+   search = Search(graph, u)
+   if search.run(deadline=deadline) is None:
+      return TimeoutError
+   return graph, search
+
+loaded = (None, None)   # snapshot file loaded in this process and its graph
+
+# get graph from a snapshot file, it is kept loaded until a search needs a newer one
+def load(path):
+   global loaded
+   if loaded[0] != path:
+      loaded = (path, load_snapshot(path)[0])
+   return loaded[1]
+
+# search for route between router ids u and v, run in another process
+def route_in_process(path, u, v, deadline):
+   graph = load(path)
+   search = Search(graph, u)
+   found = search.run(v, deadline)
+   if found is None:
+      return TimeoutError
+   if not found:
+      return None
+   return path_result(graph, search, v)
+
+# run function(graph, *args) on the graph in a snapshot file, run in another process
+def call_in_process(path, function, *args):
+   return function(load(path), *args)
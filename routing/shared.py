@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import glob
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Listener, Client
+from store import GraphStore, apply_change, save_snapshot, snapshot_data, load_snapshot
+from graph import Graph
+
+# with more than one worker process, one writer process owns the graph and makes every change
+# every change is added to a change log file in shared memory (/dev/shm) and counted in a control file, and every publish_every
+# changes (or publish_interval seconds after a change) the writer also writes a snapshot of the graph and starts a new log,
+# so each generation is a snapshot plus the log of changes made since it
+# workers memory map the snapshot, so every worker reads the same pages without copying them, and apply the log on top of it
+# like a change made in the worker, so the route cache, landmarks and the rest are updated instead of worked out again
+# workers send changes to the writer over a unix socket; the writer replies once the change is in the log, so a worker never misses
+# its own change, and changes never wait for a snapshot to be written
+
+control = struct.Struct("<2q")   # generation of newest snapshot (0 until the first one is published), number of changes in its log
+
+# directory for shared files, /dev/shm is kept in memory on linux
+def shared_dir():
+   if os.path.isdir("/dev/shm"):
+      return "/dev/shm"
+   return tempfile.gettempdir()
+
+# path of snapshot file for a generation
+def snapshot_path(prefix, generation):
+   return "%s-%d.snap" % (prefix, generation)
+
+# path of change log file for a generation, one JSON object per line with the graph version after the change
+def log_path(prefix, generation):
+   return "%s-%d.log" % (prefix, generation)
+
+# worker side: gives the graph from the newest published snapshot with the changes in its log
+class SharedGraph():
+
+   def __init__(self, prefix, wait=60):
+      self.prefix = prefix
+      self.wait = wait          # seconds to wait for the writer to publish its first snapshot
+      self.control = None
+      self.generation = None
+      self.graph = None
+      self.log = None           # change log of generation, open for reading
+      self.rest = b""           # end of log that is not a full line yet
+      self.lines = 0            # lines read from log
+
+# get graph with every change published so far, the same graph is changed in place unless the worker fell a whole generation behind
+   def current(self):
+      if self.control is None:
+         self.control = self.openControl()
+      generation, count = control.unpack_from(self.control, 0)
+      if generation != self.generation:
+         self.load(generation)
+      elif count != self.lines:
+         self.follow()
+      return self.graph
+
+# switch to a new generation, the graph takes the snapshot's arrays and changes already made from the old log are made again
+# on them without telling the graph's listeners, since the graph is the same as before apart from where its edges are kept
+   def load(self, generation):
+      while True:
+         try:
+            snapshot = load_snapshot(snapshot_path(self.prefix, generation))[0]
+            log = open(log_path(self.prefix, generation), "rb")
+            break
+         except FileNotFoundError:   # writer already replaced it with a newer one
+            generation = control.unpack_from(self.control, 0)[0]
+      if self.graph is not None:
+         self.follow()   # old log has every change up to when the new generation was published
+         self.log.close()
+      self.generation, self.log, self.rest, self.lines = generation, log, b"", 0
+      if self.graph is None or self.graph.version < snapshot.version:   # first load, or changes were missed
+         self.graph = snapshot
+         self.follow()
+         return
+      made = self.graph.version
+      self.graph.adopt(snapshot)
+      self.follow(made)
+
+# make changes added to the log since it was last read, changes up to version quiet are not told to the graph's listeners
+   def follow(self, quiet=0):
+      data = self.rest + self.log.read()
+      lines = data.split(b"\n")
+      self.rest = lines.pop()   # last line might not be finished yet
+      for line in lines:
+         self.lines += 1
+         change = json.loads(line)
+         if change["version"] <= self.graph.version:   # already made from the old log
+            continue
+         if change["version"] <= quiet:
+            listeners, self.graph.listeners = self.graph.listeners, []
+            try:
+               apply_change(self.graph, change)
+            finally:
+               self.graph.listeners = listeners
+         else:
+            apply_change(self.graph, change)
+
+# memory map control file once writer has published its first snapshot
+   def openControl(self):
+      end = time.time() + self.wait
+      while True:
+         try:
+            with open(self.prefix + ".ctl", "rb") as f:
+               mm = mmap.mmap(f.fileno(), control.size, access=mmap.ACCESS_READ)
+            if control.unpack_from(mm, 0)[0] > 0:
+               return mm
+         except (FileNotFoundError, ValueError):   # not made yet
+            pass
+         if time.time() > end:
+            raise RuntimeError("no graph was published at " + self.prefix)
+         time.sleep(0.05)
+
+# worker side: sends changes to the writer over one connection, made on the first change and again only after an error
+class WriterClient():
+
+   def __init__(self, prefix, authkey):
+      self.address = prefix + ".sock"
+      self.authkey = authkey
+      self.conn = None
+      self.lock = threading.Lock()   # send is called from more than one thread, one change at a time goes over the connection
+
+# send change (same form as for apply_change), returns status
+   def send(self, change):
+      with self.lock:
+         if self.conn is not None:
+            try:
+               self.conn.send(change)
+            except OSError:   # writer closed the connection, change was not sent so it is sent again on a new one
+               self.close()
+         if self.conn is None:
+            self.conn = Client(self.address, "AF_UNIX", authkey=self.authkey)
+            try:
+               self.conn.send(change)
+            except OSError:
+               self.close()
+               raise
+         try:
+            return self.conn.recv()
+         except (OSError, EOFError):   # change might have been made, so it is not sent again, next change connects again
+            self.close()
+            raise
+
+# close connection to the writer
+   def close(self):
+      if self.conn is not None:
+         self.conn.close()
+         self.conn = None
+
+# writer side: owns the graph, makes changes, adds them to the log and publishes snapshots
+class Writer():
+
+   def __init__(self, graph, store, prefix, authkey, publish_every=1000, publish_interval=1.0):
+      self.graph = graph
+      self.store = store            # GraphStore to log changes to, or None
+      self.prefix = prefix
+      self.authkey = authkey
+      self.publish_every = publish_every         # changes before a new snapshot is published
+      self.publish_interval = publish_interval   # seconds after a change before a new snapshot is published
+      self.lock = threading.Condition()
+      self.generation = 0           # newest published generation
+      self.logs = {}                # keys = generation, values = [open log file, number of lines], the newest published one and
+                                    # the one being published (changes go in both while its snapshot is written)
+      self.pending = 0              # changes since the newest snapshot
+      self.first_pending = None     # time of the first of them
+      for path in glob.glob(prefix + "-*.snap") + glob.glob(prefix + "-*.log"):   # left over from an earlier run
+         os.remove(path)
+      tmp_path = prefix + ".ctl.tmp"
+      with open(tmp_path, "wb") as f:   # new control file, so workers from an earlier run can't see it half made
+         f.write(bytes(control.size))
+      os.replace(tmp_path, prefix + ".ctl")
+      with open(prefix + ".ctl", "r+b") as f:
+         self.control = mmap.mmap(f.fileno(), control.size)
+
+# publish first snapshot, then take changes from workers
+   def run(self):
+      self.publish()
+      threading.Thread(target=self.publishLoop, daemon=True).start()
+      address = self.prefix + ".sock"
+      if os.path.exists(address):   # left over from an earlier run
+         os.remove(address)
+      with Listener(address, "AF_UNIX", authkey=self.authkey) as listener:
+         while True:
+            conn = listener.accept()
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+# make changes sent by a worker until it closes the connection, reply to each once it is in the log
+   def handle(self, conn):
+      with conn:
+         while True:
+            try:
+               change = conn.recv()
+            except (EOFError, OSError):   # worker closed connection or exited
+               return
+            status = self.makeChange(change)
+            try:
+               conn.send(status)
+            except OSError:
+               return
+
+# make one change, returns status once it is in the log
+   def makeChange(self, change):
+      with self.lock:
+         status, changed = apply_change(self.graph, change)
+         if changed:
+            if self.store is not None:
+               self.store.append(self.graph, change)
+            line = (json.dumps(dict(change, version=self.graph.version)) + "\n").encode()
+            for entry in self.logs.values():
+               entry[0].write(line)
+               entry[0].flush()
+               entry[1] += 1
+            control.pack_into(self.control, 0, self.generation, self.logs[self.generation][1])
+            self.pending += 1
+            if self.first_pending is None:
+               self.first_pending = time.time()
+            if self.pending == 1 or self.pending == self.publish_every:
+               self.lock.notify_all()   # wake publisher
+      return status
+
+# publish a snapshot once enough changes were made or the first of them is old enough, so snapshots are not written for every change
+   def publishLoop(self):
+      while True:
+         with self.lock:
+            while self.pending < self.publish_every:
+               if self.first_pending is None:
+                  self.lock.wait()
+               else:
+                  wait = self.first_pending + self.publish_interval - time.time()
+                  if wait <= 0:
+                     break
+                  self.lock.wait(wait)
+         self.publish()
+
+# write snapshot of graph to shared memory with a new log and tell workers about it, changes go on being made while it is written
+   def publish(self):
+      with self.lock:
+         snapshot = self.graph.snapshot()   # nothing is copied, so changes are only held up for a moment
+         generation = self.generation + 1
+         self.logs[generation] = [open(log_path(self.prefix, generation), "wb"), 0]
+         self.pending = 0
+         self.first_pending = None
+      save_snapshot(snapshot_path(self.prefix, generation), snapshot_data(snapshot), 0)
+      with self.lock:
+         if self.generation in self.logs:   # workers still reading it have it open, every change until now is in it
+            self.logs.pop(self.generation)[0].close()
+         self.generation = generation
+         control.pack_into(self.control, 0, generation, self.logs[generation][1])
+      for path in (snapshot_path(self.prefix, generation - 2), log_path(self.prefix, generation - 2)):   # workers using them keep them open
+         if os.path.exists(path):
+            os.remove(path)
+
+# start writer, run in its own process, data_dir = directory for GraphStore ("" to not keep graph on disk)
+def run_writer(prefix, data_dir, authkey):
+   store = GraphStore(data_dir) if data_dir != "" else None
+   graph = store.open() if store is not None else Graph()
+   Writer(graph, store, prefix, authkey).run()
@@ -2,55 +2,268 @@
 
 # Ailbhe Byrne
 
+import heapq
+import threading
+import time
+
+# totals across every dijkstra search run in this process, for /metrics
+# settled = routers whose shortest distance was found, relaxed = connections looked at from settled routers
+# searches on pool threads add to them at the same time, so they are only changed with counters_lock held
+counters = {"runs": 0, "settled": 0, "relaxed": 0}
+counters_lock = threading.Lock()
+
 # reference (did not directly copy): https://github.com/mburst/dijkstras-algorithm/blob/master/dijkstras.py
-# get shortest path between routers (nodes in a graph)
-def get_shortest_path(nodes, edges, from_, to):
-   path = {}               # keep track of path to target (to router)
-
-   unvisited = {}          # keep track of unvisited nodes
-   unvisited[from_] = 0    # from router is distance of 0
-
-   total_dist = {}         # keep track of total distance to nodes
-   total_dist[from_] = 0   # from router is distance of 0
-   
-   for n in nodes:
-      if n not in unvisited:
-         total_dist[n] = float("inf")   # set distance to other nodes as infinity
-         unvisited[n] = float("inf")    # set distance to other nodes as infinity
-      path[n] = None                    # set path of all nodes as none
-
-   while unvisited != {}:
-      min_dist_node = min(unvisited.items(), key=sort_on)[0]   # get node in unvisited with shortest distance
-      del unvisited[min_dist_node]                             # remove current node from unvisited
-
-      if min_dist_node == to:     # if current node is target (to)
-         path_str = ""                  # create a string for path to target
-         while min_dist_node != None:   # while not at target (to) in path
-            path_str += min_dist_node   # add previous node to path
-            min_dist_node = path[min_dist_node]   # follow path of previous nodes to get shortest path
-         return path_str[::-1]                    # reverse string to get path from 'from' router to 'to' router
-
-      if total_dist[min_dist_node] == float("inf"):   # if distance to current node is infinity
+# get shortest path between routers (nodes in a graph), returns list of routers in path or None if no path
+def get_shortest_path(graph, from_, to):
+   if not graph.hasNode(from_) or not graph.hasNode(to):
+      return None
+   search = Search(graph, graph.ids[from_])
+   target = graph.ids[to]
+   if search.run(target):      # if target was reached
+      return [graph.names[u] for u in search.path(target)]
+   return None                 # if path does not exist return none
+
+# dijkstra search from one router id, which keeps its state so it can be continued for other targets
+# only routers that have been reached are stored, the queue is a binary heap and old entries in it are skipped when popped
+class Search():
+
+   def __init__(self, graph, from_):
+      self.graph = graph
+      self.from_ = from_
+      self.dist = {from_: 0}      # total distance to routers reached so far
+      self.prev = {from_: None}   # previous router in shortest path to routers reached so far
+      self.settled = set()        # routers whose shortest distance is final
+      self.heap = [(0, from_)]    # queue of (distance, router), can hold old entries for a router
+      self.children = None        # routers whose previous router is each router, only made when search is updated
+
+# settle routers in order of distance until target is settled (or every reachable router if target is None)
+# returns None if deadline (a time.time() value) passes first, the search can still be continued later
+   def run(self, to=None, deadline=None):
+      if to in self.settled:   # already found on an earlier run
+         return True
+      heap, dist, prev, settled = self.heap, self.dist, self.prev, self.settled
+      num_settled, relaxed = len(settled), 0
+      try:
+         while heap:
+            if deadline is not None and len(settled) % 1024 == 0 and time.time() > deadline:   # only check the clock now and then
+               return None
+            d, node = heapq.heappop(heap)   # get router with shortest distance
+            if node in settled:             # old entry for a router that was already settled
+               continue
+            settled.add(node)
+            neighbours = self.graph.neighbours(node)
+            relaxed += len(neighbours)
+            for n, w in neighbours:
+               new_dist = d + w   # get distance to neighbour through current router
+               if n not in settled and (n not in dist or new_dist < dist[n]):   # if this distance is less than total distance to neighbour
+                  dist[n] = new_dist
+                  prev[n] = node
+                  heapq.heappush(heap, (new_dist, n))
+            if node == to:   # stop as soon as target is settled, neighbours were relaxed so search can continue later
+               return True
+         return to is None
+      finally:   # counted once per run so counting costs next to nothing
+         with counters_lock:
+            counters["runs"] += 1
+            counters["settled"] += len(settled) - num_settled
+            counters["relaxed"] += relaxed
+
+# follow previous routers back from target to get path as a list from 'from' router to 'to' router
+   def path(self, to):
+      if to not in self.settled:
+         return None
+      path = []
+      while to is not None:
+         path.append(to)
+         to = self.prev[to]
+      path.reverse()
+      return path
+
+# check if every reachable router has been settled
+   def finished(self):
+      return not self.heap
+
+# repair a finished search after edges changed, instead of searching again (ramalingam-reps)
+# changes = list of (id, id, old weight, new weight), weight None means no edge, graph must already have the changes
+# only routers below a longer or removed edge in the shortest path tree, and routers that get closer, are looked at
+# returns set of routers whose distance or path changed
+   def update(self, changes):
+      dist, prev, settled = self.dist, self.prev, self.settled
+      if self.children is None:
+         self.children = {}
+         for n, p in prev.items():
+            if p is not None:
+               self.children.setdefault(p, set()).add(n)
+      children = self.children
+
+      affected = set()   # routers whose path used an edge that got longer or was removed
+      for u, v, old, new in changes:
+         if old is not None and (new is None or new > old):
+            for a, b in ((u, v), (v, u)):
+               if prev.get(b) == a and b not in affected:   # edge is in the tree, so everything below b is affected
+                  stack = [b]
+                  while stack:
+                     n = stack.pop()
+                     affected.add(n)
+                     stack.extend(children.get(n, ()))
+      for n in affected:   # forget old distances
+         del dist[n]
+         settled.discard(n)
+         children[prev.pop(n)].discard(n)
+
+      heap = []
+      for n in affected:   # start again from the closest router that was not affected
+         best = None
+         for m, w in self.graph.neighbours(n):
+            if m in dist and (best is None or dist[m] + w < best[0]):
+               best = (dist[m] + w, m)
+         if best is not None:
+            self.setPrev(n, best[1], best[0])
+            heapq.heappush(heap, (best[0], n))
+      for u, v, old, new in changes:   # edges that got shorter or were added
+         if new is not None and (old is None or new < old):
+            for a, b in ((u, v), (v, u)):
+               if a in dist and (b not in dist or dist[a] + new < dist[b]):
+                  self.setPrev(b, a, dist[a] + new)
+                  heapq.heappush(heap, (dist[b], b))
+
+      changed = set(affected)
+      while heap:   # dijkstra over routers whose distance can still change
+         d, n = heapq.heappop(heap)
+         if dist.get(n) != d:   # old entry
+            continue
+         changed.add(n)
+         settled.add(n)
+         for m, w in self.graph.neighbours(n):
+            if m not in dist or d + w < dist[m]:
+               self.setPrev(m, n, d + w)
+               heapq.heappush(heap, (d + w, m))
+      return changed
+
+# set distance and previous router of a router, keeping the tree children up to date
+   def setPrev(self, node, prev, dist):
+      old = self.prev.get(node)
+      if old is not None:
+         self.children[old].discard(node)
+      self.prev[node] = prev
+      self.children.setdefault(prev, set()).add(node)
+      self.dist[node] = dist
+
+# bidirectional dijkstra between router ids, searches from both ends at once and stops once the two searches meet
+# returns (path as list of ids, total distance, number of routers settled), path and distance are None if there is no path
+def bidirectional_search(graph, from_, to):
+   if from_ == to:
+      return [from_], 0, 1
+   dist = ({from_: 0}, {to: 0})            # distance from 'from' router and to 'to' router
+   prev = ({from_: None}, {to: None})      # next router towards 'from' router and towards 'to' router
+   settled = (set(), set())
+   heaps = ([(0, from_)], [(0, to)])
+   best, meet = None, None                 # shortest path found so far and router where its two halves meet
+   while heaps[0] and heaps[1]:
+      if best is not None and heaps[0][0][0] + heaps[1][0][0] >= best:   # no shorter path can be found
          break
+      side = 0 if len(heaps[0]) <= len(heaps[1]) else 1                   # grow the smaller search
+      d, node = heapq.heappop(heaps[side])
+      if node in settled[side]:
+         continue
+      settled[side].add(node)
+      this, other = dist[side], dist[1 - side]
+      for n, w in graph.neighbours(node):
+         new_dist = d + w
+         if n not in settled[side] and (n not in this or new_dist < this[n]):
+            this[n] = new_dist
+            prev[side][n] = node
+            heapq.heappush(heaps[side], (new_dist, n))
+            if n in other and (best is None or new_dist + other[n] < best):   # both searches have reached n
+               best, meet = new_dist + other[n], n
+   num_settled = len(settled[0]) + len(settled[1])
+   if best is None:
+      return None, None, num_settled
+   path = []
+   node = meet
+   while node is not None:   # first half back to 'from' router
+      path.append(node)
+      node = prev[0][node]
+   path.reverse()
+   node = prev[1][meet]
+   while node is not None:   # second half on to 'to' router
+      path.append(node)
+      node = prev[1][node]
+   return path, best, num_settled
+
+# dijkstra between router ids that doesn't use any router in banned_nodes or connection in banned_edges (set of (id, id), both ways)
+# bound = dictionary of distance from each router to 'to' router without anything banned, if given the search is a* using it,
+# since avoiding routers and connections can only make paths longer, and routers not in it are skipped as they can't reach 'to'
+# returns (path as list of ids, total distance), (None, None) if there is no path, raises TimeoutError if deadline passes first
+def restricted_search(graph, from_, to, banned_nodes, banned_edges, deadline=None, bound=None):
+   dist = {from_: 0}
+   prev = {from_: None}
+   settled = set()
+   heap = [(0, 0, from_)]   # (distance + bound, distance, router)
+   while heap:
+      if deadline is not None and len(settled) % 1024 == 0 and time.time() > deadline:
+         raise TimeoutError()
+      f, d, node = heapq.heappop(heap)
+      if node in settled:
+         continue
+      settled.add(node)
+      if node == to:
+         path = []
+         while node is not None:
+            path.append(node)
+            node = prev[node]
+         path.reverse()
+         return path, d
+      for n, w in graph.neighbours(node):
+         if n in banned_nodes or (node, n) in banned_edges or (bound is not None and n not in bound):
+            continue
+         if n not in settled and (n not in dist or d + w < dist[n]):
+            dist[n] = d + w
+            prev[n] = node
+            heapq.heappush(heap, (d + w + (bound[n] if bound is not None else 0), d + w, n))
+   return None, None
+
+# up to k shortest paths without loops between router ids, shortest first (yen's algorithm)
+# each next path leaves an earlier one at some router (the spur) and takes the shortest way on from there that doesn't
+# reuse the earlier path's next connection, the graph is never changed, the routers and connections to avoid are skipped instead
+# one search from the 'to' router gives the first path and the distances that guide every spur search straight to the target
+# returns (list of (path as list of ids, total distance, weights of connections in path), whether every path was found before deadline)
+def k_shortest_paths(graph, from_, to, k, deadline=None):
+   def weights(path):
+      return [graph.edgeWeight(path[i], path[i + 1]) for i in range(len(path) - 1)]
 
-      neighbours = get_neighbours(min_dist_node, edges)   # get neighbours of current node
-      for neighbour in neighbours:
-         new_dist = total_dist[min_dist_node] + neighbours[neighbour]   # get distance to neighbour node through current node
-         if new_dist < total_dist[neighbour]:    # if this distance is less than total distance to neighbour
-            total_dist[neighbour] = new_dist     # set new total distance of neighbour
-            path[neighbour] = min_dist_node      # add neighbour to path with current node as previous node
-            unvisited[neighbour] = new_dist      # add neighbour to unvisited with new distance
-   return None   # if path does not exist return none
-
-# return 2nd item in tuple (distance/weight of connection)
-def sort_on(tuple):
-   return tuple[1]
-
-# get neighbours of node i.e. routers with connection to current router in graph
-def get_neighbours(node, edges):
-   neighbours = {}
-   for edge in edges.keys():   # for each connection
-      if node in edge:         # if current router is in connection
-         n = edge.replace(node, "")    # get router current router is connected to (replace current router with "")
-         neighbours[n] = edges[edge]   # add router and distance (weight) to neighbours
-   return neighbours
+   found = []
+   try:
+      reverse = Search(graph, to)
+      if reverse.run(deadline=deadline) is None:
+         raise TimeoutError()
+      if from_ not in reverse.dist:   # no path
+         return found, True
+      path = reverse.path(from_)[::-1]
+      found.append((path, reverse.dist[from_], weights(path)))
+      candidates = []   # heap of (total distance, path, weights) of paths not yet taken
+      seen = {tuple(path)}
+      while len(found) < k:
+         last, last_weights = found[-1][0], found[-1][2]
+         root_dist = 0
+         for i in range(len(last) - 1):   # leave last path at each of its routers in turn
+            root = last[:i + 1]
+            banned_edges = set()
+            for path, d, w in found:
+               if path[:i + 1] == root:   # don't take the same next connection as a path already found with this root
+                  banned_edges.add((path[i], path[i + 1]))
+                  banned_edges.add((path[i + 1], path[i]))
+            spur, spur_dist = restricted_search(graph, last[i], to, set(root[:-1]), banned_edges, deadline, reverse.dist)
+            if spur is not None:
+               path = root[:-1] + spur
+               if tuple(path) not in seen:
+                  seen.add(tuple(path))
+                  heapq.heappush(candidates, (root_dist + spur_dist, path, last_weights[:i] + weights(spur)))
+            root_dist += last_weights[i]
+         if candidates == []:   # no more paths
+            break
+         d, path, w = heapq.heappop(candidates)
+         found.append((path, d, w))
+   except TimeoutError:
+      return found, False
+   return found, True
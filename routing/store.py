@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+from graph import Graph
+
+# the graph is kept on disk as a snapshot plus a log of every change made since the snapshot
+# snapshot: header, then names (JSON list, one for every id), alive flag of each id, indptr, indices and weights arrays,
+# each part starting on an 8 byte boundary so the arrays can be used straight from the memory mapped file without copying
+# log: one JSON object per line with a sequence number, i.e. {"op": "connect", "from": "A", "to": "B", "weight": 7, "seq": 4}
+
+magic = b"RGRAPH01"
+header = struct.Struct("<8s6q")   # magic, log sequence number, graph version, length of names, number of ids, number of edge entries, number of edges
+
+# round up to a multiple of 8
+def align(n):
+   return (n + 7) // 8 * 8
+
+# write graph to a snapshot file, data = result of snapshot_data
+def save_snapshot(path, data, seq):
+   names, alive, indptr, indices, weights, version, num_edges = data
+   names_json = json.dumps(names).encode()
+   tmp_path = path + ".tmp"
+   with open(tmp_path, "wb") as f:
+      f.write(header.pack(magic, seq, version, len(names_json), len(names), len(indices), num_edges))
+      for part in (names_json, alive, indptr, indices, weights):
+         part = memoryview(part).cast("B")   # write arrays without copying them
+         f.write(part)
+         f.write(b"\0" * (align(len(part)) - len(part)))
+      f.flush()
+      os.fsync(f.fileno())
+   os.replace(tmp_path, path)   # snapshot file is only replaced once the new one is complete
+
+# get everything needed for a snapshot, arrays are never changed in place so they can be written out later on another thread
+def snapshot_data(graph):
+   if graph.changes != {} or len(graph.indptr) != len(graph.names) + 1:
+      graph.rebuild()   # merge changed edges and rows for new routers so arrays have the whole graph
+   names = graph.names[:]
+   alive = array("b", bytes(len(names)))
+   for u in graph.ids.values():
+      alive[u] = 1
+   return names, alive, graph.indptr, graph.indices, graph.weights, graph.version, graph.num_edges
+
+# load graph from a snapshot file, the arrays stay in the memory mapped file until the graph next rebuilds them
+def load_snapshot(path):
+   with open(path, "rb") as f:
+      mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+   tag, seq, version, names_len, num_ids, num_entries, num_edges = header.unpack_from(mm, 0)
+   if tag != magic:
+      raise ValueError("%s is not a graph snapshot" % path)
+   view = memoryview(mm)
+   pos = header.size
+   names = json.loads(bytes(view[pos:pos + names_len]))
+   pos += align(names_len)
+   alive = view[pos:pos + num_ids]
+   pos += align(num_ids)
+   parts = []
+   for length, typecode in ((num_ids + 1, "q"), (num_entries, "i"), (num_entries, "q")):
+      size = length * array(typecode).itemsize
+      parts.append(view[pos:pos + size].cast(typecode))
+      pos += align(size)
+
+   graph = Graph()
+   graph.names = names
+   graph.ids = dict(zip(names, range(num_ids)))   # later ids win if a name was removed and added again
+   for u in range(num_ids):
+      if not alive[u] and graph.ids.get(names[u]) == u:
+         del graph.ids[names[u]]
+   graph.indptr, graph.indices, graph.weights = parts
+   graph.version = version
+   graph.num_edges = num_edges
+   return graph, seq
+
+# apply a change to graph, change = {"op": ..., and the JSON fields of the change}, used by the endpoints and to replay the log
+# returns the status for the endpoint and whether graph changed
+def apply_change(graph, change):
+   op = change["op"]
+   if op == "addrouter":
+      if graph.hasNode(change["name"]):   # if router already in graph
+         return "Error, node already exists", False
+      graph.addNode(change["name"])
+      return "success", True
+   elif op == "connect":
+      from_, to, weight = change["from"], change["to"], change["weight"]
+      if not graph.hasNode(from_) or not graph.hasNode(to):   # if from or to routers not in graph
+         return "Error, router does not exist", False
+      elif weight is None:                 # if no weight was given for connection
+         return "Error, weight is required", False
+      status = "updated" if graph.hasEdge(from_, to) else "success"   # update weight if connection already in graph
+      graph.addEdge(from_, to, weight)
+      return status, True
+   elif op == "removerouter":
+      if graph.hasNode(change["name"]):   # if router in graph
+         graph.removeNode(change["name"])
+         return "success", True
+      return "success", False
+   elif op == "removeconnection":
+      if graph.hasEdge(change["from"], change["to"]):   # if connection in graph
+         graph.removeEdge(change["from"], change["to"])
+         return "success", True
+      return "success", False
+   elif op == "import":
+      routers = [name for name in change["routers"] if not graph.hasNode(name)]
+      new_routers = set(routers)
+      for from_, to, weight in change["connections"]:   # check again in case routers were removed since the import was read
+         for name in (from_, to):
+            if not graph.hasNode(name) and name not in new_routers:
+               return "Error, router %s does not exist" % name, False
+      if routers != []:
+         graph.addNodes(routers)
+      if change["connections"] != []:
+         graph.addEdges([tuple(connection) for connection in change["connections"]])
+      return "success", True
+   return "Error, unknown change", False
+
+# keeps the graph in a directory as graph.snap and graph.log
+# when the log gets long it is moved to graph.log.old and a new snapshot is written on another thread, then the old log is deleted
+class GraphStore():
+
+   def __init__(self, directory, compact_every=100000, sync=False):
+      self.directory = directory
+      self.snapshot_path = os.path.join(directory, "graph.snap")
+      self.log_path = os.path.join(directory, "graph.log")
+      self.old_log_path = self.log_path + ".old"
+      self.compact_every = compact_every   # number of logged changes before a new snapshot is made
+      self.sync = sync                     # fsync log after every change (survives power loss, but slower)
+      self.seq = 0                         # sequence number of last logged change
+      self.logged = 0                      # changes logged since last snapshot
+      self.log = None
+      self.compacting = None               # thread writing a snapshot
+
+# load graph from snapshot and replay the log, then open log to add to
+   def open(self):
+      os.makedirs(self.directory, exist_ok=True)
+      if os.path.exists(self.snapshot_path):
+         graph, self.seq = load_snapshot(self.snapshot_path)
+      else:
+         graph = Graph()
+      for path in (self.old_log_path, self.log_path):   # old log is left over if a snapshot was not finished
+         if os.path.exists(path):
+            for change in self.read_log(path):
+               if change["seq"] > self.seq:   # skip changes already in the snapshot
+                  apply_change(graph, change)
+                  self.seq = change["seq"]
+                  self.logged += 1
+      self.log = open(self.log_path, "a")
+      return graph
+
+# get changes in a log file, a last line cut off by the server stopping while writing it is removed from the file,
+# so the next change is not written onto the end of it; other lines that are not JSON are skipped
+   def read_log(self, path):
+      with open(path, "rb+") as f:
+         lines = f.read().split(b"\n")
+         last = lines.pop()   # empty if the file ends with a new line
+         changes = []
+         for line in lines:
+            try:
+               changes.append(json.loads(line))
+            except ValueError:
+               continue
+         if last != b"":
+            try:
+               changes.append(json.loads(last))   # whole change without its new line
+               f.write(b"\n")
+            except ValueError:
+               f.truncate(f.tell() - len(last))
+      return changes
+
+# add change to log
+   def append(self, graph, change):
+      self.seq += 1
+      change = dict(change, seq=self.seq)
+      self.log.write(json.dumps(change) + "\n")
+      self.log.flush()
+      if self.sync:
+         os.fsync(self.log.fileno())
+      self.logged += 1
+      if self.logged >= self.compact_every:
+         self.compact(graph)
+
+# write a new snapshot on another thread and start a new log
+   def compact(self, graph):
+      if self.compacting is not None and self.compacting.is_alive():   # last snapshot still being written
+         return
+      self.log.close()
+      if os.path.exists(self.old_log_path):   # old log from a snapshot that was not finished, keep its changes
+         with open(self.old_log_path, "a") as old, open(self.log_path) as f:
+            old.write(f.read())
+         os.remove(self.log_path)
+      else:
+         os.replace(self.log_path, self.old_log_path)
+      self.log = open(self.log_path, "a")
+      self.logged = 0
+      self.compacting = threading.Thread(target=self.write_snapshot, args=(snapshot_data(graph), self.seq))
+      self.compacting.start()
+
+# write snapshot and delete the old log it replaces
+   def write_snapshot(self, data, seq):
+      save_snapshot(self.snapshot_path, data, seq)
+      os.remove(self.old_log_path)
+
+# finish writing and close log
+   def close(self):
+      if self.compacting is not None:
+         self.compacting.join()
+      if self.log is not None:
+         self.log.close()
+         self.log = None
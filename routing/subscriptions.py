@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import asyncio
+import heapq
+from shortest_path import bidirectional_search
+
+# routes that clients have subscribed to, so they are told when a route changes instead of asking /route/ again and again
+# changes to the graph are collected for window seconds and then looked at together, so a burst of changes gives one push
+# routes that can have changed are found without searching every subscribed route again:
+# - a connection that is removed or gets longer only changes routes that use it, found with an index of connections to routes
+# - a connection that is added or gets shorter (u to v, weight w) only changes a route from s to t with weight d if
+#   dist(s, u) + w + dist(v, t) < d (or the same the other way), so a search from u and v up to the longest subscribed route
+#   finds the from routers close enough to have a shorter route
+# more than max_changes added or shorter connections at once (i.e. an import) just searches every subscribed route again
+
+# one client (websocket or event stream), routes waiting to be sent are kept by pair so only the newest one of each is sent
+class Subscriber():
+
+   def __init__(self):
+      self.pairs = set()           # (from, to) names subscribed to
+      self.pending = {}            # keys = (from, to), values = route waiting to be sent
+      self.ready = asyncio.Event()
+
+# add route to be sent, replacing one for the same pair that was not sent yet
+   def push(self, pair, route):
+      self.pending[pair] = route
+      self.ready.set()
+
+# get routes waiting to be sent, waits for at most timeout seconds (empty list if none came)
+   async def next(self, timeout=None):
+      try:
+         await asyncio.wait_for(self.ready.wait(), timeout)
+      except asyncio.TimeoutError:
+         return []
+      self.ready.clear()
+      routes = list(self.pending.values())
+      self.pending = {}
+      return routes
+
+class Subscriptions():
+
+   def __init__(self, graph, get_route, window=0.2, max_changes=64):
+      self.graph = graph
+      self.get_route = get_route       # function(path, total weight) -> (total weight, list of connections), same as for the route cache
+      self.window = window             # seconds to collect changes for before looking at them
+      self.max_changes = max_changes   # more added or shorter connections than this searches every route again
+      self.routes = {}                 # keys = (from, to) names, values = [weight (-1 if no path), path as list of ids, set of subscribers]
+      self.edges = {}                  # keys = (id, id) of connection (smaller first), values = set of pairs whose route uses it
+      self.sources = {}                # keys = from name, values = set of pairs from it
+      self.same = set()                # pairs from a router to itself, only changed by the router being added or removed
+      self.changes = []                # changes to graph not looked at yet
+      self.timer = None                # call to flush after window
+      self.pushes = 0
+      graph.listeners.append(self.update)
+
+# subscribe client to route between routers, returns the route as it is now (same form as /route/)
+   def subscribe(self, subscriber, from_, to):
+      pair = (from_, to)
+      if pair not in self.routes:
+         self.routes[pair] = [-1, None, set()]
+         self.sources.setdefault(from_, set()).add(pair)
+         if from_ == to:
+            self.same.add(pair)
+         self.setRoute(pair, *self.search(pair))
+      self.routes[pair][2].add(subscriber)
+      subscriber.pairs.add(pair)
+      return self.message(pair)
+
+# stop sending changes to a route to client, the route is forgotten once nobody is subscribed to it
+   def unsubscribe(self, subscriber, from_, to):
+      pair = (from_, to)
+      subscriber.pairs.discard(pair)
+      subscriber.pending.pop(pair, None)
+      if pair in self.routes:
+         self.routes[pair][2].discard(subscriber)
+         if not self.routes[pair][2]:
+            self.setRoute(pair, -1, None)   # take it out of the index
+            del self.routes[pair]
+            self.sources[from_].discard(pair)
+            self.same.discard(pair)
+            if not self.sources[from_]:
+               del self.sources[from_]
+
+# unsubscribe client from every route, when it disconnects
+   def close(self, subscriber):
+      for from_, to in list(subscriber.pairs):
+         self.unsubscribe(subscriber, from_, to)
+
+# called by graph after every change, changes are looked at together once window seconds have passed
+   def update(self, changes):
+      if not self.routes:
+         return
+      self.changes.append(changes)
+      if self.timer is None:
+         try:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+         except RuntimeError:   # not changed on the event loop, i.e. from a script
+            self.flush()
+
+# look at changes collected since the last flush and push routes that changed
+   def flush(self):
+      batches, self.changes = self.changes, []
+      self.timer = None
+      affected = set()
+      shorter = []
+      for changes in batches:
+         if changes == [] or any(new is None for u, v, old, new in changes):   # router can have been added or removed
+            affected |= self.same
+         for u, v, old, new in changes:
+            if old is not None and (new is None or new > old):   # removed or longer, only routes using it change
+               affected |= self.edges.get((min(u, v), max(u, v)), set())
+            if new is not None and (old is None or new < old):   # added or shorter, any route near it can get shorter
+               shorter.append((u, v, new))
+      if len(shorter) > self.max_changes:
+         affected = set(self.routes)
+      elif shorter != []:
+         longest = 0   # routes can only get shorter through connections closer than this to both routers
+         for (from_, to), (weight, path, subscribers) in self.routes.items():
+            if weight < 0 and self.graph.hasNode(from_) and self.graph.hasNode(to):   # can be joined, so search the whole part
+               longest = None
+               break
+            longest = max(longest, weight)
+         for u, v, w in shorter:
+            affected |= self.shortenedBy(u, v, w, longest)
+      for pair in affected:
+         self.refresh(pair)
+
+# search route of a pair again and push it to its subscribers if it changed
+   def refresh(self, pair):
+      weight, path = self.search(pair)
+      if weight == self.routes[pair][0] and self.pathWeight(self.routes[pair][1]) == weight:   # old path is still a shortest path
+         return
+      if (weight, path) != tuple(self.routes[pair][:2]):
+         self.setRoute(pair, weight, path)
+         message = self.message(pair)
+         for subscriber in self.routes[pair][2]:
+            subscriber.push(pair, message)
+            self.pushes += 1
+
+# get subscribed pairs whose route can be shorter through connection u to v with weight w, longest = weight of longest route
+# (None if there is a route with no path that the connection could join)
+   def shortenedBy(self, u, v, w, longest):
+      if longest is not None and w >= longest:
+         return set()
+      limit = None if longest is None else longest - w
+      dist_u, dist_v = self.distances(u, limit), self.distances(v, limit)
+      found = set()
+      for dist_a, dist_b in ((dist_u, dist_v), (dist_v, dist_u)):   # s ... u - v ... t and s ... v - u ... t
+         for s, d_s in dist_a.items():
+            for pair in self.sources.get(self.graph.names[s], ()):
+               t = self.graph.ids.get(pair[1])
+               weight = self.routes[pair][0]
+               if self.graph.ids.get(pair[0]) == s and t in dist_b and (weight < 0 or d_s + w + dist_b[t] < weight):
+                  found.add(pair)
+      return found
+
+# distance from router id u to routers up to limit away (every reachable router if limit is None)
+   def distances(self, u, limit):
+      dist = {u: 0}
+      heap = [(0, u)]
+      settled = set()
+      while heap:
+         d, node = heapq.heappop(heap)
+         if node in settled:
+            continue
+         settled.add(node)
+         for n, w in self.graph.neighbours(node):
+            new_dist = d + w
+            if (limit is None or new_dist <= limit) and n not in settled and (n not in dist or new_dist < dist[n]):
+               dist[n] = new_dist
+               heapq.heappush(heap, (new_dist, n))
+      return dist
+
+# get (weight, path as list of ids) between a pair of routers, (-1, None) if there is no path
+   def search(self, pair):
+      from_, to = pair
+      if not self.graph.hasNode(from_) or not self.graph.hasNode(to):
+         return -1, None
+      if from_ == to:
+         return 0, [self.graph.ids[from_]]
+      path, weight, settled = bidirectional_search(self.graph, self.graph.ids[from_], self.graph.ids[to])
+      if path is None:
+         return -1, None
+      return weight, path
+
+# change route of a pair and move it in the index of connections to routes
+   def setRoute(self, pair, weight, path):
+      route = self.routes[pair]
+      for key in self.pathEdges(route[1]):
+         self.edges[key].discard(pair)
+         if not self.edges[key]:
+            del self.edges[key]
+      route[0], route[1] = weight, path
+      for key in self.pathEdges(path):
+         self.edges.setdefault(key, set()).add(pair)
+
+# get total weight of path as it is now, None if a connection in it was removed
+   def pathWeight(self, path):
+      if path is None:
+         return -1
+      total = 0
+      for i in range(len(path) - 1):
+         weight = self.graph.edgeWeight(path[i], path[i + 1])
+         if weight is None:
+            return None
+         total += weight
+      if not self.graph.hasNodeId(path[0]):
+         return None
+      return total
+
+# get (id, id) of connections in path, smaller id first
+   def pathEdges(self, path):
+      if path is None:
+         return []
+      return [(min(path[i], path[i + 1]), max(path[i], path[i + 1])) for i in range(len(path) - 1)]
+
+# get route of a pair in the same form as the output of /route/
+   def message(self, pair):
+      weight, path, subscribers = self.routes[pair]
+      if path is None:
+         route = []
+      elif len(path) == 1:
+         route = [self.graph.names[path[0]]]
+      else:
+         weight, route = self.get_route([self.graph.names[n] for n in path], weight)
+      return {
+               "from": pair[0],
+               "to": pair[1],
+               "weight": weight,
+               "route": route,
+             }
+
+# use a different graph (i.e. a newer snapshot from the writer process), its changes are not known so every route is searched again
+# router ids are the same in every snapshot, so the index of connections to routes is still right for routes that did not change
+   def rebind(self, graph):
+      self.graph.listeners.remove(self.update)
+      self.graph = graph
+      graph.listeners.append(self.update)
+      if self.timer is not None:
+         self.timer.cancel()
+         self.timer = None
+      self.changes = []
+      for pair in list(self.routes):
+         self.refresh(pair)
+
+# counters for /cache/
+   def stats(self):
+      return {
+               "routes": len(self.routes),
+               "subscribers": len({s for weight, path, subscribers in self.routes.values() for s in subscribers}),
+               "pushes": self.pushes,
+             }
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# export from bulk.py read back with read_records gives the same routers and connections, run with "python3 -m pytest" in this directory
+
+import asyncio
+from graph import Graph
+from bulk import read_records, export_lines, chunk_lines
+
+names = ["A", "B,C", 'say "hi"', "two\nlines", "blank\n\nline", "ends\n", "\rreturn\r\n", " spaces ", ""]
+
+def make_graph():
+   graph = Graph()
+   graph.addNodes(names)
+   graph.addEdges([(names[i], names[i + 1], i + 1) for i in range(len(names) - 1)])
+   return graph
+
+# read export of graph back, split into chunks of size bytes so rows are cut in different places
+def read_back(graph, format, size):
+   async def chunks():
+      async for chunk in chunk_lines(export_lines(graph, format), 1):
+         data = chunk.encode()
+         for i in range(0, len(data), size):
+            yield data[i:i + size]
+   return asyncio.run(read_records(chunks(), format, Graph()))
+
+def test_export_then_import_is_the_same():
+   graph = make_graph()
+   for format in ["csv", "ndjson"]:
+      for size in [1, 3, 1000]:
+         routers, connections, errors = read_back(graph, format, size)
+         assert errors == []
+         assert routers == names
+         assert connections == [tuple(edge) for edge in graph.edges()]
+
+def test_line_numbers_count_lines_in_quoted_names():
+   async def chunks():
+      yield b'router,"two\nlines"\nrouter,A\nconnection,A,B,1\nrouter,"never closed\nrouter,B\n'
+   routers, connections, errors = asyncio.run(read_records(chunks(), "csv", Graph()))
+   assert routers == ["two\nlines", "A"]
+   assert errors == ["line 4: router B does not exist", "line 5: unexpected end of data"]
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# route cache checked against searching again, run with "python3 -m pytest" in this directory
+
+import random
+from graph import Graph
+from cache import RouteCache
+from shortest_path import get_shortest_path
+
+# route as stored in the cache, (path, total weight)
+def make_route(path, total_weight):
+   return path, total_weight
+
+def test_search_is_only_finished_after_full_after_targets():
+   graph = Graph()
+   graph.addNodes([str(i) for i in range(10)])
+   graph.addEdges([(str(i), str(i + 1), 1) for i in range(9)])
+   cache = RouteCache(graph, make_route, full_after=3)
+   assert cache.route("0", "1") == (["0", "1"], 1)
+   search, results = cache.search(0)
+   assert not search.finished()   # stopped at the target
+   cache.route("0", "2")
+   assert not search.finished()
+   cache.route("0", "3")
+   assert search.finished()
+
+def test_repaired_routes_match_fresh_search():
+   rand = random.Random(4)
+   names = [str(i) for i in range(25)]
+   graph = Graph()
+   graph.addNodes(names)
+   graph.addEdges([(rand.choice(names), rand.choice(names), rand.randint(1, 9)) for _ in range(60)])
+   cache = RouteCache(graph, make_route, full_after=2)
+   for _ in range(200):
+      a, b = rand.sample(names, 2)
+      if rand.random() < 0.3:
+         graph.addEdge(a, b, rand.randint(1, 9))
+      elif rand.random() < 0.3:
+         graph.removeEdge(a, b)
+      found = cache.route(a, b)
+      path = get_shortest_path(graph, a, b)
+      if path is None:
+         assert found is None
+      else:
+         assert found[1] == sum(graph.weight(path[i], path[i + 1]) for i in range(len(path) - 1))
+   assert cache.repairs > 0
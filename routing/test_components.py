@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# parts of the network from Components checked against a breadth first search, run with "python3 -m pytest" in this directory
+
+import random
+from collections import deque
+from graph import Graph
+from components import Components
+
+# set of router ids reachable from router id u
+def reachable(graph, u):
+   seen = {u}
+   queue = deque([u])
+   while queue:
+      node = queue.popleft()
+      for n, w in graph.neighbours(node):
+         if n not in seen:
+            seen.add(n)
+            queue.append(n)
+   return seen
+
+# routers in different sets must not be connected, and once the parts are exact routers in the same set must be connected
+def check_components(graph, components):
+   for u in graph.ids.values():
+      reach = reachable(graph, u)
+      for v in graph.ids.values():
+         if components.disconnected(u, v):
+            assert v not in reach
+         elif components.exact:
+            assert v in reach
+
+def test_components_match_bfs():
+   rand = random.Random(12)
+   names = [str(i) for i in range(40)]
+   graph = Graph()
+   graph.addNodes(names)
+   components = Components(graph)
+   components.building.join()
+   for _ in range(60):
+      a, b = rand.sample(sorted(graph.ids), 2)
+      kind = rand.random()
+      if kind < 0.6:
+         graph.addEdge(a, b, 1)   # joins sets straight away
+      elif kind < 0.8:
+         graph.removeEdge(a, b)   # can split a part, worked out again on a thread
+      elif kind < 0.9:
+         graph.removeNode(a)
+      else:
+         graph.addNode("new%d" % len(graph.names))
+      check_components(graph, components)
+      if components.building is not None:
+         components.building.join()   # parts are exact again once the thread has finished
+         check_components(graph, components)
+         assert components.exact
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# graph.py checked against a plain dictionary of neighbours, including snapshots and rebuilding the arrays
+# run with "python3 -m pytest" in this directory
+
+import random
+from graph import Graph
+from store import save_snapshot, snapshot_data, load_snapshot
+
+# neighbours of every router by name, as a dictionary of neighbour name and weight
+def graph_model(graph):
+   return {name: {graph.names[v]: w for v, w in graph.neighbours(u)} for name, u in graph.ids.items()}
+
+# check graph has exactly the routers and connections in model
+def check_graph(graph, model):
+   assert graph_model(graph) == model
+   assert graph.num_edges == sum(len(row) for row in model.values()) // 2
+   for name, row in model.items():
+      for n, w in row.items():
+         assert graph.weight(name, n) == w
+
+# make one random change to both graph and model
+def random_change(rand, graph, model, count):
+   names = sorted(model)
+   kind = rand.random()
+   if kind < 0.05 or len(names) < 2:
+      name = "r%d" % count
+      graph.addNode(name)
+      model[name] = {}
+   elif kind < 0.1:
+      name = rand.choice(names)
+      graph.removeNode(name)
+      for n in model.pop(name):
+         del model[n][name]
+   elif kind < 0.15:
+      edges = [tuple(rand.sample(names, 2)) + (rand.randint(1, 20),) for _ in range(5)]
+      graph.addEdges(edges)
+      for a, b, w in edges:
+         model[a][b] = model[b][a] = w
+   elif kind < 0.6:
+      a, b = rand.sample(names, 2)
+      w = rand.randint(1, 20)
+      graph.addEdge(a, b, w)
+      model[a][b] = model[b][a] = w
+   else:
+      a, b = rand.sample(names, 2)
+      graph.removeEdge(a, b)
+      model[a].pop(b, None)
+      model[b].pop(a, None)
+
+def copy_model(model):
+   return {name: dict(row) for name, row in model.items()}
+
+def test_snapshots_are_not_changed():
+   rand = random.Random(6)
+   graph = Graph()
+   graph.addNodes([str(i) for i in range(30)])
+   model = {str(i): {} for i in range(30)}
+   snapshots = []
+   for count in range(2000):
+      random_change(rand, graph, model, count)
+      if rand.random() < 0.05:
+         snapshots.append((graph.snapshot(), copy_model(model)))
+   check_graph(graph, model)
+   assert snapshots
+   for snapshot, snapshot_model in snapshots:
+      check_graph(snapshot, snapshot_model)
+
+# enough changes to rebuild the arrays a few times, with the arrays checked before and after each rebuild
+def test_rebuild_matches_model():
+   rand = random.Random(7)
+   graph = Graph()
+   graph.addNodes([str(i) for i in range(300)])
+   model = {str(i): {} for i in range(300)}
+   rebuilds = 0
+   snapshots = []
+   for count in range(20000):
+      arrays = graph.indices
+      random_change(rand, graph, model, count)
+      if graph.indices is not arrays:
+         rebuilds += 1
+         assert graph.changes == {}
+         check_graph(graph, model)
+         snapshots.append((graph.snapshot(), copy_model(model)))
+      elif count % 1000 == 0:
+         check_graph(graph, model)
+   assert rebuilds >= 2
+   check_graph(graph, model)
+   for snapshot, snapshot_model in snapshots:
+      check_graph(snapshot, snapshot_model)
+
+# a graph that adopts a snapshot loaded from a file can keep changing without changing the loaded snapshot
+def test_adopt_snapshot_file(tmp_path):
+   rand = random.Random(8)
+   graph = Graph()
+   graph.addNodes([str(i) for i in range(50)])
+   model = {str(i): {} for i in range(50)}
+   for count in range(500):
+      random_change(rand, graph, model, count)
+   path = str(tmp_path / "graph.snap")
+   save_snapshot(path, snapshot_data(graph), 0)
+   loaded = load_snapshot(path)[0]
+   check_graph(loaded, model)
+
+   other = Graph()
+   changes = []
+   other.listeners.append(changes.append)
+   other.adopt(loaded)
+   assert other.listeners and other.version == graph.version
+   check_graph(other, model)
+   loaded_model = copy_model(model)
+   for count in range(500, 6000):
+      random_change(rand, other, model, count)
+   assert changes
+   check_graph(other, model)
+   check_graph(loaded, loaded_model)
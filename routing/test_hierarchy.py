@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# contraction hierarchy searches checked against a plain dijkstra, run with "python3 -m pytest" in this directory
+
+import heapq
+import random
+from graph import Graph
+from hierarchy import ContractionHierarchy
+
+# distance from router id u to every router id it can reach
+def reference_dist(graph, u):
+   dist = {u: 0}
+   heap = [(0, u)]
+   while heap:
+      d, node = heapq.heappop(heap)
+      if d > dist[node]:
+         continue
+      for n, w in graph.neighbours(node):
+         if n not in dist or d + w < dist[n]:
+            dist[n] = d + w
+            heapq.heappush(heap, (d + w, n))
+   return dist
+
+# make a random network, routers are named by their id
+def random_graph(rand, n, m):
+   names = [str(i) for i in range(n)]
+   graph = Graph()
+   graph.addNodes(names)
+   graph.addEdges([(rand.choice(names), rand.choice(names), rand.randint(1, 30)) for _ in range(m)])
+   return graph
+
+# build hierarchy and check every pair of routers, unpacked paths must only use connections in the graph
+def check_hierarchy(graph, hierarchy):
+   while not hierarchy.ready():
+      hierarchy.building.join()
+   for u in graph.ids.values():
+      dist = reference_dist(graph, u)
+      for v in graph.ids.values():
+         path, total, settled = hierarchy.search(u, v)
+         if v not in dist:
+            assert path is None and total is None
+            continue
+         assert total == dist[v]
+         assert path[0] == u and path[-1] == v
+         weights = [graph.edgeWeight(path[i], path[i + 1]) for i in range(len(path) - 1)]
+         assert None not in weights   # every shortcut was unpacked
+         assert sum(weights) == total
+
+def test_hierarchy_matches_reference():
+   rand = random.Random(8)
+   for _ in range(10):
+      graph = random_graph(rand, 40, 60)
+      check_hierarchy(graph, ContractionHierarchy(graph))
+
+# with a low core degree many routers are left in the core and searched like bidirectional dijkstra
+def test_hierarchy_with_core():
+   rand = random.Random(9)
+   for _ in range(5):
+      graph = random_graph(rand, 40, 160)
+      check_hierarchy(graph, ContractionHierarchy(graph, witness_limit=5, core_degree=3))
+
+# hierarchy is built again for the new version after the graph changes
+def test_hierarchy_after_changes():
+   rand = random.Random(10)
+   graph = random_graph(rand, 30, 50)
+   hierarchy = ContractionHierarchy(graph)
+   check_hierarchy(graph, hierarchy)
+   for _ in range(5):
+      a, b = rand.sample(sorted(graph.ids), 2)
+      graph.addEdge(a, b, rand.randint(1, 5))
+      graph.removeEdge(*rand.sample(sorted(graph.ids), 2))
+      check_hierarchy(graph, hierarchy)
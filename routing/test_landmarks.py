@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# alt searches checked against a plain dijkstra, run with "python3 -m pytest" in this directory
+
+import heapq
+import random
+from graph import Graph
+from landmarks import Landmarks
+
+# distance from router id u to every router id it can reach
+def reference_dist(graph, u):
+   dist = {u: 0}
+   heap = [(0, u)]
+   while heap:
+      d, node = heapq.heappop(heap)
+      if d > dist[node]:
+         continue
+      for n, w in graph.neighbours(node):
+         if n not in dist or d + w < dist[n]:
+            dist[n] = d + w
+            heapq.heappush(heap, (d + w, n))
+   return dist
+
+# wait for landmark tables to be worked out on their thread
+def wait_ready(landmarks):
+   while not landmarks.ready():
+      landmarks.building.join()
+
+# check every pair of routers in a sample against the reference
+def check_pairs(graph, landmarks, rand):
+   for _ in range(30):
+      u, v = rand.randrange(len(graph.names)), rand.randrange(len(graph.names))
+      if not graph.hasNodeId(u) or not graph.hasNodeId(v):
+         continue
+      dist = reference_dist(graph, u)
+      path, total, settled = landmarks.search(u, v)
+      if v not in dist:
+         assert path is None and total is None
+         continue
+      assert total == dist[v]
+      assert path[0] == u and path[-1] == v
+      assert sum(graph.edgeWeight(path[i], path[i + 1]) for i in range(len(path) - 1)) == total
+
+def test_alt_matches_reference():
+   rand = random.Random(6)
+   for _ in range(10):
+      names = [str(i) for i in range(60)]
+      graph = Graph()
+      graph.addNodes(names)
+      graph.addEdges([(rand.choice(names), rand.choice(names), rand.randint(1, 30)) for _ in range(90)])   # can be in several parts
+      landmarks = Landmarks(graph, count=4)
+      wait_ready(landmarks)
+      check_pairs(graph, landmarks, rand)
+
+# longer or removed connections keep the tables as bounds, new or shorter ones mean they are worked out again
+def test_alt_after_changes():
+   rand = random.Random(7)
+   names = [str(i) for i in range(50)]
+   graph = Graph()
+   graph.addNodes(names)
+   graph.addEdges([(names[i - 1], names[i], rand.randint(1, 30)) for i in range(1, 50)])
+   graph.addEdges([(rand.choice(names), rand.choice(names), rand.randint(1, 30)) for _ in range(50)])
+   landmarks = Landmarks(graph, count=4)
+   wait_ready(landmarks)
+   for _ in range(20):
+      a, b = rand.sample(names, 2)
+      if graph.hasEdge(a, b):
+         if rand.random() < 0.5:
+            graph.removeEdge(a, b)
+         else:
+            graph.addEdge(a, b, graph.weight(a, b) + rand.randint(1, 10))
+         assert landmarks.ready()
+      else:
+         graph.addEdge(a, b, rand.randint(1, 30))
+         assert not landmarks.ready()
+         wait_ready(landmarks)
+      check_pairs(graph, landmarks, rand)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# route pool checked for turning searches away, giving up on slow searches and giving the same routes on threads and processes
+# run with "python3 -m pytest" in this directory
+
+import asyncio
+import os
+import random
+from graph import Graph
+from cache import RouteCache
+from pool import RoutePool, PoolBusy, PoolTimeout
+from shortest_path import get_shortest_path
+
+def make_route(path, total_weight):
+   return path, total_weight
+
+# chain of n routers named by their number with extra random connections
+def make_graph(rand, n, extra):
+   graph = Graph()
+   graph.addNodes([str(i) for i in range(n)])
+   graph.addEdges([(str(i), str(i + 1), rand.randint(1, 20)) for i in range(n - 1)])
+   graph.addEdges([(str(rand.randrange(n)), str(rand.randrange(n)), rand.randint(1, 20)) for _ in range(extra)])
+   return graph
+
+# path of names is a real path in graph with the given weights and total
+def check_route(graph, found, u, v):
+   path, total, weights = found
+   assert path[0] == graph.names[u] and path[-1] == graph.names[v]
+   assert weights == [graph.weight(path[i], path[i + 1]) for i in range(len(path) - 1)]
+   assert sum(weights) == total
+
+def test_full_queue_is_turned_away():
+   graph = make_graph(random.Random(1), 2000, 2000)
+   pool = RoutePool("thread", workers=1, max_queue=1)
+   cache = RouteCache(graph, make_route)
+   async def run():
+      first = asyncio.ensure_future(pool.route(graph, cache, 0, 1999))
+      await asyncio.sleep(0)   # first search is now waiting on the pool
+      try:
+         await pool.route(graph, cache, 1, 1999)
+         assert False, "second search should be turned away"
+      except PoolBusy:
+         pass
+      return await first
+   try:
+      check_route(graph, asyncio.run(run()), 0, 1999)
+      assert pool.busy == 1 and pool.waiting == 0
+   finally:
+      pool.close()
+
+def test_slow_search_times_out():
+   graph = make_graph(random.Random(2), 20000, 20000)
+   pool = RoutePool("thread", workers=1, timeout=0.000001)
+   cache = RouteCache(graph, make_route)
+   try:
+      for _ in range(2):
+         try:
+            asyncio.run(pool.route(graph, cache, 0, 19999))
+            assert False, "search should time out"
+         except PoolTimeout:
+            pass
+      assert pool.timeouts == 2 and pool.waiting == 0
+   finally:
+      pool.close()
+
+# both modes give a shortest route for the graph version it was asked for on, including after the graph changes
+def test_process_mode_matches_thread_mode(tmp_path):
+   rand = random.Random(3)
+   graph = make_graph(rand, 300, 300)
+   threads = RoutePool("thread", workers=2)
+   processes = RoutePool("process", workers=2, prefix=str(tmp_path / "pool"))
+   cache = RouteCache(graph, make_route)
+   try:
+      for _ in range(5):
+         for _ in range(10):
+            u, v = rand.sample(range(300), 2)
+            on_thread = asyncio.run(threads.route(graph, cache, u, v))
+            on_process = asyncio.run(processes.route(graph, cache, u, v))
+            path = get_shortest_path(graph, str(u), str(v))
+            total = sum(graph.weight(path[i], path[i + 1]) for i in range(len(path) - 1))
+            check_route(graph, on_thread, u, v)
+            check_route(graph, on_process, u, v)
+            assert on_thread[1] == on_process[1] == total
+         a, b = rand.sample(range(300), 2)
+         graph.addEdge(str(a), str(b), 1)
+      assert len(os.listdir(tmp_path)) == 1   # only the snapshot file for the newest version is kept
+   finally:
+      threads.close()
+      processes.close()
+   assert os.listdir(tmp_path) == []
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# changes sent to the writer by WriterClient, checked in the writer's graph and in a worker's SharedGraph
+# run with "python3 -m pytest" in this directory
+
+import os
+import socket
+import threading
+import time
+from graph import Graph
+from shared import SharedGraph, Writer, WriterClient
+
+# start a writer on a thread, returns it and the list of connections it accepted
+def start_writer(prefix):
+   writer = Writer(Graph(), None, prefix, b"key")
+   conns = []   # (connection, set when writer is finished with it)
+   handle = writer.handle
+   def count(conn):
+      done = threading.Event()
+      conns.append((conn, done))
+      handle(conn)
+      done.set()
+   writer.handle = count
+   threading.Thread(target=writer.run, daemon=True).start()
+   SharedGraph(prefix, wait=10).current()   # wait for first snapshot
+   while not os.path.exists(prefix + ".sock"):
+      time.sleep(0.01)
+   return writer, conns
+
+def test_changes_share_one_connection(tmp_path):
+   prefix = str(tmp_path / "graph")
+   writer, conns = start_writer(prefix)
+   client = WriterClient(prefix, b"key")
+   assert client.send({"op": "addrouter", "name": "A"}) == "success"
+   assert client.send({"op": "addrouter", "name": "B"}) == "success"
+   assert client.send({"op": "addrouter", "name": "A"}) == "Error, node already exists"
+   assert client.send({"op": "connect", "from": "A", "to": "B", "weight": 3}) == "success"
+   assert len(conns) == 1
+   assert writer.graph.weight("A", "B") == 3
+   assert SharedGraph(prefix).current().weight("A", "B") == 3
+   client.close()
+
+# a connection the writer closed is replaced, and the change is only made once
+def test_reconnect_after_writer_closes_connection(tmp_path):
+   prefix = str(tmp_path / "graph")
+   writer, conns = start_writer(prefix)
+   client = WriterClient(prefix, b"key")
+   assert client.send({"op": "addrouter", "name": "A"}) == "success"
+   conn, done = conns[0]
+   with socket.socket(fileno=os.dup(conn.fileno())) as sock:
+      sock.shutdown(socket.SHUT_RDWR)   # writer sees the connection closed and closes it
+   done.wait(10)
+   assert client.send({"op": "addrouter", "name": "B"}) == "success"
+   assert len(conns) == 2
+   assert sorted(writer.graph.ids) == ["A", "B"]
+   client.close()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# searches in shortest_path.py checked against a plain dijkstra over a dictionary of neighbours, on small random networks
+# run with "python3 -m pytest" in this directory
+
+import heapq
+import random
+from graph import Graph
+from shortest_path import Search, bidirectional_search, k_shortest_paths
+
+# make a random network of n routers named by their number, with about extra connections more than a spanning chain
+def random_graph(rand, n, extra):
+   graph = Graph()
+   for i in range(n):
+      graph.addNode(str(i))
+   for i in range(1, n):
+      if rand.random() < 0.8:   # leave some routers unreachable
+         graph.addEdge(str(rand.randrange(i)), str(i), rand.randint(1, 20))
+   for _ in range(extra):
+      a, b = rand.sample(range(n), 2)
+      graph.addEdge(str(a), str(b), rand.randint(1, 20))
+   return graph
+
+# distance from router id u to every router id it can reach, worked out from the edges of the graph
+def reference_dist(graph, u):
+   neighbours = {}
+   for from_, to, weight in graph.edges():
+      a, b = graph.ids[from_], graph.ids[to]
+      neighbours.setdefault(a, []).append((b, weight))
+      neighbours.setdefault(b, []).append((a, weight))
+   dist = {u: 0}
+   heap = [(0, u)]
+   while heap:
+      d, node = heapq.heappop(heap)
+      if d > dist[node]:
+         continue
+      for n, w in neighbours.get(node, ()):
+         if n not in dist or d + w < dist[n]:
+            dist[n] = d + w
+            heapq.heappush(heap, (d + w, n))
+   return dist
+
+# check distances of a finished search and that following its previous routers gives paths of that length
+def check_search(graph, search):
+   assert search.dist == reference_dist(graph, search.from_)
+   for n, d in search.dist.items():
+      if n != search.from_:
+         p = search.prev[n]
+         assert search.dist[p] + graph.edgeWeight(p, n) == d
+
+def test_search_matches_reference():
+   rand = random.Random(1)
+   for _ in range(30):
+      graph = random_graph(rand, 40, 40)
+      search = Search(graph, 0)
+      assert search.run() is True
+      check_search(graph, search)
+
+def test_search_stops_at_target():
+   rand = random.Random(2)
+   for _ in range(30):
+      graph = random_graph(rand, 40, 30)
+      dist = reference_dist(graph, 0)
+      target = rand.randrange(40)
+      search = Search(graph, 0)
+      assert search.run(target) == (target in dist)
+      if target in dist:
+         path = search.path(target)
+         assert path[0] == 0 and path[-1] == target
+         assert sum(graph.edgeWeight(path[i], path[i + 1]) for i in range(len(path) - 1)) == dist[target]
+
+# Search.update after every kind of change gives the same distances as searching again
+def test_update_matches_fresh_search():
+   rand = random.Random(3)
+   for _ in range(20):
+      graph = random_graph(rand, 30, 30)
+      search = Search(graph, 0)
+      search.run()
+      graph.listeners.append(search.update)
+      for _ in range(40):
+         kind = rand.random()
+         a, b = rand.sample(sorted(graph.ids), 2)
+         if kind < 0.4:
+            graph.addEdge(a, b, rand.randint(1, 20))   # new, shorter or longer connection
+         elif kind < 0.7:
+            graph.removeEdge(a, b)
+         elif kind < 0.8:
+            graph.removeNode(a if a != "0" else b)
+         elif kind < 0.9:
+            name = "new%d" % len(graph.names)
+            graph.addNode(name)
+            graph.addEdge(name, rand.choice(list(graph.ids)), rand.randint(1, 20))
+         else:
+            names = list(graph.ids)
+            graph.addEdges([(rand.choice(names), rand.choice(names), rand.randint(1, 20)) for _ in range(5)])
+         check_search(graph, search)
+
+# path found by a point to point search is a real path from u to v with the shortest distance
+def check_path(graph, u, v, path, total, dist):
+   if v not in dist:
+      assert path is None and total is None
+      return
+   assert total == dist[v]
+   assert path[0] == u and path[-1] == v
+   assert sum(graph.edgeWeight(path[i], path[i + 1]) for i in range(len(path) - 1)) == total
+
+def test_bidirectional_matches_reference():
+   rand = random.Random(5)
+   for _ in range(30):
+      graph = random_graph(rand, 40, 40)
+      for _ in range(10):
+         u, v = rand.randrange(40), rand.randrange(40)
+         path, total, settled = bidirectional_search(graph, u, v)
+         check_path(graph, u, v, path, total, reference_dist(graph, u))
+
+# weight of every path without loops from u to v, found by trying every path, sorted
+def all_path_weights(graph, u, v):
+   weights = []
+   stack = [(u, [u], 0)]
+   while stack:
+      node, path, total = stack.pop()
+      if node == v:
+         weights.append(total)
+         continue
+      for n, w in graph.neighbours(node):
+         if n not in path:
+            stack.append((n, path + [n], total + w))
+   return sorted(weights)
+
+def test_k_shortest_matches_every_path():
+   rand = random.Random(11)
+   for _ in range(40):
+      graph = random_graph(rand, 8, 8)
+      u, v = rand.sample(range(8), 2)
+      k = rand.randint(1, 12)
+      found, complete = k_shortest_paths(graph, u, v, k)
+      assert complete
+      assert [d for path, d, weights in found] == all_path_weights(graph, u, v)[:k]
+      assert len({tuple(path) for path, d, weights in found}) == len(found)
+      for path, d, weights in found:
+         assert path[0] == u and path[-1] == v
+         assert len(set(path)) == len(path)   # no loops
+         assert weights == [graph.edgeWeight(path[i], path[i + 1]) for i in range(len(path) - 1)]
+         assert sum(weights) == d
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+# graph kept on disk by GraphStore, reopened after the server stopped, run with "python3 -m pytest" in this directory
+
+from store import GraphStore, apply_change
+
+# log some changes to a store, as the endpoints do
+def log_changes(store, graph, changes):
+   for change in changes:
+      status, changed = apply_change(graph, change)
+      if changed:
+         store.append(graph, change)
+
+def test_reopen_replays_log(tmp_path):
+   store = GraphStore(str(tmp_path))
+   graph = store.open()
+   log_changes(store, graph, [{"op": "addrouter", "name": name} for name in "ABC"])
+   log_changes(store, graph, [{"op": "connect", "from": "A", "to": "B", "weight": 4}, {"op": "removerouter", "name": "C"}])
+   store.close()
+   graph = GraphStore(str(tmp_path)).open()
+   assert sorted(graph.ids) == ["A", "B"]
+   assert graph.weight("A", "B") == 4
+
+# a change cut off by a crash is dropped, and changes logged after reopening are not written onto the end of it
+def test_crash_reopen_append_reopen(tmp_path):
+   store = GraphStore(str(tmp_path))
+   graph = store.open()
+   log_changes(store, graph, [{"op": "addrouter", "name": name} for name in "AB"])
+   store.close()
+   with open(store.log_path, "a") as f:   # server stopped part way through writing a change
+      f.write('{"op": "addrou')
+
+   store = GraphStore(str(tmp_path))
+   graph = store.open()
+   assert sorted(graph.ids) == ["A", "B"]
+   log_changes(store, graph, [{"op": "addrouter", "name": name} for name in "CDE"])
+   store.close()
+   with open(store.log_path) as f:
+      assert "addrou{" not in f.read()
+
+   graph = GraphStore(str(tmp_path)).open()
+   assert sorted(graph.ids) == ["A", "B", "C", "D", "E"]
+
+# a whole change without its new line is kept, and the next change goes on a line of its own
+def test_last_change_without_new_line(tmp_path):
+   store = GraphStore(str(tmp_path))
+   graph = store.open()
+   log_changes(store, graph, [{"op": "addrouter", "name": "A"}])
+   store.close()
+   with open(store.log_path, "a") as f:
+      f.write('{"op": "addrouter", "name": "B", "seq": 2}')
+
+   store = GraphStore(str(tmp_path))
+   graph = store.open()
+   assert sorted(graph.ids) == ["A", "B"]
+   log_changes(store, graph, [{"op": "addrouter", "name": "C"}])
+   store.close()
+   assert sorted(GraphStore(str(tmp_path)).open().ids) == ["A", "B", "C"]
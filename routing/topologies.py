@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# Ailbhe Byrne
+
+import math
+import random
+
+# synthetic networks for benchmarks, each generator returns (list of router names, list of (from, to, weight) connections)
+# so the network can be added to a Graph with addNodes and addEdges, or sent to /import/
+# grid: routers in a square grid joined to the routers beside them, long routes with many hops
+# geometric: routers at random points in a square, joined to every router within a radius (weight = distance), like a physical network
+# scale_free: each new router joins m routers picked in proportion to how many connections they have (barabasi-albert), so a few
+# routers have most of the connections, like the internet
+
+# routers in a square grid (the last row can be short), weights random 1 to 100
+def grid(n, seed=0):
+   rand = random.Random(seed)
+   side = max(1, math.ceil(math.sqrt(n)))
+   names = ["R%d" % i for i in range(n)]
+   edges = []
+   for i in range(n):
+      if (i + 1) % side != 0 and i + 1 < n:   # router to the right
+         edges.append((names[i], names[i + 1], rand.randint(1, 100)))
+      if i + side < n:                        # router below
+         edges.append((names[i], names[i + side], rand.randint(1, 100)))
+   return names, edges
+
+# routers at random points in a unit square, joined if closer than a radius that gives about degree connections each
+# points are put in cells as wide as the radius, so only routers in the cells around a router are compared
+def geometric(n, seed=0, degree=6):
+   rand = random.Random(seed)
+   names = ["R%d" % i for i in range(n)]
+   points = [(rand.random(), rand.random()) for _ in range(n)]
+   radius = math.sqrt(degree / (math.pi * max(n, 1)))
+   cells = {}
+   for i, (x, y) in enumerate(points):
+      cells.setdefault((int(x / radius), int(y / radius)), []).append(i)
+   edges = []
+   for (cx, cy), routers in cells.items():
+      for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):   # each pair of cells once
+         others = cells.get((cx + dx, cy + dy))
+         if others is None:
+            continue
+         for i in routers:
+            x, y = points[i]
+            for j in others:
+               if (dx, dy) == (0, 0) and j <= i:
+                  continue
+               dist = math.hypot(x - points[j][0], y - points[j][1])
+               if dist < radius:
+                  edges.append((names[i], names[j], max(1, round(dist * 10000))))
+   return names, edges
+
+# barabasi-albert preferential attachment, every router after the first m joins m different routers, weights random 1 to 100
+def scale_free(n, seed=0, m=2):
+   rand = random.Random(seed)
+   names = ["R%d" % i for i in range(n)]
+   edges = []
+   ends = []   # every end of every connection, so picking from it picks routers in proportion to their number of connections
+   for i in range(1, n):
+      if i <= m:   # first routers join every router before them
+         targets = set(range(i))
+      else:
+         targets = set()
+         while len(targets) < m:
+            targets.add(rand.choice(ends))
+      for j in targets:
+         edges.append((names[i], names[j], rand.randint(1, 100)))
+         ends.extend((i, j))
+   return names, edges
+
+generators = {"grid": grid, "geometric": geometric, "scale_free": scale_free}